@@ -1,18 +1,32 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 import openai
-from firebase_admin import credentials, firestore, initialize_app
+from firebase_admin import credentials, firestore, initialize_app, storage
 from datetime import datetime
 import uuid
 import os
+import json
+import re
+import mimetypes
 import logging
 import googlemaps
 import firebase_admin
 from firebase_admin import credentials
 import requests
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple, Union
 from utils.RAG import rag_manager
+from utils.geocode_cache import GeocodeCache
+from utils.places_cache import NearbyPlacesCache
+from utils.message_writer import MessageWriter
+from utils.image_store import ImageStore
+from utils.completion_cache import CompletionCache
+from utils.chroma_client import chroma_client_stats
+from utils.context_builder import assemble_context, summarize_history
+from utils.conversation_store import ConversationStore
+from utils.etag import etag_matches, messages_etag
 from firebase_init import initialize_firebase
+from config import get_geocode_cache_settings, get_places_cache_settings, get_message_writer_settings, get_image_store_settings, \
+    get_completion_cache_settings, get_context_settings, get_conversation_store_settings
 
 
 # Configure logging
@@ -20,7 +34,7 @@ logging.basicConfig(level=logging.ERROR)
 
 # Initialize Flask app
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=['ETag', 'X-Next-Cursor'])
 
 # Firebase initialization - ensure it's only done once
 bucket_name = 'ggdotcom-254aa.firebasestorage.app'
@@ -28,32 +42,87 @@ firebase_app = initialize_firebase(bucket_name)  # Call the initialization funct
 
 # Firestore Client
 db = firestore.client()
+TOUR_DOC_ID = "yDLsVQhwoDF9ZHoG0Myk"
+message_writer = MessageWriter(db, **get_message_writer_settings())
+
+SESSION_ID_PATTERN = re.compile(r'^[A-Za-z0-9_.:-]{1,128}$')
+
+def valid_session_id(session_id) -> Optional[str]:
+    """A client sessionId usable as a Firestore document id, None when absent; raises ValueError otherwise"""
+    if session_id is None or session_id == "":
+        return None
+    if not isinstance(session_id, str) or not SESSION_ID_PATTERN.match(session_id) \
+            or session_id in ('.', '..') or (session_id.startswith('__') and session_id.endswith('__')):
+        raise ValueError("Invalid sessionId: use 1-128 letters, digits, '.', ':', '-' or '_'")
+    return session_id
+
+def tour_doc_id(session_id: str = None) -> str:
+    """Tour document of a client session; clients that send no sessionId share TOUR_DOC_ID"""
+    return valid_session_id(session_id) or TOUR_DOC_ID
+
+def tour_messages(session_id: str = None):
+    return db.collection('tour').document(tour_doc_id(session_id)).collection('messages')
+
+def load_session_messages(doc_id: str) -> List[Dict]:
+    """Newest messages of a tour document, oldest first, to hydrate the conversation store"""
+    # Commit this worker's queued messages first so a re-hydration does not drop them
+    message_writer.flush(timeout=2.0)
+    recent = (
+        db.collection('tour').document(doc_id).collection('messages')
+        .order_by('timestamp', direction='DESCENDING')
+        .limit(conversation_settings["max_messages"])
+        .select(list(ConversationStore.FIELDS))
+        .stream()
+    )
+    return [message.to_dict() for message in recent][::-1]
+
+# Per-session history for repeat prompts, hydrated from Firestore and re-read every refresh_seconds
+conversation_settings = get_conversation_store_settings()
+conversation_store = ConversationStore(load_session_messages, **conversation_settings)
+
+# Uploaded images live in the storage bucket under their SHA-256, not inline in messages
+image_store = ImageStore(storage.bucket(bucket_name), **get_image_store_settings())
 
 #Initialize Google Maps Key
 gmap = googlemaps.Client(key=os.getenv("GOOGLE_API_KEY"))
+geocode_cache = GeocodeCache(gmap, **get_geocode_cache_settings())
+places_cache = NearbyPlacesCache(gmap, **get_places_cache_settings())
 
 # Initialize OpenAI API key
 openai.api_key = os.getenv('OPENAI_API_KEY')
 
+# Completions for the same place, prompt and context are served from memory
+completion_cache_settings = get_completion_cache_settings()
+completion_cache = CompletionCache(
+    **completion_cache_settings,
+    embedding_function=rag_manager.embed if completion_cache_settings["similarity_threshold"] > 0 else None
+)
+
 @app.route('/')
 def home():
     return "Tour Guide API is running!"
 
-def get_rag_information(place_name: str) -> Dict[str, List[str]]:
+def get_rag_information(place_name: str) -> Dict[str, List[Union[str, Dict]]]:
     """Fetch contextual information using local RAG manager"""
     try:
         print(f"Querying RAG for place: {place_name}")
-        # Add collection check
-        collections = rag_manager.collections
-        print(f"Available collections: {collections}")
+        # Collection handles and counts are cached by the RAG manager and kept fresh
+        # by its background watcher, so this makes no extra Chroma round-trips
+        print(f"Available collections: {rag_manager.collections}")
+        print(f"Collection document counts: {rag_manager.collection_counts}")
         
-        # Try to get the collection and its count
-        try:
-            wiki_collection = rag_manager.client.get_collection("wikipedia_collection")
-            count = wiki_collection.count()
-            print(f"Wikipedia collection exists with {count} documents")
-        except Exception as e:
-            print(f"Error accessing wikipedia collection: {e}")
+        if rag_manager.chunk_token_budget > 0:
+            # Only the best section-sized chunks that fit the budget go into the prompt
+            try:
+                chunks = rag_manager.query_chunks(place_name, place_ids=rag_manager.matching_place_ids(place_name))
+                if chunks:
+                    # Scores rank the chunks for the context budget; order restores reading order afterwards
+                    return {"wikipedia": [
+                        {"text": chunk["document"], "score": 1 - chunk["distance"], "order": chunk["order"]}
+                        for chunk in chunks
+                    ]}
+            except Exception as e:
+                print(f"Chunk retrieval unavailable, falling back to documents: {str(e)}")
         
         results = rag_manager.query_place(place_name, limit=3)
         print(f"RAG query results: {results}")  # This will show what data was found
@@ -62,7 +131,14 @@ def get_rag_information(place_name: str) -> Dict[str, List[str]]:
         print(f"Error in RAG query: {str(e)}")
         return {}
 
-def create_chat_messages(prompt: str, context: Dict[str, List[str]], is_image: bool = False, image_data: str = None) -> List[dict]:
+context_settings = get_context_settings()
+
+def context_budget(model: str) -> int:
+    """Token budget for RAG facts in one request to this model"""
+    return context_settings["model_budgets"].get(model, context_settings["default_budget"])
+
+def create_chat_messages(prompt: str, context: Dict[str, List[Union[str, Dict]]], is_image: bool = False, image_data: str = None,
+                         model: str = "gpt-3.5-turbo") -> List[dict]:
     """Create chat messages with proper context integration"""
     messages = []
     
@@ -75,10 +151,8 @@ def create_chat_messages(prompt: str, context: Dict[str, List[str]], is_image: b
     
     # Add context as a separate message if available
     if context:
-        context_points = []
-        for source, facts in context.items():
-            for fact in facts:
-                context_points.append(fact)
+        # Deduplicated, best-first facts truncated to the model's token budget
+        context_points = assemble_context(context, model, context_budget(model))
         if context_points:
             context_msg = {
                 "role": "system",
@@ -112,573 +186,465 @@ def create_chat_messages(prompt: str, context: Dict[str, List[str]], is_image: b
     return messages
 
 
-@app.route('/chat', methods=['POST'])
-
-def chat():
-    try:
-        data = request.get_json()
-        # Need factor cases with location, image (Base64)
-        # if there is user input, add in to DB as well
-        if not data:
-            return jsonify({'error': 'No data provided'}), 400
-        
-        location = data.get('location')
-        image = data.get('image')
-        text = data.get('text')
-        print(f"Location: {location}")
-        # print(f"Image: {image}")
-        print(f"Text: {text}")
-
-        # LOCATION WITH IMAGE WITH TEXT
-        if location and text and image:
-            try:
-                #Get text data
-                text_data = data.get('text')
-
-                #Get location data
-                location = data.get('location', "")
-                print(f"Location Received: {location}")
-                lat, lng = map(float, location.split(','))
-
-                # Get address using Google Maps
-                gmaps_result = gmap.reverse_geocode((lat, lng))
-
-                if gmaps_result and len(gmaps_result) > 0:
-                    address = gmaps_result[0]['formatted_address']
-                else:
-                    address = location  # Fallback to coordinates if geocoding fails
-                
-                print(f"Address: {address}")
-
-            except Exception as e:
-                print(f"Geocoding error: {str(e)}")
-            
-            image_data = data.get('image')
-
-            try:
-                # Check if it already has the prefix
-                if image_data.startswith('data:image/jpeg;base64,'):
-                    # Remove the prefix to clean the base64 string
-                    base64_string = image_data.replace('data:image/jpeg;base64,', '')
-                else:
-                    base64_string = image_data
-                    
-                # Remove any whitespace or newlines
-                base64_string = base64_string.strip().replace('\n', '').replace('\r', '')
-                
-                # Add the prefix back to image_data
-                image_data = f"data:image/jpeg;base64,{base64_string}"
-            except Exception as e:
-                print(f"Error cleaning base64 image: {str(e)}")
-                raise ValueError("Invalid base64 image data")
-
-            context = get_rag_information(address)
-
-            #Initalize prompt with text
-            prompt = f"""You are a Singapore Tour Guide, please provide details regarding the text and photo that is given.
-                You are also given the user's address of {address} to provide more context in regards to the users location.
-                Do not mention the address in your answer.
-                Answer what is given in the user's text and photo and describe in detail regarding history or context that is applicable.
-                Here is the Users text: {text_data}"""
+def chat_branch(data: Dict) -> str:
+    """Pick the /chat branch from which of location, text and image were sent"""
+    if data.get('location') and data.get('text') and data.get('image'):
+        return "location_image_text"
+    if data.get('location') and data.get('text'):
+        return "location_text"
+    if data.get('location') and data.get('image'):
+        return "location_image"
+    return "location"
 
-            print(prompt)
-            # Create messages with context
-            messages = create_chat_messages(prompt, context, is_image=True)
-                
-            try:
-                # create USER msg data for firestore
-                message_data = {
-                    'timestamp': datetime.now(),
-                    'message_Id': "",
-                    'chatText': text_data,
-                    'image': "",
-                    'location': location,
-                    'userCheck': "true",
-                    'repeat': 0,
-                }
-
-                #Add to firestore
-                db.collection("tour").document("yDLsVQhwoDF9ZHoG0Myk")\
-                .collection('messages').add(message_data)
-                
-                print("Success: Added to Firestore")
-
-            except Exception as e:
-                print(f"Error: Failed to add to Firestore - {str(e)}")
 
-            # Call OpenAI API
-            response = openai.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=messages,
-                
-                # CAN UNCOMMENT THIS BLOCK OF CODE and replace the messages right above to compare w and w/o RAG
-                # [
-                #     {
-                #         "role": "user",
-                #         "content": [
-                #             {
-                #                 "type": "text",
-                #                 "text": prompt,
-                #             }, 
-                #             {
-                #                 "type": "image_url",
-                #                 "image_url": {
-                #                     "url": image_data
-                #                 }
-                #             }
-                #         ],
-                #     },
-                # ],
-                max_tokens=500,
-                temperature=0
-            )
+def lookup_address(location: str) -> str:
+    """Reverse-geocode a "lat,lng" string, falling back to the coordinates themselves"""
+    try:
+        print(f"Location Received: {location}")
+        lat, lng = map(float, location.split(','))
 
-            # Extract response text
-            response_text = response.choices[0].message.content
+        # Get address using Google Maps (served from the geocode cache for repeat positions)
+        gmaps_result = geocode_cache.reverse_geocode(lat, lng)
 
-            print(f"Response: {response_text}")
+        if gmaps_result and len(gmaps_result) > 0:
+            address = gmaps_result[0]['formatted_address']
+        else:
+            address = location  # Fallback to coordinates if geocoding fails
 
-            # Create response object
-            response_data = {
-                'id': uuid.uuid4().hex,
-                'timestamp': datetime.now().isoformat(),
-                'prompt': prompt,
-                'response': response_text
-            }
+        print(f"Address: {address}")
+        return address
 
-            try:
-                # create REPLY msg data for firestore
-                message_data = {
-                    'timestamp': datetime.now(),
-                    'message_Id': "",
-                    'chatText': response_text,
-                    'image': image_data,
-                    'location': location,
-                    'userCheck': "false",
-                    'repeat': 0,
-                }
+    except Exception as e:
+        print(f"Geocoding error: {str(e)}")
+        return location
 
-                #Add to firestore
-                db.collection("tour").document("yDLsVQhwoDF9ZHoG0Myk")\
-                .collection('messages').add(message_data)
-                
-                print("Success: Added to Firestore")
-            except Exception as e:
-                print(f"Error: Failed to add to Firestore - {str(e)}")
 
-            return jsonify(response_data)
-        #END LOCATION WITH TEXT WITH IMAGE -------------------------------------------------------------
+def clean_image_data(image_data: str) -> str:
+    """Normalise a base64 JPEG into a data URL"""
+    try:
+        # Check if it already has the prefix
+        if image_data.startswith('data:image/jpeg;base64,'):
+            # Remove the prefix to clean the base64 string
+            base64_string = image_data.replace('data:image/jpeg;base64,', '')
+        else:
+            base64_string = image_data
+            
+        # Remove any whitespace or newlines
+        base64_string = base64_string.strip().replace('\n', '').replace('\r', '')
+        
+        # Add the prefix back to image_data
+        return f"data:image/jpeg;base64,{base64_string}"
+    except Exception as e:
+        print(f"Error cleaning base64 image: {str(e)}")
+        raise ValueError("Invalid base64 image data")
 
-        #LOCATION WITH TEXT -------------------------------------------------------------
-        elif location and text:
-            try:
-                #Get text data
-                text_data = data.get('text')
 
-                #Get location data
-                location = data.get('location', "")
-                print(f"Location Received: {location}")
-                lat, lng = map(float, location.split(','))
+def select_nearby_place(location: str, landmarks: List[str], session_key: str = None) -> str:
+    """Return the first nearby place not yet in landmarks, or None"""
+    lat, lng = map(float, location.split(','))
 
-                # Get address using Google Maps
-                gmaps_result = gmap.reverse_geocode((lat, lng))
+    # Get nearby tourist attractions within 500m, served from the geohash tile cache
+    # (neighbouring tiles in the direction of travel are prefetched in the background)
+    places_result = places_cache.places_nearby(lat, lng, session_key=session_key)
 
-                if gmaps_result and len(gmaps_result) > 0:
-                    address = gmaps_result[0]['formatted_address']
-                else:
-                    address = location  # Fallback to coordinates if geocoding fails
-                
-                print(f"Address: {address}")
+    print("VISITED PLACES: " , landmarks)
+    visited = set(landmarks)
 
+    if places_result.get('results'):
+        for place in places_result['results']:
+            if (place['name'] in visited) :
+                continue
+            else :
+                landmarks.append(place['name'])
+                print("SELECTED PLACE: " , place['name'])
+                return place['name']
+    return None
 
-            except Exception as e:
-                print(f"Geocoding error: {str(e)}")
 
-            context = get_rag_information(address)
+def load_repeat_history(session_id: str = None) -> Tuple[int, str]:
+    """Return the latest repeat count and a bounded summary of the replies already sent for this spot"""
+    # Served by the conversation store: Firestore is read once per session, not per ping
+    doc_id = tour_doc_id(session_id)
+    repeat = conversation_store.latest_repeat(doc_id)
+    #Retrieve that number of past messages that will be added to the prompt
+    chat_texts = conversation_store.recent_texts(doc_id, min(repeat, context_settings["history_max_messages"]))
+    return repeat, summarize_history(chat_texts, context_settings["history_budget"])
 
-            #Initalize prompt with text
-            prompt = f"""You are a Singapore Tour Guide, please provide details regarding the text that is given.
-                You are also given the user's address of {address} to provide more context in regards to the users location.
-                Do not mention the address in your answer.
-                Answer what is given in the user's text and describe in detail regarding history or context that is applicable.
-                Here is the Users text: {text_data}"""
 
-            print(prompt)
-            messages = create_chat_messages(prompt, context)
-                
-            try:
-                # create USER msg data for firestore
-                message_data = {
-                    'timestamp': datetime.now(),
-                    'message_Id': "",
-                    'chatText': text_data,
-                    'image': "",
-                    'location': location,
-                    'userCheck': "true",
-                    'repeat': 0,
-                }
+def save_message(chat_text: str, location: str, user_check: str, image: str = "", repeat: int = 0,
+                 session_id: str = None) -> None:
+    """Queue a USER ("true") or REPLY ("false") message for the batched firestore writer"""
+    try:
+        message_data = {
+            'timestamp': datetime.now(),
+            'message_Id': "",
+            'chatText': chat_text,
+            'image': "",
+            'location': location,
+            'userCheck': user_check,
+            'repeat': repeat,
+        }
+        messages = tour_messages(session_id)
+        if image:
+            # Store only the content-addressed reference, never the base64 payload.
+            # The message is queued once the upload settles, so it never points at a missing image.
+            reference, stored = image_store.put_data_url(image)
+
+            def queue_with_image(upload):
+                if upload.result():
+                    message_data['imageRef'] = reference
+                message_writer.add(messages, message_data)
+
+            stored.add_done_callback(queue_with_image)
+        else:
+            #Add to firestore (committed in the background, off the request path)
+            message_writer.add(messages, message_data)
+        conversation_store.append(tour_doc_id(session_id), message_data)
+    except Exception as e:
+        print(f"Error: Failed to add to Firestore - {str(e)}")
+
+
+def build_chat_plan(branch: str, data: Dict, address: str, context: Dict[str, List[Union[str, Dict]]],
+                    selected_place: str = None, past_messages: str = "", repeat: int = 0) -> Dict:
+    """Build the prompt, model and messages for a /chat branch"""
+    text_data = data.get('text')
+    image_data = data.get('image')
+
+    # LOCATION WITH IMAGE WITH TEXT
+    if branch == "location_image_text":
+        prompt = f"""You are a Singapore Tour Guide, please provide details regarding the text and photo that is given.
+            You are also given the user's address of {address} to provide more context in regards to the users location.
+            Do not mention the address in your answer.
+            Answer what is given in the user's text and photo and describe in detail regarding history or context that is applicable.
+            Here is the Users text: {text_data}"""
+        return {
+            'branch': branch,
+            'prompt': prompt,
+            'model': "gpt-4o-mini",
+            'messages': create_chat_messages(prompt, context, is_image=True, model="gpt-4o-mini"),
+            'temperature': 0,
+            'reply_image': clean_image_data(image_data),
+            'repeat': 0,
+            'extra': {}
+        }
+
+    #LOCATION WITH TEXT
+    if branch == "location_text":
+        prompt = f"""You are a Singapore Tour Guide, please provide details regarding the text that is given.
+            You are also given the user's address of {address} to provide more context in regards to the users location.
+            Do not mention the address in your answer.
+            Answer what is given in the user's text and describe in detail regarding history or context that is applicable.
+            Here is the Users text: {text_data}"""
+        return {
+            'branch': branch,
+            'prompt': prompt,
+            'model': "gpt-3.5-turbo",
+            'messages': [
+                {"role": "user", "content": prompt}
+            ],
+            'temperature': 0,
+            'reply_image': "",
+            'repeat': 0,
+            'extra': {}
+        }
+
+    #LOCATION WITH IMAGE
+    if branch == "location_image":
+        prompt = f"""You are a Singapore Tour Guide, please provide details regarding the photo that is given.
+            You are also given the user's address of {address} to provide more context in regards to where the photo is taken.
+            Start by saying, You see [Point of interest]. Do not mention anything about the address in your answer.
+            Include only what is given in the photo and describe in detail regarding history or context."""
+        return {
+            'branch': branch,
+            'prompt': prompt,
+            'model': "gpt-4o-mini",
+            'messages': create_chat_messages(prompt, context, is_image=True, image_data=image_data, model="gpt-4o-mini"),
+            'temperature': 0,
+            'reply_image': clean_image_data(image_data),
+            'repeat': 0,
+            'extra': {}
+        }
+
+    #PURE LOCATION
+    prompt = f"""
+        Due to insufficient information in the RAG, if the location provided below differs greatly from the context in the RAG, completely disregard the RAG and craft original content about the provided location instead.
+
+        You are a friendly Singapore Tour Guide giving a walking tour. If {selected_place} matches with {address}, this means you are in a residential or developing area. 
+        If both are the same, you might have talked about this location already. Here are past messages you have sent: [{past_messages}]. 
+        If empty, it means this is the first time you are talking about it.  
+        If not empty, do not state the same thing again. Talk about something else about the area.
+
+        For residential/developing areas:
+        - Focus exclusively on the neighborhood or district, disregarding unrelated RAG content.
+        - Describe the most interesting aspects of the neighborhood or district you're in.
+        - Mention any nearby parks, nature areas, or community spaces.
+        - Include interesting facts about the area's development or future plans.
+        - Highlight what makes this area unique in Singapore.
+
+        For tourist landmarks:
+        - Name and describe the specific landmark.
+        - Use the RAG only if it directly mentions the landmark and matches the provided location. If the RAG does not match, ignore it entirely.
+        - Share its historical significance and background.
+        - Explain its cultural importance in Singapore.
+        - Describe unique architectural features.
+        - Include interesting facts that make it special.
+
+        Start with "You see [Point of interest/Area name]" and keep the tone friendly and conversational, as if speaking to tourists in person. Don't mention exact addresses or coordinates.
+        """
+    return {
+        'branch': branch,
+        'prompt': prompt,
+        'model': "gpt-3.5-turbo",
+        'messages': create_chat_messages(prompt, context, model="gpt-3.5-turbo"),
+        'temperature': 0.5,
+        'reply_image': "",
+        'repeat': repeat,
+        'extra': {'visitedPlace': selected_place}
+    }
 
-                #Add to firestore
-                db.collection("tour").document("yDLsVQhwoDF9ZHoG0Myk")\
-                .collection('messages').add(message_data)
-                
-                print("Success: Added to Firestore")
 
-            except Exception as e:
-                print(f"Error: Failed to add to Firestore - {str(e)}")
+def prepare_chat(data: Dict, session_key: str = None) -> Dict:
+    """Run the geocode, places, history and RAG stages for a /chat request and return its plan"""
+    branch = chat_branch(data)
+    location = data.get('location', "")
 
-            # Call OpenAI API
-            response = openai.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=500,
-                temperature=0
-            )
+    if branch == "location":
+        address = lookup_address(location)
+        landmarks = data.get('visitedPlaces') or []
+        selected_place = select_nearby_place(location, landmarks, session_key)
 
-            # Extract response text
-            response_text = response.choices[0].message.content
+        repeat = 0
+        past_messages = []
+        if not selected_place:
+            selected_place = address
+            repeat, past_messages = load_repeat_history(data.get('sessionId'))
+            repeat += 1
 
-            print(f"Response: {response_text}")
+        context = get_rag_information(selected_place)
+        plan = build_chat_plan(branch, data, address, context, selected_place, past_messages, repeat)
+    else:
+        address = lookup_address(location)
+        context = get_rag_information(address)
+        plan = build_chat_plan(branch, data, address, context)
+        if data.get('text'):
+            # create USER msg data for firestore
+            save_message(data.get('text'), location, "true", session_id=data.get('sessionId'))
+
+    plan['session_id'] = data.get('sessionId')
+    print("PROMPT", plan['prompt'])
+    return plan
+
+
+def cached_completion(plan: Dict, question: str = None) -> str:
+    """Return the completion text for a plan, calling OpenAI only on a cache miss"""
+    cached = completion_cache.get(plan['branch'], plan['model'], plan['messages'], plan['temperature'], question)
+    if cached is not None:
+        print("Completion cache hit")
+        return cached
+
+    # Call OpenAI API
+    response = openai.chat.completions.create(
+        model=plan['model'],
+        messages=plan['messages'],
+        max_tokens=500,
+        temperature=plan['temperature']
+    )
+
+    # Extract response text
+    response_text = response.choices[0].message.content
+    completion_cache.put(plan['branch'], plan['model'], plan['messages'], plan['temperature'], response_text, question)
+    return response_text
+
+
+def finish_chat(plan: Dict, location: str, response_text: str, persist: bool = True) -> Dict:
+    """Build the /chat response object and store the REPLY message unless persist is False"""
+    print(f"Response: {response_text}")
+
+    # Create response object
+    response_data = {
+        'id': uuid.uuid4().hex,
+        'timestamp': datetime.now().isoformat(),
+        'prompt': plan['prompt'],
+        'response': response_text,
+        **plan['extra']
+    }
 
-            # Create response object
-            response_data = {
-                'id': uuid.uuid4().hex,
-                'timestamp': datetime.now().isoformat(),
-                'prompt': prompt,
-                'response': response_text
-            }
+    if persist:
+        # create REPLY msg data for firestore
+        save_message(response_text, location, "false", image=plan['reply_image'], repeat=plan['repeat'],
+                     session_id=plan.get('session_id'))
+    return response_data
 
-            try:
-                # create REPLY msg data for firestore
-                message_data = {
-                    'timestamp': datetime.now(),
-                    'message_Id': "",
-                    'chatText': response_text,
-                    'image': "",
-                    'location': location,
-                    'userCheck': "false",
-                    'repeat': 0,
-                }
 
-                #Add to firestore
-                db.collection("tour").document("yDLsVQhwoDF9ZHoG0Myk")\
-                .collection('messages').add(message_data)
-                
-                print("Success: Added to Firestore")
-            except Exception as e:
-                print(f"Error: Failed to add to Firestore - {str(e)}")
+@app.route('/chat', methods=['POST'])
 
-            return jsonify(response_data)
-        #END LOCATION WITH TEXT -------------------------------------------------------------
+def chat():
+    try:
+        data = request.get_json()
+        # Need factor cases with location, image (Base64)
+        # if there is user input, add in to DB as well
+        if not data:
+            return jsonify({'error': 'No data provided'}), 400
         
-        #LOCATION WITH IMAGE CHECK ----------------------------------------
-        elif location and image:
-            try:
-                image_data = data.get('image')
-                location = data.get('location', "")
-                print(f"Location Received: {location}")
-                lat, lng = map(float, location.split(','))
-
-                # Get address using Google Maps
-                gmaps_result = gmap.reverse_geocode((lat, lng))
-                
-                if gmaps_result and len(gmaps_result) > 0:
-                    address = gmaps_result[0]['formatted_address']
-                else:
-                    address = location  # Fallback to coordinates if geocoding fails
-                
-                print(f"Address: {address}")
-
-            except Exception as e:
-                print(f"Geocoding error: {str(e)}")
-
-            context = get_rag_information(address)
-            #Initalize prompt with IMAGE
-            prompt = f"""You are a Singapore Tour Guide, please provide details regarding the photo that is given.
-                You are also given the user's address of {address} to provide more context in regards to where the photo is taken.
-                Start by saying, You see [Point of interest]. Do not mention anything about the address in your answer.
-                Include only what is given in the photo and describe in detail regarding history or context."""
-
-
-            messages = create_chat_messages(prompt, context, is_image=True, image_data=image_data)
-
-            try:
-                # Check if it already has the prefix
-                if image_data.startswith('data:image/jpeg;base64,'):
-                    # Remove the prefix to clean the base64 string
-                    base64_string = image_data.replace('data:image/jpeg;base64,', '')
-                else:
-                    base64_string = image_data
-                    
-                # Remove any whitespace or newlines
-                base64_string = base64_string.strip().replace('\n', '').replace('\r', '')
-                
-                # Add the prefix back to image_data
-                image_data = f"data:image/jpeg;base64,{base64_string}"
-            except Exception as e:
-                print(f"Error cleaning base64 image: {str(e)}")
-                raise ValueError("Invalid base64 image data")
-
-            # Call OpenAI API
-            response = openai.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=messages,
-                
-                # [
-                #     {
-                #         "role": "user",
-                #         "content": [
-                #             {
-                #                 "type": "text",
-                #                 "text": prompt,
-                #             }, 
-                #             {
-                #                 "type": "image_url",
-                #                 "image_url": {
-                #                     "url": image_data
-                #                 }
-                #             }
-                #         ],
-                #     },
-                # ],
-                max_tokens=500,
-                temperature=0
-            )
-
-            # Extract response text
-            response_text = response.choices[0].message.content
-
-            print(f"Response: {response_text}")
-                
-            # Create response object
-            response_data = {
-                'id': uuid.uuid4().hex,
-                'timestamp': datetime.now().isoformat(),
-                'prompt': prompt,
-                'response': response_text
-            }
-
-            try:
-                # create msg data for firestore
-                message_data = {
-                    'timestamp': datetime.now(),
-                    'message_Id': "",
-                    'chatText': response_text,
-                    'image': image_data,
-                    'location': location,
-                    'userCheck': "false",
-                    'repeat': 0,
-                }
-
-                #Add to firestore
-                db.collection("tour").document("yDLsVQhwoDF9ZHoG0Myk")\
-                .collection('messages').add(message_data)
-                
-                print("Success: Added to Firestore")
-            except Exception as e:
-                print(f"Error: Failed to add to Firestore - {str(e)}")
-
-            return jsonify(response_data)
-        #END LOCATION WITH IMAGE -------------------------------------------------------------
-
-        #PURE LOCATION CHECK ----------------------------------------------------------------
-        else:
-            try:
-                # Parse location string into lat, lng
-                location = data.get('location', "")
-                print(f"Location Received: {location}")
-                lat, lng = map(float, location.split(','))
-                
-                # Get address using Google Maps
-                gmaps_result = gmap.reverse_geocode((lat, lng))
-                
-                if gmaps_result and len(gmaps_result) > 0:
-                    address = gmaps_result[0]['formatted_address']
-                else:
-                    address = location  # Fallback to coordinates if geocoding fails
-                
-                print(f"Address: {address}")
-
-                # Get nearby tourist attractions
-                places_result = gmap.places_nearby(
-                    location=(lat, lng),
-                    radius=500,  # 500m radius
-                    type=['tourist_attraction', 'museum', 'art_gallery', 'park', 'shopping_mall', 
-                        'hindu_temple', 'church', 'mosque', 'place_of_worship', 
-                        'amusement_park', 'aquarium', 'zoo', 
-                        'restaurant', 'cafe'],  # Specifically search for tourist attractions
-                    language='en'  # Ensure English results
-                        )
-
-                if data.get('visitedPlaces'):
-                    landmarks = data.get('visitedPlaces')
-                else:
-                    landmarks = []
-
-                print("VISITED PLACES: " , landmarks)
-
-                # Initialize place and number of repeats variable
-                selected_place = None
-                repeat = 0
-                past_messages = []
-
-                if places_result.get('results'):
-                    for place in places_result['results']:
-                        if (place['name'] in landmarks) :
-                            continue
-                        else :
-                            landmarks.append(place['name'])
-                            selected_place = place['name']
-                            print("SELECTED PLACE: " , selected_place)
-                            break
-                            
-                if not selected_place:
-                    selected_place = address
-                    #If place is repeated, start the firestore collection to retrieve past messages that was send out
-                    most_recent_message = (
-                                            db.collection('tour')
-                                            .document("yDLsVQhwoDF9ZHoG0Myk")
-                                            .collection('messages')
-                                            .order_by('timestamp', direction='DESCENDING')
-                                            .limit(1)
-                                            .stream()
-                                                )
-                    for message in most_recent_message:
-                        message_data = message.to_dict()
-                        repeat = message_data.get('repeat')
-                    #Retrieve that number of past messages that will be added to the prompt
-                    repeated_messages = (
-                                            db.collection('tour')
-                                            .document("yDLsVQhwoDF9ZHoG0Myk")
-                                            .collection('messages')
-                                            .order_by('timestamp', direction='DESCENDING')
-                                            .limit(repeat)
-                                            .stream()
-                                                )
-                    chat_texts = []
-                    for message in repeated_messages:
-                        chat_text = message.to_dict().get('chatText', "")
-                        if chat_text:
-                            chat_texts.append(chat_text)
-                    past_messages = " ".join(chat_texts)
-                    repeat += 1
+        print(f"Location: {data.get('location')}")
+        print(f"Text: {data.get('text')}")
+        try:
+            data['sessionId'] = valid_session_id(data.get('sessionId'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
 
+        plan = prepare_chat(data, session_key=data.get('sessionId') or request.remote_addr)
+        response_text = cached_completion(plan, question=data.get('text'))
 
-            except Exception as e:
-                print(f"Geocoding error: {str(e)}")
+        return jsonify(finish_chat(plan, data.get('location', ""), response_text))
 
-            context = get_rag_information(selected_place)
+    except Exception as e:
+        logging.error("Error in /chat endpoint", exc_info=True)
+        return jsonify({'error': str(e)}), 500
 
-            # Add address to prompt
-            prompt = f"""
-                Due to insufficient information in the RAG, if the location provided below differs greatly from the context in the RAG, completely disregard the RAG and craft original content about the provided location instead.
+def sse_event(event: str, payload: Dict) -> str:
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
 
-                You are a friendly Singapore Tour Guide giving a walking tour. If {selected_place} matches with {address}, this means you are in a residential or developing area. 
-                If both are the same, you might have talked about this location already. Here are past messages you have sent: [{past_messages}]. 
-                If empty, it means this is the first time you are talking about it.  
-                If not empty, do not state the same thing again. Talk about something else about the area.
 
-                For residential/developing areas:
-                - Focus exclusively on the neighborhood or district, disregarding unrelated RAG content.
-                - Describe the most interesting aspects of the neighborhood or district you're in.
-                - Mention any nearby parks, nature areas, or community spaces.
-                - Include interesting facts about the area's development or future plans.
-                - Highlight what makes this area unique in Singapore.
+@app.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """Same as /chat, but forwards completion tokens as server-sent events as they arrive.
 
-                For tourist landmarks:
-                - Name and describe the specific landmark.
-                - Use the RAG only if it directly mentions the landmark and matches the provided location. If the RAG does not match, ignore it entirely.
-                - Share its historical significance and background.
-                - Explain its cultural importance in Singapore.
-                - Describe unique architectural features.
-                - Include interesting facts that make it special.
+    Emits "token" events with {"text": ...}, then one "done" event carrying the
+    usual /chat response object. The REPLY is stored only after the stream closes.
+    """
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({'error': 'No data provided'}), 400
+        try:
+            data['sessionId'] = valid_session_id(data.get('sessionId'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
 
-                Start with "You see [Point of interest/Area name]" and keep the tone friendly and conversational, as if speaking to tourists in person. Don't mention exact addresses or coordinates.
-                """
+        plan = prepare_chat(data, session_key=data.get('sessionId') or request.remote_addr)
+    except Exception as e:
+        logging.error("Error in /chat/stream endpoint", exc_info=True)
+        return jsonify({'error': str(e)}), 500
 
-            
-            print("PROMPT", prompt)
+    location = data.get('location', "")
 
-            messages = create_chat_messages(prompt, context)
+    def generate():
+        cached = completion_cache.get(plan['branch'], plan['model'], plan['messages'], plan['temperature'], data.get('text'))
+        if cached is not None:
+            yield sse_event("token", {'text': cached})
+            yield sse_event("done", finish_chat(plan, location, cached))
+            return
 
-            # Call OpenAI API
-            response = openai.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=messages,
-                
-                # [
-                #     {"role": "user", "content": prompt}
-                # ],
+        chunks = []
+        try:
+            stream = openai.chat.completions.create(
+                model=plan['model'],
+                messages=plan['messages'],
                 max_tokens=500,
-                temperature=0.5
+                temperature=plan['temperature'],
+                stream=True
             )
+            for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    chunks.append(delta)
+                    yield sse_event("token", {'text': delta})
+
+            response_text = "".join(chunks)
+            completion_cache.put(plan['branch'], plan['model'], plan['messages'], plan['temperature'], response_text, data.get('text'))
+            yield sse_event("done", finish_chat(plan, location, response_text))
+        except Exception as e:
+            logging.error("Error streaming /chat/stream response", exc_info=True)
+            yield sse_event("error", {'error': str(e)})
 
-            # Extract response text
-            response_text = response.choices[0].message.content
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
-            print(f"Response: {response_text}")
+def image_url(image_ref: Dict) -> str:
+    """Absolute URL the frontend can use as an <img> src for a stored image"""
+    return f"{request.host_url}images/{os.path.basename(image_ref['path'])}"
 
-            # Create response object
-            response_data = {
-                'id': uuid.uuid4().hex,
-                'timestamp': datetime.now().isoformat(),
-                'prompt': prompt,
-                'response': response_text,
-                'visitedPlace' : selected_place
-            }
 
-            try:
-                # create msg data for firestore
-                message_data = {
-                    'timestamp': datetime.now(),
-                    'message_Id': "",
-                    'chatText': response_text,
-                    'image': "",
-                    'location': location,
-                    'userCheck': "false",
-                    'repeat': repeat,
-                }
+@app.route('/images/<name>', methods=['GET'])
+def get_image(name):
+    if not re.match(r'^[0-9a-f]{64}(\.\w+)?$', name):
+        return jsonify({'error': 'Invalid image name'}), 400
 
-                #Add to firestore
-                db.collection("tour").document("yDLsVQhwoDF9ZHoG0Myk")\
-                .collection('messages').add(message_data)
-                
-                print("Success: Added to Firestore")
-            except Exception as e:
-                print(f"Error: Failed to add to Firestore - {str(e)}")
+    data = image_store.get(f"{image_store.prefix}/{name}")
+    if data is None:
+        return jsonify({'error': 'Image not found'}), 404
 
-            return jsonify(response_data)
+    # Content-addressed, so the bytes behind a name never change
+    return Response(
+        data,
+        mimetype=mimetypes.guess_type(name)[0] or 'application/octet-stream',
+        headers={'Cache-Control': 'public, max-age=31536000, immutable', 'ETag': f'"{name}"'}
+    )
 
-    except Exception as e:
-        logging.error("Error in /chat endpoint", exc_info=True)
-        return jsonify({'error': str(e)}), 500
-    #END PURE LOCATION CHECK ----------------------------------------------------------------
 
 @app.route('/messages', methods = ['GET'])
 def retrieve():
+    """Tour history, newest first.
+
+    Query parameters:
+      limit       - page size (all messages when omitted)
+      start_after - id of the last message of the previous page
+      fields      - comma-separated projection, e.g. fields=chatText,timestamp,userCheck
+      sessionId   - history of one client session instead of the shared tour
+    Responses carry an ETag built from the message count and the newest
+    message, so polling clients sending If-None-Match get a 304 after a count
+    aggregation and a single one-document read. When a
+    page is full, X-Next-Cursor holds the start_after value for the next page.
+    """
     try:    
-        messages = db.collection('tour').document("yDLsVQhwoDF9ZHoG0Myk")\
-                    .collection('messages')\
-                    .order_by('timestamp', direction='DESCENDING' )\
-                    .stream()
-        
+        messages_ref = tour_messages(request.args.get('sessionId'))
+        limit = request.args.get('limit', type=int)
+        start_after = request.args.get('start_after')
+        fields = [field.strip() for field in request.args.get('fields', '').split(',') if field.strip()]
+
+        etag = messages_etag(messages_ref, request.query_string.decode())
+        if etag_matches(request.headers.get('If-None-Match', ''), etag):
+            return Response(status=304, headers={'ETag': etag})
+
+        query = messages_ref.order_by('timestamp', direction='DESCENDING')
+        if start_after:
+            cursor = messages_ref.document(start_after).get()
+            if not cursor.exists:
+                return jsonify({"error": f"Unknown start_after message: {start_after}"}), 400
+            query = query.start_after(cursor)
+        if fields:
+            # image is served from imageRef, so project that instead of the legacy field
+            projection = set(fields) | ({'imageRef'} if 'image' in fields else set())
+            query = query.select(sorted(projection))
+        if limit:
+            query = query.limit(limit)
+
         message_list = []
 
-        for msg in messages:
+        for msg in query.stream():
             msg_data = msg.to_dict()
             msg_data['id'] = msg.id
+            if msg_data.get('imageRef'):
+                msg_data['image'] = image_url(msg_data['imageRef'])
+                if fields and 'imageRef' not in fields:
+                    del msg_data['imageRef']
             # Convert timestamp to string for JSON serialization
             message_list.append(msg_data)
         
-        return jsonify(message_list), 200
+        response = jsonify(message_list)
+        response.headers['ETag'] = etag
+        response.headers['Cache-Control'] = 'no-cache'
+        if limit and len(message_list) == limit:
+            response.headers['X-Next-Cursor'] = message_list[-1]['id']
+        return response, 200
     except Exception as e:
+        logging.error("Error in /messages endpoint", exc_info=True)
         return jsonify({"error": str(e)}), 400
-        
-    except Exception as e:
-            logging.error("Error in /messages endpoint", exc_info=True)
-            return jsonify({'error': str(e)}), 500
 
 
 # For testing
@@ -797,6 +763,30 @@ def test():
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/stats', methods=['GET'])
+def stats():
+    return jsonify({
+        'geocode_cache': geocode_cache.stats(),
+        'places_cache': places_cache.stats(),
+        'message_writer': message_writer.stats(),
+        'image_store': image_store.stats(),
+        'completion_cache': completion_cache.stats(),
+        'conversation_store': conversation_store.stats(),
+        'chroma': chroma_client_stats()
+    }), 200
+
+
+@app.route('/health', methods=['GET'])
+def health():
+    """Readiness: 200 once the RAG manager has warmed up, 503 while it is still starting"""
+    rag_status = rag_manager.status()
+    ready = rag_status['state'] == 'ready'
+    return jsonify({
+        'status': 'ready' if ready else rag_status['state'],
+        'rag': rag_status
+    }), 200 if ready else 503
+
+
 @app.route('/ping', defaults={'path': ''})
 @app.route('/ping<path:path>', methods=['HEAD'])
 def ping(path):
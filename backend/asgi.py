@@ -0,0 +1,196 @@
+import asyncio
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import openai
+import uvicorn
+from fastapi import BackgroundTasks, FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.wsgi import WSGIMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Reuse the Flask app's clients, caches and /chat stages
+import app as tour
+from config import get_asgi_settings
+
+settings = get_asgi_settings()
+
+# Initialize FastAPI app
+app = FastAPI()
+app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+
+openai_client = openai.AsyncOpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+
+
+@app.on_event("startup")
+async def configure_executor():
+    # Blocking SDK calls (Maps, Chroma, Firestore) run on this pool, so size it for I/O not CPU
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=settings["io_threads"], thread_name_prefix="tour-io")
+    )
+
+
+async def prepare_chat(data: dict, session_key: str) -> dict:
+    """Async version of tour.prepare_chat that overlaps independent I/O stages"""
+    branch = tour.chat_branch(data)
+    location = data.get('location', "")
+
+    if branch == "location":
+        landmarks = data.get('visitedPlaces') or []
+        address, selected_place = await asyncio.gather(
+            asyncio.to_thread(tour.lookup_address, location),
+            asyncio.to_thread(tour.select_nearby_place, location, landmarks, session_key)
+        )
+
+        repeat = 0
+        past_messages = []
+        if not selected_place:
+            selected_place = address
+            repeat, past_messages = await asyncio.to_thread(tour.load_repeat_history, data.get('sessionId'))
+            repeat += 1
+
+        context = await asyncio.to_thread(tour.get_rag_information, selected_place)
+        plan = tour.build_chat_plan(branch, data, address, context, selected_place, past_messages, repeat)
+    else:
+        # The USER message write does not depend on the address, so it overlaps geocode + RAG
+        user_write = None
+        if data.get('text'):
+            user_write = asyncio.create_task(
+                asyncio.to_thread(tour.save_message, data.get('text'), location, "true", session_id=data.get('sessionId'))
+            )
+
+        address = await asyncio.to_thread(tour.lookup_address, location)
+        context = await asyncio.to_thread(tour.get_rag_information, address)
+        plan = tour.build_chat_plan(branch, data, address, context)
+        if user_write:
+            await user_write
+
+    plan['session_id'] = data.get('sessionId')
+    print("PROMPT", plan['prompt'])
+    return plan
+
+
+async def cached_completion(plan: dict, question: str = None) -> str:
+    """Async counterpart of tour.cached_completion"""
+    cache = tour.completion_cache
+    cached = await asyncio.to_thread(
+        cache.get, plan['branch'], plan['model'], plan['messages'], plan['temperature'], question
+    )
+    if cached is not None:
+        return cached
+
+    # Call OpenAI API
+    response = await openai_client.chat.completions.create(
+        model=plan['model'],
+        messages=plan['messages'],
+        max_tokens=500,
+        temperature=plan['temperature']
+    )
+    response_text = response.choices[0].message.content
+    await asyncio.to_thread(
+        cache.put, plan['branch'], plan['model'], plan['messages'], plan['temperature'], response_text, question
+    )
+    return response_text
+
+
+@app.post("/chat")
+async def chat(request: Request, background_tasks: BackgroundTasks):
+    try:
+        data = await request.json()
+        if not data:
+            return JSONResponse({'error': 'No data provided'}, status_code=400)
+
+        try:
+            data['sessionId'] = tour.valid_session_id(data.get('sessionId'))
+        except ValueError as e:
+            return JSONResponse({'error': str(e)}, status_code=400)
+
+        session_key = data.get('sessionId') or (request.client.host if request.client else None)
+        plan = await prepare_chat(data, session_key)
+
+        response_text = await cached_completion(plan, question=data.get('text'))
+
+        # Store the REPLY after the response has been sent
+        response_data = tour.finish_chat(plan, data.get('location', ""), response_text, persist=False)
+        background_tasks.add_task(
+            tour.save_message, response_text, data.get('location', ""), "false",
+            image=plan['reply_image'], repeat=plan['repeat'], session_id=plan['session_id']
+        )
+        return JSONResponse(response_data)
+
+    except Exception as e:
+        logging.error("Error in async /chat endpoint", exc_info=True)
+        return JSONResponse({'error': str(e)}, status_code=500)
+
+
+@app.post("/chat/stream")
+async def chat_stream(request: Request):
+    """Async counterpart of the Flask /chat/stream server-sent events endpoint"""
+    try:
+        data = await request.json()
+        if not data:
+            return JSONResponse({'error': 'No data provided'}, status_code=400)
+
+        try:
+            data['sessionId'] = tour.valid_session_id(data.get('sessionId'))
+        except ValueError as e:
+            return JSONResponse({'error': str(e)}, status_code=400)
+
+        session_key = data.get('sessionId') or (request.client.host if request.client else None)
+        plan = await prepare_chat(data, session_key)
+    except Exception as e:
+        logging.error("Error in async /chat/stream endpoint", exc_info=True)
+        return JSONResponse({'error': str(e)}, status_code=500)
+
+    location = data.get('location', "")
+
+    async def generate():
+        cache = tour.completion_cache
+        question = data.get('text')
+        cached = await asyncio.to_thread(
+            cache.get, plan['branch'], plan['model'], plan['messages'], plan['temperature'], question
+        )
+        if cached is not None:
+            yield tour.sse_event("token", {'text': cached})
+            yield tour.sse_event("done", await asyncio.to_thread(tour.finish_chat, plan, location, cached))
+            return
+
+        chunks = []
+        try:
+            stream = await openai_client.chat.completions.create(
+                model=plan['model'],
+                messages=plan['messages'],
+                max_tokens=500,
+                temperature=plan['temperature'],
+                stream=True
+            )
+            async for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    chunks.append(delta)
+                    yield tour.sse_event("token", {'text': delta})
+
+            response_text = "".join(chunks)
+            await asyncio.to_thread(
+                cache.put, plan['branch'], plan['model'], plan['messages'], plan['temperature'], response_text, question
+            )
+            response_data = await asyncio.to_thread(tour.finish_chat, plan, location, response_text)
+            yield tour.sse_event("done", response_data)
+        except Exception as e:
+            logging.error("Error streaming async /chat/stream response", exc_info=True)
+            yield tour.sse_event("error", {'error': str(e)})
+
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+# Every other route is served by the Flask app
+app.mount("/", WSGIMiddleware(tour.app))
+
+if __name__ == "__main__":
+    port = int(os.environ.get("PORT", 10000))
+    uvicorn.run("asgi:app", host="0.0.0.0", port=port, workers=settings["workers"])
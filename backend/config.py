@@ -7,13 +7,188 @@ CHROMA_HOST = 'ggdotcom-production.up.railway.app'
 CHROMA_PORT = 443  # HTTPS port
 CHROMA_API_KEY = os.getenv('CHROMA_API_KEY', '')
 CHROMA_SSL = True
+CHROMA_POOL_SIZE = int(os.getenv('CHROMA_POOL_SIZE', 20))
+CHROMA_TIMEOUT_SECONDS = float(os.getenv('CHROMA_TIMEOUT_SECONDS', 30))
+CHROMA_KEEPALIVE_SECONDS = float(os.getenv('CHROMA_KEEPALIVE_SECONDS', 60))
 FIREBASE_BUCKET = "ggdotcom-254aa.firebasestorage.app"
+BACKUP_DOWNLOAD_WORKERS = int(os.getenv('BACKUP_DOWNLOAD_WORKERS', 8))
+BACKUP_CHUNK_BYTES = int(os.getenv('BACKUP_CHUNK_BYTES', 8 * 1024 * 1024))  # size of one ranged read
+BACKUP_INDEX_TTL_SECONDS = int(os.getenv('BACKUP_INDEX_TTL_SECONDS', 300))  # how long a cached backup index is trusted
+CHROMA_RESTORE_ON_START = os.getenv('CHROMA_RESTORE_ON_START', 'false').lower() == 'true'  # cold replicas rehydrate from backup
+SNAPSHOT_MIN_CHUNK_BYTES = int(os.getenv('SNAPSHOT_MIN_CHUNK_BYTES', 256 * 1024))
+SNAPSHOT_AVG_CHUNK_BYTES = int(os.getenv('SNAPSHOT_AVG_CHUNK_BYTES', 1024 * 1024))  # rounded down to a power of two
+SNAPSHOT_MAX_CHUNK_BYTES = int(os.getenv('SNAPSHOT_MAX_CHUNK_BYTES', 4 * 1024 * 1024))
+SNAPSHOT_RETENTION = int(os.getenv('SNAPSHOT_RETENTION', 14))  # snapshots kept by prune_snapshots
+RAG_INDEX_REFRESH_SECONDS = int(os.getenv('RAG_INDEX_REFRESH_SECONDS', 300))
+RAG_COLLECTION_WATCH_SECONDS = int(os.getenv('RAG_COLLECTION_WATCH_SECONDS', 60))
+RAG_RETRIEVAL_MODE = os.getenv('RAG_RETRIEVAL_MODE', 'substring')  # "substring" or "vector"
+RAG_MAX_DISTANCE = float(os.getenv('RAG_MAX_DISTANCE')) if os.getenv('RAG_MAX_DISTANCE') else None
+RAG_CHUNK_TOKEN_BUDGET = int(os.getenv('RAG_CHUNK_TOKEN_BUDGET', 600))  # 0 sends whole documents instead of chunks
+GEOCODE_PRECISION = int(os.getenv('GEOCODE_PRECISION', 8))  # geohash length, 8 is ~38m x 19m
+GEOCODE_TTL_SECONDS = int(os.getenv('GEOCODE_TTL_SECONDS', 7 * 24 * 3600))
+GEOCODE_CACHE_SIZE = int(os.getenv('GEOCODE_CACHE_SIZE', 10000))
+GEOCODE_CACHE_DB = os.getenv('GEOCODE_CACHE_DB', '')  # SQLite file, empty disables the disk tier
+PLACES_CACHE_PRECISION = int(os.getenv('PLACES_CACHE_PRECISION', 7))  # geohash length, 7 is ~153m x 153m
+PLACES_CACHE_TTL_SECONDS = int(os.getenv('PLACES_CACHE_TTL_SECONDS', 3600))
+PLACES_CACHE_SIZE = int(os.getenv('PLACES_CACHE_SIZE', 2000))
+PLACES_PREFETCH = os.getenv('PLACES_PREFETCH', 'true').lower() == 'true'
+PLACES_MAX_PAGES = int(os.getenv('PLACES_MAX_PAGES', 3))  # Places returns 20 results per page, 60 at most
+FIRESTORE_BATCH_SIZE = int(os.getenv('FIRESTORE_BATCH_SIZE', 50))
+FIRESTORE_FLUSH_SECONDS = float(os.getenv('FIRESTORE_FLUSH_SECONDS', 1.0))
+FIRESTORE_QUEUE_SIZE = int(os.getenv('FIRESTORE_QUEUE_SIZE', 10000))
+IMAGE_STORE_PREFIX = os.getenv('IMAGE_STORE_PREFIX', 'ggdotcom/images')
+IMAGE_STORE_DIR = os.getenv('IMAGE_STORE_DIR', '')  # local directory stand-in, empty uses the bucket
+INGEST_WORKERS = int(os.getenv('INGEST_WORKERS', 8))
+INGEST_REQUESTS_PER_SECOND = float(os.getenv('INGEST_REQUESTS_PER_SECOND', 10))  # per remote host
+INGEST_BATCH_SIZE = int(os.getenv('INGEST_BATCH_SIZE', 64))
+INGEST_MAX_RETRIES = int(os.getenv('INGEST_MAX_RETRIES', 3))
+INGEST_MAX_AGE_DAYS = int(os.getenv('INGEST_MAX_AGE_DAYS', 30))  # incremental runs re-fetch pages older than this
+CHUNK_MAX_TOKENS = int(os.getenv('CHUNK_MAX_TOKENS', 200))
+CHUNK_OVERLAP_TOKENS = int(os.getenv('CHUNK_OVERLAP_TOKENS', 40))
+EMBEDDING_MODEL_ID = 'all-MiniLM-L6-v2'  # model behind chromadb's DefaultEmbeddingFunction
+EMBEDDING_CACHE_DIR = os.getenv('EMBEDDING_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'embedding_cache'))
+EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', 64))
+EMBEDDING_WORKERS = int(os.getenv('EMBEDDING_WORKERS', 4))
+COMPLETION_CACHE_TTL_SECONDS = int(os.getenv('COMPLETION_CACHE_TTL_SECONDS', 24 * 3600))
+COMPLETION_CACHE_SIZE = int(os.getenv('COMPLETION_CACHE_SIZE', 5000))
+COMPLETION_CACHE_MAX_TEMPERATURE = float(os.getenv('COMPLETION_CACHE_MAX_TEMPERATURE', 0.5))
+COMPLETION_CACHE_SIMILARITY = float(os.getenv('COMPLETION_CACHE_SIMILARITY', 0))  # e.g. 0.95, 0 disables
+ASGI_IO_THREADS = int(os.getenv('ASGI_IO_THREADS', 256))
+CONTEXT_TOKEN_BUDGET = int(os.getenv('CONTEXT_TOKEN_BUDGET', 1200))  # RAG facts per request, for models not listed below
+CONTEXT_TOKEN_BUDGETS = {
+    "gpt-3.5-turbo": int(os.getenv('CONTEXT_TOKEN_BUDGET_GPT35', 1200)),
+    "gpt-4o-mini": int(os.getenv('CONTEXT_TOKEN_BUDGET_GPT4O_MINI', 2000))
+}
+HISTORY_TOKEN_BUDGET = int(os.getenv('HISTORY_TOKEN_BUDGET', 250))
+HISTORY_MAX_MESSAGES = int(os.getenv('HISTORY_MAX_MESSAGES', 10))
+CONVERSATION_CACHE_SESSIONS = int(os.getenv('CONVERSATION_CACHE_SESSIONS', 10000))
+CONVERSATION_HISTORY_SIZE = int(os.getenv('CONVERSATION_HISTORY_SIZE', 50))  # messages kept per session
+CONVERSATION_REDIS_URL = os.getenv('CONVERSATION_REDIS_URL', '')  # e.g. redis://localhost:6379/0, empty keeps it in-process
+CONVERSATION_REFRESH_SECONDS = float(os.getenv('CONVERSATION_REFRESH_SECONDS', 30))  # re-read a session written by other workers
+# Without redis, workers only converge on conversation history every CONVERSATION_REFRESH_SECONDS, so one worker is the default
+ASGI_WORKERS = int(os.getenv('ASGI_WORKERS', 2 if CONVERSATION_REDIS_URL else 1))
 
 def get_firebase_backup():
     """Get Firebase Storage backup settings"""
     return {
         "bucket_name": FIREBASE_BUCKET,
-        "base_path": "ggdotcom/chromadb"
+        "base_path": "ggdotcom/chromadb",
+        "download_workers": BACKUP_DOWNLOAD_WORKERS,
+        "chunk_bytes": BACKUP_CHUNK_BYTES,
+        "index_ttl_seconds": BACKUP_INDEX_TTL_SECONDS,
+        "restore_on_start": CHROMA_RESTORE_ON_START,
+        "snapshot_min_chunk_bytes": SNAPSHOT_MIN_CHUNK_BYTES,
+        "snapshot_avg_chunk_bytes": SNAPSHOT_AVG_CHUNK_BYTES,
+        "snapshot_max_chunk_bytes": SNAPSHOT_MAX_CHUNK_BYTES,
+        "snapshot_retention": SNAPSHOT_RETENTION
+    }
+
+def get_rag_settings():
+    """Get RAG retrieval settings"""
+    return {
+        "index_refresh_seconds": RAG_INDEX_REFRESH_SECONDS,
+        "collection_watch_seconds": RAG_COLLECTION_WATCH_SECONDS,
+        "retrieval_mode": RAG_RETRIEVAL_MODE,
+        "max_distance": RAG_MAX_DISTANCE,
+        "chunk_token_budget": RAG_CHUNK_TOKEN_BUDGET
+    }
+
+def get_geocode_cache_settings():
+    """Get reverse-geocode cache settings"""
+    return {
+        "precision": GEOCODE_PRECISION,
+        "ttl_seconds": GEOCODE_TTL_SECONDS,
+        "max_entries": GEOCODE_CACHE_SIZE,
+        "db_path": GEOCODE_CACHE_DB or None
+    }
+
+def get_places_cache_settings():
+    """Get nearby-places tile cache settings"""
+    return {
+        "precision": PLACES_CACHE_PRECISION,
+        "radius": 500,
+        "ttl_seconds": PLACES_CACHE_TTL_SECONDS,
+        "max_entries": PLACES_CACHE_SIZE,
+        "prefetch": PLACES_PREFETCH,
+        "max_pages": PLACES_MAX_PAGES
+    }
+
+def get_message_writer_settings():
+    """Get batched Firestore writer settings"""
+    return {
+        "batch_size": FIRESTORE_BATCH_SIZE,
+        "flush_interval": FIRESTORE_FLUSH_SECONDS,
+        "max_queue": FIRESTORE_QUEUE_SIZE
+    }
+
+def get_image_store_settings():
+    """Get content-addressed image store settings"""
+    return {
+        "prefix": IMAGE_STORE_PREFIX,
+        "local_dir": IMAGE_STORE_DIR or None
+    }
+
+def get_completion_cache_settings():
+    """Get OpenAI completion cache settings"""
+    return {
+        "ttl_seconds": COMPLETION_CACHE_TTL_SECONDS,
+        "max_entries": COMPLETION_CACHE_SIZE,
+        "max_temperature": COMPLETION_CACHE_MAX_TEMPERATURE,
+        "similarity_threshold": COMPLETION_CACHE_SIMILARITY
+    }
+
+def get_ingestion_settings():
+    """Get Wikipedia ingestion pipeline settings"""
+    return {
+        "max_workers": INGEST_WORKERS,
+        "requests_per_second": INGEST_REQUESTS_PER_SECOND,
+        "batch_size": INGEST_BATCH_SIZE,
+        "max_retries": INGEST_MAX_RETRIES,
+        "max_age_days": INGEST_MAX_AGE_DAYS,
+        "chunk_max_tokens": CHUNK_MAX_TOKENS,
+        "chunk_overlap_tokens": CHUNK_OVERLAP_TOKENS
+    }
+
+def get_embedding_cache_settings():
+    """Get ingestion embedding cache settings"""
+    return {
+        "model_id": EMBEDDING_MODEL_ID,
+        "cache_dir": EMBEDDING_CACHE_DIR,
+        "batch_size": EMBEDDING_BATCH_SIZE,
+        "workers": EMBEDDING_WORKERS
+    }
+
+def get_context_settings():
+    """Get prompt context budget settings"""
+    return {
+        "default_budget": CONTEXT_TOKEN_BUDGET,
+        "model_budgets": dict(CONTEXT_TOKEN_BUDGETS),
+        "history_budget": HISTORY_TOKEN_BUDGET,
+        "history_max_messages": HISTORY_MAX_MESSAGES
+    }
+
+def get_conversation_store_settings():
+    """Get per-session conversation history cache settings"""
+    return {
+        "max_sessions": CONVERSATION_CACHE_SESSIONS,
+        "max_messages": CONVERSATION_HISTORY_SIZE,
+        "redis_url": CONVERSATION_REDIS_URL or None,
+        "refresh_seconds": CONVERSATION_REFRESH_SECONDS
+    }
+
+def get_asgi_settings():
+    """Get async serving settings"""
+    return {
+        "workers": ASGI_WORKERS,
+        "io_threads": ASGI_IO_THREADS
+    }
+
+def get_chroma_pool_settings():
+    """Get connection pool settings for the shared Chroma HTTP client"""
+    return {
+        "pool_size": CHROMA_POOL_SIZE,
+        "timeout": CHROMA_TIMEOUT_SECONDS,
+        "keepalive_seconds": CHROMA_KEEPALIVE_SECONDS
     }
 
 def get_chroma_settings():
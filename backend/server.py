@@ -8,13 +8,22 @@ import chromadb.server.fastapi
 
 load_dotenv()
 
+PERSIST_DIRECTORY = "chroma_db"
+
+# A cold replica with an empty persist directory rehydrates from the Firebase backup before Chroma opens it
+from config import get_firebase_backup
+backup_settings = get_firebase_backup()
+if backup_settings["restore_on_start"] and not os.path.exists(os.path.join(PERSIST_DIRECTORY, "chroma.sqlite3")):
+    from utils.firebase_backup import FirebaseBackup
+    FirebaseBackup(backup_settings["bucket_name"]).restore_collection(persist_dir=PERSIST_DIRECTORY)
+
 # Create the main FastAPI app
 app = FastAPI()
 
 # Create ChromaDB server with updated configuration
 settings = Settings(
     is_persistent=True,
-    persist_directory="chroma_db",
+    persist_directory=PERSIST_DIRECTORY,
     anonymized_telemetry=False,
     allow_reset=True,
     api_impl="rest",
@@ -0,0 +1,63 @@
+import random
+from difflib import SequenceMatcher
+
+from utils.attraction_matcher import AttractionMatcher, clean_name
+
+CATEGORIES = ("One", "Two", "Three")
+WORDS = ["gardens", "by", "the", "bay", "marina", "sands", "museum", "national", "park", "temple",
+         "sri", "mariamman", "chinatown", "heritage", "centre", "fort", "canning", "hill", "zoo", "night"]
+
+
+def scan(attractions_array, attraction_name):
+    """The linear scan AttractionMatcher replaced, as it was in WikipediaDataCollector"""
+    best_match = None
+    best_category = None
+    best_item = None
+    highest_ratio = 0.8
+
+    cleaned_attraction = clean_name(attraction_name)
+
+    for category in CATEGORIES:
+        for item in attractions_array[category]:
+            similarity = SequenceMatcher(None, clean_name(cleaned_attraction), clean_name(item["name"])).ratio()
+            if similarity > highest_ratio:
+                highest_ratio = similarity
+                best_match = item["name"]
+                best_category = category
+                best_item = item
+
+            if (cleaned_attraction in clean_name(item["name"]) or
+                    clean_name(item["name"]) in cleaned_attraction):
+                if similarity > 0.5:
+                    best_match = item["name"]
+                    best_category = category
+                    best_item = item
+                    highest_ratio = similarity
+
+    if best_match:
+        return best_category, best_item, highest_ratio
+    return None
+
+
+def random_name(rng):
+    name = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 4)))
+    if rng.random() < 0.3:
+        name = name.title() + rng.choice(["", " (Singapore)", " | Wikipedia", "!", "'s"])
+    return name
+
+
+def test_matches_linear_scan():
+    rng = random.Random(16)
+    for _ in range(300):
+        attractions = {category: [{"name": random_name(rng), "url": f"u{i}"} for i in range(rng.randint(0, 15))]
+                       for category in CATEGORIES}
+        matcher = AttractionMatcher(attractions)
+        for _ in range(10):
+            query = random_name(rng)
+            assert matcher.match(query) == scan(attractions, query), query
+
+
+def test_no_match_below_threshold():
+    matcher = AttractionMatcher({"One": [{"name": "Gardens by the Bay", "url": "u"}], "Two": [], "Three": []})
+    assert matcher.match("Sentosa") is None
+    assert matcher.match("gardens by the bay")[1]["url"] == "u"
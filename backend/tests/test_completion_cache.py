@@ -0,0 +1,108 @@
+from utils.completion_cache import CompletionCache
+
+MODEL = "gpt-4o-mini"
+
+
+def embed(texts):
+    # Questions that share their first word embed to the same direction
+    return [[1.0, 0.0] if text.split()[0].lower() == "what" else [0.0, 1.0] for text in texts]
+
+
+def messages(question, place="Lau Pa Sat"):
+    return [
+        {"role": "system", "content": f"You are a tour guide at {place}."},
+        {"role": "user", "content": f"Context about {place}. Question: {question}"}
+    ]
+
+
+def test_exact_hit_and_miss_are_counted():
+    cache = CompletionCache()
+    cache.put("chat", MODEL, messages("what is this"), 0.2, "A hawker centre")
+
+    assert cache.get("chat", MODEL, messages("what  is this"), 0.2) == "A hawker centre"
+    assert cache.get("chat", MODEL, messages("who built it"), 0.2) is None
+    assert cache.stats()["branches"]["chat"] == {"hits": 1, "similar_hits": 0, "misses": 1, "hit_rate": 0.5}
+
+
+def test_hot_temperatures_are_not_cached():
+    cache = CompletionCache(max_temperature=0.5)
+    cache.put("chat", MODEL, messages("what is this"), 0.9, "text")
+    assert cache.get("chat", MODEL, messages("what is this"), 0.9) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_similar_question_hits_only_within_the_same_place():
+    cache = CompletionCache(embedding_function=embed)
+    cache.put("chat", MODEL, messages("what is this"), 0.2, "A hawker centre", question="what is this")
+
+    assert cache.get("chat", MODEL, messages("what is that"), 0.2, question="what is that") == "A hawker centre"
+    assert cache.get("chat", MODEL, messages("what is that", place="Boat Quay"), 0.2,
+                     question="what is that") is None
+
+
+def test_non_ascii_question_is_scoped_without_errors():
+    cache = CompletionCache(embedding_function=embed)
+    question = "What is \"Lau Pa Sat\" — 老巴剎 ?"
+    cache.put("chat", MODEL, messages(question), 0.2, "A hawker centre", question=question)
+
+    other = "What does 老巴剎 mean?"
+    assert cache.get("chat", MODEL, messages(other), 0.2, question=other) == "A hawker centre"
+    assert cache.stats()["branches"]["chat"]["similar_hits"] == 1
+
+
+def test_question_matching_an_escape_sequence_or_key_is_blanked_in_content_only():
+    # json.dumps escapes 老 as \u8001, and "user" is also the role value
+    cache = CompletionCache(embedding_function=embed)
+    for question in ("8001", "user"):
+        cache.put("chat", MODEL, messages(question, place="老巴剎"), 0.2, question, question=question)
+        assert cache.get("chat", MODEL, messages(question, place="老巴剎"), 0.2, question=question) == question
+    assert cache.stats()["branches"]["chat"]["hits"] == 2
+
+
+def test_multimodal_content_blanks_text_parts_only():
+    cache = CompletionCache(embedding_function=embed)
+
+    def multimodal(question, image):
+        return [{"role": "user", "content": [
+            {"type": "text", "text": f"Question: {question}"},
+            {"type": "image_url", "image_url": {"url": image}}
+        ]}]
+
+    cache.put("image", MODEL, multimodal("what is this", "data:a"), 0.2, "A temple", question="what is this")
+
+    assert cache.get("image", MODEL, multimodal("what is that", "data:a"), 0.2, question="what is that") == "A temple"
+    assert cache.get("image", MODEL, multimodal("what is that", "data:b"), 0.2, question="what is that") is None
+
+
+def test_embedding_errors_count_as_misses():
+    def broken(texts):
+        raise RuntimeError("embedding service down")
+
+    cache = CompletionCache(embedding_function=broken)
+    cache.put("chat", MODEL, messages("what is this"), 0.2, "text", question="what is this")
+
+    assert cache.get("chat", MODEL, messages("what is that"), 0.2, question="what is that") is None
+    assert cache.get("chat", MODEL, messages("what is this"), 0.2, question="what is this") == "text"
+
+
+def test_lookup_errors_are_misses_not_exceptions():
+    dims = iter([2, 3])
+
+    def changing_model(texts):
+        return [[1.0] * next(dims)]
+
+    cache = CompletionCache(embedding_function=changing_model)
+    cache.put("chat", MODEL, messages("what is this"), 0.2, "text", question="what is this")
+
+    # The stored and the new question vectors cannot be compared
+    assert cache.get("chat", MODEL, messages("what is that"), 0.2, question="what is that") is None
+    assert cache.stats()["branches"]["chat"]["misses"] == 1
+
+
+def test_lru_evicts_the_oldest_entry():
+    cache = CompletionCache(max_entries=2)
+    for question in ("a", "b", "c"):
+        cache.put("chat", MODEL, messages(question), 0.2, question)
+
+    assert cache.get("chat", MODEL, messages("a"), 0.2) is None
+    assert cache.get("chat", MODEL, messages("c"), 0.2) == "c"
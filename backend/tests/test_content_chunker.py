@@ -0,0 +1,64 @@
+import hashlib
+
+import numpy as np
+
+from utils import content_chunker
+from utils.content_chunker import chunk_boundaries, iter_chunks
+
+MIN, AVG, MAX = 256, 1024, 4096
+
+
+def write(tmp_path, data, name="segment.bin"):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+def random_bytes(size, seed=1):
+    return np.random.default_rng(seed).integers(0, 256, size=size, dtype=np.uint8).tobytes()
+
+
+def test_chunks_reassemble_the_file_within_bounds(tmp_path):
+    data = random_bytes(200_000)
+    chunks = list(iter_chunks(write(tmp_path, data), MIN, AVG, MAX))
+
+    assert b"".join(chunk for _, chunk, _ in chunks) == data
+    assert all(MIN <= len(chunk) <= MAX for _, chunk, _ in chunks[:-1])
+    assert all(digest == hashlib.sha256(chunk).hexdigest() for _, chunk, digest in chunks)
+    assert [offset for offset, _, _ in chunks] == [0] + chunk_boundaries(write(tmp_path, data), MIN, AVG, MAX)[:-1]
+
+
+def test_insert_only_changes_the_chunks_around_it(tmp_path):
+    data = random_bytes(200_000)
+    before = {digest for _, _, digest in iter_chunks(write(tmp_path, data), MIN, AVG, MAX)}
+    edited = data[:1000] + b"inserted row" + data[1000:]
+    after = [digest for _, _, digest in iter_chunks(write(tmp_path, edited, "edited.bin"), MIN, AVG, MAX)]
+
+    changed = [digest for digest in after if digest not in before]
+    assert 1 <= len(changed) <= 3
+    assert len(after) - len(changed) > 0.9 * len(before)
+
+
+def test_runs_without_cut_points_are_split_at_max_bytes(tmp_path):
+    assert chunk_boundaries(write(tmp_path, b"\x00" * 10_000), MIN, AVG, MAX) == [4096, 8192, 10_000]
+    assert chunk_boundaries(write(tmp_path, b"", "empty.bin"), MIN, AVG, MAX) == []
+
+
+def test_vector_hash_matches_the_rolling_hash():
+    data = np.frombuffer(random_bytes(2000), dtype=np.uint8)
+    mask = np.uint32(((1 << 6) - 1) << 26)
+
+    h, expected = 0, []
+    for i, byte in enumerate(data):
+        h = ((h << 1) + int(content_chunker._GEAR[byte])) & 0xFFFFFFFF
+        if h & int(mask) == 0:
+            expected.append(i)
+    assert content_chunker._cut_candidates(data, mask).tolist() == expected
+
+
+def test_boundaries_do_not_depend_on_the_read_block_size(tmp_path, monkeypatch):
+    path = write(tmp_path, random_bytes(100_000))
+    whole = chunk_boundaries(path, MIN, AVG, MAX)
+
+    monkeypatch.setattr(content_chunker, "_BLOCK_BYTES", 4099)
+    assert chunk_boundaries(path, MIN, AVG, MAX) == whole
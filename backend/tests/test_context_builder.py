@@ -0,0 +1,46 @@
+from utils.context_builder import assemble_context, count_tokens
+
+MODEL = "gpt-3.5-turbo"
+
+
+def test_budget_keeps_the_highest_scored_chunks_in_reading_order():
+    chunks = [
+        {"text": "Lau Pa Sat opened in 1894.", "score": 0.2, "order": 0},
+        {"text": "It was designed by James MacRitchie.", "score": 0.9, "order": 1},
+        {"text": "Satay stalls line Boon Tat Street at night.", "score": 0.8, "order": 2},
+    ]
+    budget = count_tokens(chunks[1]["text"], MODEL) + count_tokens(chunks[2]["text"], MODEL)
+
+    assert assemble_context({"wikipedia": chunks}, MODEL, budget) == [chunks[1]["text"], chunks[2]["text"]]
+
+
+def test_higher_scored_chunk_listed_later_is_kept_over_earlier_ones():
+    chunks = [
+        {"text": "The market has a cast-iron frame.", "score": 0.1, "order": 0},
+        {"text": "It is the oldest Victorian structure in Southeast Asia.", "score": 0.95, "order": 1},
+    ]
+    budget = count_tokens(chunks[1]["text"], MODEL)
+
+    assert assemble_context({"wikipedia": chunks}, MODEL, budget) == [chunks[1]["text"]]
+
+
+def test_facts_without_order_keep_their_best_first_position():
+    context = {
+        "wikipedia": [
+            {"text": "Second in reading order.", "score": 0.9, "order": 1},
+            {"text": "First in reading order.", "score": 0.5, "order": 0},
+        ],
+        "places": ["A plain fact from another source."],
+    }
+
+    assert assemble_context(context, MODEL, 1000) == [
+        "A plain fact from another source.",
+        "First in reading order.",
+        "Second in reading order.",
+    ]
+
+
+def test_repeated_sentences_are_dropped():
+    context = {"wikipedia": ["Lau Pa Sat is a hawker centre.", "Lau Pa Sat is a hawker centre. It has satay."]}
+
+    assert assemble_context(context, MODEL, 1000) == ["Lau Pa Sat is a hawker centre.", "It has satay."]
@@ -0,0 +1,99 @@
+from datetime import datetime
+
+from utils.conversation_store import ConversationStore
+
+
+class FirestoreSession:
+    """Messages of one tour document as the loader sees them"""
+
+    def __init__(self, messages=None, fail=0):
+        self.messages = list(messages or [])
+        self.fail = fail
+        self.loads = 0
+
+    def load(self, session_id):
+        self.loads += 1
+        if self.fail:
+            self.fail -= 1
+            raise RuntimeError("Firestore unavailable")
+        return list(self.messages)
+
+
+def message(text, repeat=0):
+    return {"chatText": text, "userCheck": "false", "repeat": repeat, "timestamp": datetime(2024, 1, 1)}
+
+
+def test_history_is_hydrated_once_and_then_served_from_memory():
+    firestore = FirestoreSession([message("a", 1), message("b", 2)])
+    store = ConversationStore(firestore.load, refresh_seconds=0)
+
+    assert [m["chatText"] for m in store.history("s1")] == ["a", "b"]
+    assert store.latest_repeat("s1") == 2
+    assert store.recent_texts("s1", 5) == ["b", "a"]
+    assert firestore.loads == 1
+    assert store.stats()["hits"] == 2
+
+
+def test_append_extends_hydrated_history():
+    firestore = FirestoreSession([message("a", 1)])
+    store = ConversationStore(firestore.load, refresh_seconds=0, max_messages=2)
+    store.append("s1", message("b", 2))
+    store.append("s1", message("c", 3))
+
+    assert [m["chatText"] for m in store.history("s1")] == ["b", "c"]
+    assert store.history("s1")[-1]["timestamp"] == "2024-01-01T00:00:00"
+    assert firestore.loads == 1
+
+
+def test_failed_hydration_is_not_cached():
+    firestore = FirestoreSession([message("a", 1)], fail=1)
+    store = ConversationStore(firestore.load, refresh_seconds=0)
+
+    store.append("s1", message("b", 2))  # hydration fails, the message is not cached on its own
+    firestore.messages.append(message("b", 2))
+
+    assert [m["chatText"] for m in store.history("s1")] == ["a", "b"]
+    assert firestore.loads == 2
+
+
+def test_writes_from_another_worker_are_seen_after_refresh_seconds(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("utils.conversation_store.time.monotonic", lambda: now[0])
+    firestore = FirestoreSession([message("a", 1)])
+    worker_a = ConversationStore(firestore.load, refresh_seconds=30)
+    worker_b = ConversationStore(firestore.load, refresh_seconds=30)
+    assert worker_a.latest_repeat("s1") == worker_b.latest_repeat("s1") == 1
+
+    worker_b.append("s1", message("b", 2))
+    firestore.messages.append(message("b", 2))
+    now[0] += 10
+    assert worker_a.latest_repeat("s1") == 1
+
+    now[0] += 25
+    assert worker_a.latest_repeat("s1") == 2
+    assert firestore.loads == 3
+
+
+def test_failed_refresh_keeps_the_stale_copy(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("utils.conversation_store.time.monotonic", lambda: now[0])
+    firestore = FirestoreSession([message("a", 1)])
+    store = ConversationStore(firestore.load, refresh_seconds=30)
+    store.history("s1")
+
+    firestore.fail = 1
+    now[0] += 60
+    assert [m["chatText"] for m in store.history("s1")] == ["a"]
+    assert [m["chatText"] for m in store.history("s1")] == ["a"]
+    assert firestore.loads == 3
+
+
+def test_lru_drops_the_least_recent_session():
+    firestore = FirestoreSession([message("a")])
+    store = ConversationStore(firestore.load, refresh_seconds=0, max_sessions=2)
+    for session_id in ("s1", "s2", "s1", "s3"):
+        store.history(session_id)
+
+    assert store.stats()["sessions"] == 2
+    store.history("s2")
+    assert firestore.loads == 4
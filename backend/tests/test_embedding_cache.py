@@ -0,0 +1,48 @@
+import numpy as np
+
+from utils.embedding_cache import EmbeddingCache
+
+
+def embed(texts):
+    return [[float(len(text)), float(i), 0.5, -1.0] for i, text in enumerate(texts)]
+
+
+def test_reload_serves_cached_vectors(tmp_path):
+    cache = EmbeddingCache(embed, "model", cache_dir=str(tmp_path))
+    first = cache.embed(["alpha", "beta"])
+
+    reloaded = EmbeddingCache(lambda texts: 1 / 0, "model", cache_dir=str(tmp_path))
+    assert reloaded.dim == 4
+    assert reloaded.embed(["beta", "alpha"]) == [first[1], first[0]]
+
+
+def test_reload_after_crash_between_appends(tmp_path):
+    cache = EmbeddingCache(embed, "model", cache_dir=str(tmp_path))
+    expected = cache.embed(["alpha", "beta", "gamma"])
+
+    # Vectors of the next batch landed, their keys and half of another row did not
+    with open(cache.vectors_path, "ab") as f:
+        f.write(np.ones((1, 4), dtype=np.float32).tobytes())
+        f.write(np.ones(2, dtype=np.float32).tobytes())
+    with open(cache.keys_path, "a") as f:
+        f.write("deadbeef")  # partial key line
+
+    reloaded = EmbeddingCache(embed, "model", cache_dir=str(tmp_path))
+    assert reloaded.dim == 4
+    assert reloaded.embed(["alpha", "beta", "gamma"]) == expected
+    assert reloaded.misses == 0
+
+    # Appends after the repair stay aligned with their keys
+    delta = reloaded.embed(["delta"])
+    again = EmbeddingCache(lambda texts: 1 / 0, "model", cache_dir=str(tmp_path))
+    assert again.embed(["delta", "alpha"]) == [delta[0], expected[0]]
+
+
+def test_cache_without_metadata_starts_empty(tmp_path):
+    cache = EmbeddingCache(embed, "model", cache_dir=str(tmp_path))
+    cache.embed(["alpha"])
+    (tmp_path / "model.meta").unlink()
+
+    reloaded = EmbeddingCache(embed, "model", cache_dir=str(tmp_path))
+    assert reloaded.stats()["entries"] == 0
+    assert reloaded.embed(["alpha"]) == embed(["alpha"])
@@ -0,0 +1,65 @@
+from types import SimpleNamespace
+
+from utils.etag import etag_matches, messages_etag
+
+
+class MessagesRef:
+    """Firestore messages collection as the ETag computation queries it"""
+
+    def __init__(self, documents):
+        self.documents = documents
+        self.streamed = 0
+
+    def count(self):
+        return SimpleNamespace(get=lambda: [[SimpleNamespace(value=len(self.documents))]])
+
+    def order_by(self, field, direction=None):
+        return self
+
+    def limit(self, n):
+        return self
+
+    def select(self, fields):
+        return self
+
+    def stream(self):
+        self.streamed += 1
+        return iter(self.documents[-1:])
+
+
+def document(doc_id, update_time="2024-01-01T00:00:00Z"):
+    return SimpleNamespace(id=doc_id, update_time=update_time)
+
+
+def test_unchanged_collection_keeps_its_etag():
+    ref = MessagesRef([document("a"), document("b")])
+    etag = messages_etag(ref, "limit=20")
+
+    assert etag == messages_etag(ref, "limit=20")
+    assert etag.startswith('"') and etag.endswith('"')
+    assert ref.streamed == 2
+
+
+def test_count_newest_message_and_query_change_the_etag():
+    ref = MessagesRef([document("a"), document("b")])
+    etag = messages_etag(ref, "limit=20")
+
+    assert messages_etag(ref, "limit=50") != etag
+    # A batched writer committed an older message: the newest document is unchanged
+    ref.documents.insert(0, document("older"))
+    assert messages_etag(ref, "limit=20") != etag
+
+    ref.documents[-1] = document("b", update_time="2024-01-02T00:00:00Z")
+    assert len({etag, messages_etag(ref, "limit=20"), messages_etag(MessagesRef([]), "limit=20")}) == 3
+
+
+def test_if_none_match_lists_weak_tags_and_wildcard():
+    etag = '"abc123"'
+
+    assert etag_matches('"abc123"', etag)
+    assert etag_matches('"zzz", "abc123"', etag)
+    assert etag_matches('W/"abc123"', etag)
+    assert etag_matches('*', etag)
+    assert not etag_matches('', etag)
+    assert not etag_matches('"abc1"', etag)
+    assert not etag_matches('"xabc123"', etag)
@@ -0,0 +1,75 @@
+import pytest
+
+from utils.geocode_cache import GeocodeCache
+
+LAT, LNG = 1.2836, 103.8440
+
+
+class FakeMaps:
+    def __init__(self, results=None, fail=0):
+        self.results = results if results is not None else [{"formatted_address": "18 Raffles Quay, Singapore"}]
+        self.fail = fail
+        self.calls = 0
+
+    def reverse_geocode(self, latlng):
+        self.calls += 1
+        if self.fail:
+            self.fail -= 1
+            raise RuntimeError("OVER_QUERY_LIMIT")
+        return self.results
+
+
+def test_nearby_points_in_the_same_cell_share_one_lookup():
+    gmap = FakeMaps()
+    cache = GeocodeCache(gmap, precision=7)
+
+    assert cache.reverse_geocode(LAT, LNG) == gmap.results
+    assert cache.reverse_geocode(LAT + 0.00001, LNG + 0.00001) == gmap.results
+    assert gmap.calls == 1
+    assert cache.stats()["hits"] == 1
+
+
+def test_disk_tier_survives_a_restart(tmp_path):
+    db_path = str(tmp_path / "geocode.sqlite3")
+    GeocodeCache(FakeMaps(), db_path=db_path).reverse_geocode(LAT, LNG)
+
+    gmap = FakeMaps()
+    restarted = GeocodeCache(gmap, db_path=db_path)
+    assert restarted.reverse_geocode(LAT, LNG)[0]["formatted_address"] == "18 Raffles Quay, Singapore"
+    assert gmap.calls == 0
+    assert restarted.stats()["disk_hits"] == 1
+
+
+def test_expired_entries_are_looked_up_again(monkeypatch, tmp_path):
+    now = [1000.0]
+    monkeypatch.setattr("utils.geocode_cache.time.time", lambda: now[0])
+    gmap = FakeMaps()
+    cache = GeocodeCache(gmap, ttl_seconds=60, db_path=str(tmp_path / "geocode.sqlite3"))
+    cache.reverse_geocode(LAT, LNG)
+
+    now[0] += 61
+    cache.reverse_geocode(LAT, LNG)
+    assert gmap.calls == 2
+
+
+def test_errors_and_empty_results_are_not_cached():
+    gmap = FakeMaps(fail=1)
+    cache = GeocodeCache(gmap)
+    with pytest.raises(RuntimeError):
+        cache.reverse_geocode(LAT, LNG)
+    assert cache.reverse_geocode(LAT, LNG) == gmap.results
+
+    empty = FakeMaps(results=[])
+    cache = GeocodeCache(empty)
+    cache.reverse_geocode(LAT, LNG)
+    cache.reverse_geocode(LAT, LNG)
+    assert empty.calls == 2
+
+
+def test_unusable_disk_path_falls_back_to_memory(tmp_path):
+    gmap = FakeMaps()
+    cache = GeocodeCache(gmap, db_path=str(tmp_path / "missing" / "geocode.sqlite3"))
+
+    cache.reverse_geocode(LAT, LNG)
+    cache.reverse_geocode(LAT, LNG)
+    assert gmap.calls == 1
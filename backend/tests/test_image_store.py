@@ -0,0 +1,95 @@
+import base64
+import struct
+
+import pytest
+
+from utils.image_store import ImageStore, image_dimensions
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00\x00\x00\rIHDR' + struct.pack('>II', 640, 480) + b'\x08\x02\x00\x00\x00'
+
+
+def data_url(data, mime="image/png"):
+    return f"data:{mime};base64,{base64.b64encode(data).decode()}"
+
+
+class FlakyBucket:
+    """Storage bucket whose first `fail` uploads raise"""
+
+    def __init__(self, fail=0):
+        self.fail = fail
+        self.objects = {}
+        self.uploads = 0
+
+    def blob(self, path):
+        bucket = self
+
+        class Blob:
+            def exists(self):
+                return path in bucket.objects
+
+            def upload_from_string(self, data, content_type=None):
+                bucket.uploads += 1
+                if bucket.fail:
+                    bucket.fail -= 1
+                    raise RuntimeError("503 Service Unavailable")
+                bucket.objects[path] = data
+
+            def download_as_bytes(self):
+                return bucket.objects[path]
+
+        return Blob()
+
+
+def test_identical_images_are_stored_once(tmp_path):
+    store = ImageStore(local_dir=str(tmp_path))
+    first, stored = store.put_data_url(data_url(PNG))
+    assert stored.result(timeout=5) is True
+
+    second, again = store.put_data_url(data_url(PNG))
+    assert again.result(timeout=5) is True
+    assert second["path"] == first["path"] == f"ggdotcom/images/{first['sha256']}.png"
+    assert (first["width"], first["height"]) == (640, 480)
+    assert store.get(first["path"]) == PNG
+    assert store.stats() == {"uploads": 1, "duplicates": 1}
+
+
+def test_failed_upload_resolves_false_and_is_retried():
+    bucket = FlakyBucket(fail=1)
+    store = ImageStore(bucket=bucket)
+
+    reference, stored = store.put_data_url(data_url(PNG))
+    assert stored.result(timeout=5) is False
+    assert store.get(reference["path"]) is None
+
+    _, retried = store.put_data_url(data_url(PNG))
+    assert retried.result(timeout=5) is True
+    assert bucket.uploads == 2
+    assert store.get(reference["path"]) == PNG
+
+
+def test_known_uploads_stay_bounded(tmp_path):
+    store = ImageStore(local_dir=str(tmp_path), max_known=2)
+    for i in range(5):
+        store.put_data_url(data_url(PNG + bytes([i])))[1].result(timeout=5)
+
+    assert len(store._known) == 2
+    # A forgotten image is found on disk instead of being written again
+    store.put_data_url(data_url(PNG + bytes([0])))[1].result(timeout=5)
+    assert store.stats() == {"uploads": 5, "duplicates": 1}
+
+
+def test_bare_base64_defaults_to_jpeg_and_bad_input_raises(tmp_path):
+    store = ImageStore(local_dir=str(tmp_path))
+    reference, stored = store.put_data_url(base64.b64encode(b"not really a jpeg").decode())
+    assert stored.result(timeout=5) is True
+    assert reference["contentType"] == "image/jpeg" and reference["path"].endswith(".jpg")
+    assert (reference["width"], reference["height"]) == (None, None)
+
+    with pytest.raises(ValueError):
+        store.put_data_url("data:image/png;base64,abc")
+
+
+def test_jpeg_dimensions_come_from_the_frame_header():
+    jpeg = b'\xff\xd8' + b'\xff\xe0' + struct.pack('>H', 4) + b'\x00\x00' \
+        + b'\xff\xc0' + struct.pack('>HBHH', 17, 8, 300, 400) + b'\x00' * 12
+    assert image_dimensions(jpeg) == (400, 300)
@@ -0,0 +1,112 @@
+import itertools
+import threading
+
+from utils.message_writer import MessageWriter
+
+
+class FakeDocument:
+    def __init__(self, store, doc_id):
+        self.store = store
+        self.id = doc_id
+
+    def set(self, data):
+        self.store.docs[self.id] = data
+
+
+class FakeCollection:
+    def __init__(self):
+        self.docs = {}
+        self._ids = itertools.count()
+
+    def document(self):
+        return FakeDocument(self, f"doc{next(self._ids)}")
+
+
+class FakeBatch:
+    def __init__(self, db):
+        self.db = db
+        self.writes = []
+
+    def set(self, document_ref, data):
+        self.writes.append((document_ref, data))
+
+    def commit(self):
+        for document_ref, data in self.writes:
+            document_ref.set(data)
+        self.db.commits += 1
+        if self.db.fail_after_commit:
+            # The write landed but the client saw an error, e.g. a deadline exceeded
+            self.db.fail_after_commit -= 1
+            raise TimeoutError("Deadline Exceeded")
+
+
+class FakeDB:
+    def __init__(self, fail_after_commit=0):
+        self.fail_after_commit = fail_after_commit
+        self.commits = 0
+
+    def batch(self):
+        return FakeBatch(self)
+
+
+def test_messages_are_committed_in_batches():
+    db, messages = FakeDB(), FakeCollection()
+    writer = MessageWriter(db, batch_size=10, flush_interval=60)
+    for i in range(25):
+        writer.add(messages, {"chatText": str(i)})
+
+    assert writer.flush()
+    assert sorted(int(d["chatText"]) for d in messages.docs.values()) == list(range(25))
+    assert writer.stats()["commits"] == 3
+    writer.close()
+
+
+def test_retried_commit_does_not_duplicate_messages():
+    db, messages = FakeDB(fail_after_commit=2), FakeCollection()
+    writer = MessageWriter(db, batch_size=5, flush_interval=60, backoff_seconds=0)
+    for i in range(5):
+        writer.add(messages, {"chatText": str(i)})
+
+    assert writer.flush()
+    assert db.commits == 3
+    assert len(messages.docs) == 5
+    assert writer.stats()["written"] == 5
+    writer.close()
+
+
+def test_commit_failure_is_counted_after_the_last_retry():
+    db, messages = FakeDB(fail_after_commit=10), FakeCollection()
+    writer = MessageWriter(db, batch_size=2, flush_interval=60, max_retries=1, backoff_seconds=0)
+    writer.add(messages, {"chatText": "a"})
+    writer.add(messages, {"chatText": "b"})
+
+    assert writer.flush()
+    assert writer.stats()["failed"] == 2
+    writer.close()
+
+
+def test_add_after_close_is_written_inline():
+    db, messages = FakeDB(), FakeCollection()
+    writer = MessageWriter(db, flush_interval=60)
+    writer.add(messages, {"chatText": "queued"})
+    writer.close()
+    writer.add(messages, {"chatText": "late"})
+
+    assert sorted(d["chatText"] for d in messages.docs.values()) == ["late", "queued"]
+    assert writer.stats()["inline_writes"] == 1
+
+
+def test_concurrent_adds_during_close_are_not_lost():
+    db, messages = FakeDB(), FakeCollection()
+    writer = MessageWriter(db, batch_size=7, flush_interval=60)
+    threads = [
+        threading.Thread(target=lambda n=n: [writer.add(messages, {"chatText": f"{n}-{i}"}) for i in range(200)])
+        for n in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    writer.close()
+    for thread in threads:
+        thread.join()
+
+    assert len(messages.docs) == 800
@@ -0,0 +1,73 @@
+import hashlib
+
+from utils.place_index import PlaceIndex
+
+
+def metadata(name, text, **extra):
+    return {"name": name, "content_hash": hashlib.sha256(text.encode()).hexdigest(), **extra}
+
+
+class FakeCollection:
+    def __init__(self):
+        self.records = {}
+        self.fetched_documents = []
+
+    def put(self, doc_id, text, **extra):
+        self.records[doc_id] = (text, metadata(doc_id, text, **extra))
+
+    def get(self, ids=None, include=None, limit=None, offset=None):
+        selected = [doc_id for doc_id in self.records if ids is None or doc_id in ids]
+        selected = selected[offset or 0:]
+        if limit is not None:
+            selected = selected[:limit]
+        result = {"ids": selected, "metadatas": [self.records[i][1] for i in selected]}
+        if "documents" in (include or []):
+            self.fetched_documents.extend(selected)
+            result["documents"] = [self.records[i][0] for i in selected]
+        return result
+
+
+def test_refresh_refetches_text_changed_under_the_same_metadata_keys():
+    collection = FakeCollection()
+    collection.put("a", "Lau Pa Sat is a hawker centre")
+    collection.put("b", "Boat Quay is on the river")
+    index = PlaceIndex()
+    index.build(collection)
+
+    collection.put("a", "Lau Pa Sat is a festival market")
+    collection.fetched_documents.clear()
+    stats = index.refresh(collection, page_size=1)
+
+    assert stats == {"added": 0, "updated": 1, "removed": 0}
+    assert collection.fetched_documents == ["a"]
+    assert [doc for doc, _ in index.search("festival")] == ["Lau Pa Sat is a festival market"]
+    assert index.search("hawker") == []
+
+
+def test_refresh_applies_metadata_only_changes_without_fetching_text():
+    collection = FakeCollection()
+    collection.put("a", "Lau Pa Sat is a hawker centre", last_verified="2024-01-01")
+    index = PlaceIndex()
+    index.build(collection)
+
+    collection.put("a", "Lau Pa Sat is a hawker centre", last_verified="2024-06-01")
+    collection.put("c", "Chinatown Heritage Centre")
+    collection.fetched_documents.clear()
+    stats = index.refresh(collection)
+
+    assert stats == {"added": 1, "updated": 1, "removed": 0}
+    assert collection.fetched_documents == ["c"]
+    assert index.search("hawker")[0][1]["last_verified"] == "2024-06-01"
+
+
+def test_refresh_drops_deleted_documents():
+    collection = FakeCollection()
+    collection.put("a", "Lau Pa Sat")
+    collection.put("b", "Boat Quay")
+    index = PlaceIndex()
+    index.build(collection)
+
+    del collection.records["b"]
+    assert index.refresh(collection)["removed"] == 1
+    assert index.search("Boat") == []
+    assert len(index) == 1
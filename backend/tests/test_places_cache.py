@@ -0,0 +1,95 @@
+import threading
+import time
+from concurrent.futures import Future
+
+import pytest
+
+from utils import geohash
+from utils.places_cache import NearbyPlacesCache
+
+LAT, LNG = 1.2836, 103.8440
+
+
+def place(name, lat=LAT, lng=LNG):
+    return {"name": name, "geometry": {"location": {"lat": lat, "lng": lng}}}
+
+
+class FakeMaps:
+    def __init__(self, pages=1, fail=0):
+        self.pages = pages
+        self.fail = fail
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def places_nearby(self, location=None, radius=None, type=None, language=None, page_token=None):
+        with self.lock:
+            self.calls.append(page_token)
+            if self.fail:
+                self.fail -= 1
+                raise RuntimeError("OVER_QUERY_LIMIT")
+        page = int(page_token) if page_token else 0
+        result = {"results": [place(f"p{page}-{i}") for i in range(20)]}
+        if page + 1 < self.pages:
+            result["next_page_token"] = str(page + 1)
+        return result
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_second_lookup_in_the_same_cell_is_a_hit():
+    gmap = FakeMaps()
+    cache = NearbyPlacesCache(gmap, prefetch=False, page_token_delay=0)
+
+    first = cache.places_nearby(LAT, LNG)
+    second = cache.places_nearby(LAT + 0.0001, LNG)
+
+    assert len(gmap.calls) == 1
+    assert second == first
+    assert cache.stats()["hits"] == 1
+
+
+def test_request_miss_answers_from_the_first_page_and_completes_in_background():
+    gmap = FakeMaps(pages=3)
+    cache = NearbyPlacesCache(gmap, prefetch=False, max_pages=3, page_token_delay=0)
+
+    assert len(cache.places_nearby(LAT, LNG)["results"]) == 20
+
+    wait_for(lambda: len(gmap.calls) == 3)
+    wait_for(lambda: len(cache.places_nearby(LAT, LNG)["results"]) == 60)
+    assert len(gmap.calls) == 3
+
+
+def test_prefetch_follows_every_page():
+    gmap = FakeMaps(pages=3)
+    cache = NearbyPlacesCache(gmap, max_pages=2, page_token_delay=0)
+    cell = geohash.encode(LAT, LNG, cache.precision)
+
+    _, future, _ = cache._lookup(cell, prefetch=True)
+
+    assert len(future.result(timeout=2)) == 40
+    assert gmap.calls == [None, "1"]
+
+
+def test_request_waiting_on_a_failed_fetch_fetches_directly():
+    gmap = FakeMaps()
+    cache = NearbyPlacesCache(gmap, prefetch=False, page_token_delay=0)
+    failed = Future()
+    failed.set_exception(RuntimeError("OVER_QUERY_LIMIT"))
+    cache._inflight[geohash.encode(LAT, LNG, cache.precision)] = failed
+
+    assert len(cache.places_nearby(LAT, LNG)["results"]) == 20
+    assert gmap.calls == [None]
+
+
+def test_request_path_error_is_raised_and_not_cached():
+    gmap = FakeMaps(fail=1)
+    cache = NearbyPlacesCache(gmap, prefetch=False, page_token_delay=0)
+
+    with pytest.raises(RuntimeError):
+        cache.places_nearby(LAT, LNG)
+    assert len(cache.places_nearby(LAT, LNG)["results"]) == 20
@@ -2,82 +2,357 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 import chromadb
+from chromadb.utils import embedding_functions
 from datetime import datetime, timedelta
 from collections import defaultdict
 import sys
 import os
 import json
+import threading
+import time
 from typing import Dict, List
 from utils.firebase_backup import FirebaseBackup
+from utils.place_index import PlaceIndex
+from utils.chroma_client import get_chroma_client
+from utils.collection_alias import resolve_alias
+from utils.context_builder import count_tokens
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
-from backend.config import get_chroma_settings, get_firebase_backup
+from backend.config import get_chroma_settings, get_firebase_backup, get_rag_settings
 
 class RAGManager:
+    """Retrieval over the Wikipedia collection.
+
+    Construction does no network I/O. Clients are created on first use, and
+    start_warm_up() runs collection discovery and the place index build in a
+    background thread. state and status() report progress for health checks.
+    """
+
     def __init__(self):
-        settings = get_chroma_settings()
-        self.client = chromadb.HttpClient(
-            host=settings["chroma_host"],
-            port=settings["chroma_port"],
-            ssl=settings["chroma_ssl"],
-            headers={"X-Api-Key": settings["chroma_api_key"]} if settings["chroma_api_key"] else None
-        )
+        self.settings = get_chroma_settings()
         self.collections = {}
-        self.firebase_backup = FirebaseBackup(settings["firebase_backup"]["bucket_name"])
         self.collection_id = None  # Will store the active collection ID
-        self.initialize_collections()
+        self.place_index = PlaceIndex()
+        rag_settings = get_rag_settings()
+        self.index_refresh_seconds = rag_settings["index_refresh_seconds"]
+        self.collection_watch_seconds = rag_settings["collection_watch_seconds"]
+        self.retrieval_mode = rag_settings["retrieval_mode"]
+        self.max_distance = rag_settings["max_distance"]
+        self.chunk_token_budget = rag_settings["chunk_token_budget"]
+        self._chunks_retry_at = 0.0  # monotonic time before which a missing chunk collection is not re-probed
+        self._refresh_stop = threading.Event()
+        self._init_lock = threading.Lock()
+        self._client = None
+        self._firebase_backup = None
+        self._embedding_function = None
+        self._handles = {}  # collection name -> handle, replaced when the collection is rebuilt
+        self.collection_counts = {}  # collection name -> document count as of the last watch
+        self.ready = threading.Event()
+        self.state = "cold"  # cold -> warming -> ready | failed
+        self.warm_up_error = None
+        self.warm_up_seconds = None
+
+    @property
+    def client(self):
+        with self._init_lock:
+            if self._client is None:
+                self._client = get_chroma_client(self.settings)
+            return self._client
+
+    @property
+    def firebase_backup(self) -> FirebaseBackup:
+        with self._init_lock:
+            if self._firebase_backup is None:
+                self._firebase_backup = FirebaseBackup(self.settings["firebase_backup"]["bucket_name"])
+            return self._firebase_backup
+
+    @property
+    def embedding_function(self):
+        # Same embedding model WikipediaDataCollector used when writing the collection
+        with self._init_lock:
+            if self._embedding_function is None:
+                self._embedding_function = embedding_functions.DefaultEmbeddingFunction()
+            return self._embedding_function
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        return self.embedding_function(texts)
+
+    def warm_up(self) -> None:
+        """Connect, find the collection and build the place index"""
+        started = time.monotonic()
+        self.state = "warming"
+        try:
+            if not self.initialize_collections():
+                raise RuntimeError("No collection available from ChromaDB or the Firebase backup")
+            self.build_place_index()
+            self.start_index_refresher()
+            self.state = "ready"
+        except Exception as e:
+            self.state = "failed"
+            self.warm_up_error = str(e)
+            print(f"RAG warm-up failed: {str(e)}")
+        finally:
+            self.warm_up_seconds = round(time.monotonic() - started, 3)
+            self.ready.set()
+
+    def start_warm_up(self) -> None:
+        """Run warm_up in a daemon thread so importing workers can serve immediately"""
+        if self.state != "cold":
+            return
+        self.state = "warming"
+        threading.Thread(target=self.warm_up, name="rag-warm-up", daemon=True).start()
+
+    def status(self) -> Dict:
+        return {
+            "state": self.state,
+            "collection_id": self.collection_id,
+            "collections": list(self.collections),
+            "collection_counts": dict(self.collection_counts),
+            "indexed_documents": len(self.place_index),
+            "warm_up_seconds": self.warm_up_seconds,
+            "error": self.warm_up_error
+        }
 
-    def initialize_collections(self):
-        """Initialize by finding available collections in Firebase"""
+    def initialize_collections(self) -> bool:
+        """Initialize by finding available collections in Firebase.
+
+        Returns False when neither ChromaDB nor the Firebase backup gave a collection.
+        """
         try:
             # First try to get collection from ChromaDB
-            self.collections["wikipedia"] = self.client.get_collection("wikipedia_collection")
+            self.collections["wikipedia"] = self.collection_handle("wikipedia_collection")
             print("Successfully initialized ChromaDB collection")
+            return True
         except Exception as e:
             print(f"ChromaDB collection error: {str(e)}")
             print("Attempting to restore from Firebase backup...")
             
             # List available collections in Firebase
-            available_collections = self.firebase_backup.list_firebase_collections()
+            try:
+                available_collections = self.firebase_backup.list_firebase_collections()
+            except Exception as backup_error:
+                print(f"Firebase backup error: {str(backup_error)}")
+                available_collections = []
             print("Available collections in Firebase:", available_collections)
             
             if available_collections:
                 # Use the first available collection
                 self.collection_id = available_collections[0]
                 print(f"Using collection ID: {self.collection_id}")
+                return True
             else:
                 print("No collections found in Firebase")
                 self.collection_id = None
+                return False
+
+    def resolve(self, name: str) -> str:
+        """Follow a collection alias, so shadow rebuilds are picked up by name"""
+        return resolve_alias(self.client, name)
+
+    def collection_handle(self, name: str):
+        """Cached collection handle; only the background watcher re-fetches it"""
+        handle = self._handles.get(name)
+        if handle is None:
+            handle = self.firebase_backup.chroma_client.get_collection(
+                self.resolve(name),
+                embedding_function=self.embedding_function
+            )
+            self._handles[name] = handle
+            self.collection_counts.setdefault(name, handle.count())
+        return handle
+
+    def _index_collection(self):
+        """Collection that query_place reads documents from, None when ChromaDB was unreachable"""
+        return self.collections.get("wikipedia")
+
+    def refresh_collection_metadata(self) -> None:
+        """Refresh cached document counts and swap handles of collections that were rebuilt or re-aliased"""
+        for name, previous in list(self._handles.items()):
+            try:
+                fresh = self.firebase_backup.chroma_client.get_collection(
+                    self.resolve(name),
+                    embedding_function=self.embedding_function
+                )
+                self.collection_counts[name] = fresh.count()
+            except Exception as e:
+                print(f"Error checking collection '{name}': {str(e)}")
+                continue
+
+            if getattr(fresh, "id", None) != getattr(previous, "id", None):
+                # Recreated under the same name or alias swapped to a shadow: old handle and index are stale
+                print(f"Collection '{name}' was rebuilt ({previous.id} -> {fresh.id})")
+                self._handles[name] = fresh
+                if name == "wikipedia_collection":
+                    self.collections["wikipedia"] = fresh
+                    self.build_place_index()
+
+    def build_place_index(self) -> None:
+        """Warm the in-process place index so lookups never download the collection"""
+        if self._index_collection() is None:
+            return
+        try:
+            self.place_index.build(self._index_collection())
+        except Exception as e:
+            print(f"Error building place index: {str(e)}")
+
+    def refresh_place_index(self) -> None:
+        """Pull only new, changed or deleted documents into the place index"""
+        if self._index_collection() is None:
+            return
+        try:
+            self.place_index.refresh(self._index_collection())
+        except Exception as e:
+            print(f"Error refreshing place index: {str(e)}")
 
-    def query_place(self, place_name: str, limit: int = 3, similarity_threshold: float = 0.5) -> dict:
+    def start_index_refresher(self) -> None:
+        """Watch collections every collection_watch_seconds and refresh the place index every index_refresh_seconds"""
+        if not self._handles or self.collection_watch_seconds <= 0:
+            return
+
+        def run():
+            last_index_refresh = time.monotonic()
+            while not self._refresh_stop.wait(self.collection_watch_seconds):
+                self.refresh_collection_metadata()
+                if self.index_refresh_seconds > 0 and time.monotonic() - last_index_refresh >= self.index_refresh_seconds:
+                    self.refresh_place_index()
+                    last_index_refresh = time.monotonic()
+
+        threading.Thread(target=run, name="rag-collection-watcher", daemon=True).start()
+
+    def query_place_vector(self, place_name: str, limit: int = 3, max_distance: float = None) -> List[Dict]:
+        """Nearest-neighbour search against the stored embeddings, returning real distances"""
+        collection = self._index_collection()
+        if collection is None:
+            return []
+        response = collection.query(
+            query_texts=[place_name],
+            n_results=limit,
+            include=["documents", "metadatas", "distances"]
+        )
+
+        hits = []
+        documents = (response.get("documents") or [[]])[0]
+        metadatas = (response.get("metadatas") or [[]])[0] or [{}] * len(documents)
+        distances = (response.get("distances") or [[]])[0]
+        for doc, metadata, distance in zip(documents, metadatas, distances):
+            if max_distance is not None and distance > max_distance:
+                continue
+            hits.append({"document": doc, "metadata": metadata or {}, "distance": distance})
+        return hits
+
+    def matching_place_ids(self, place_name: str) -> List[str]:
+        """place_ids of the documents query_place would return for this place.
+
+        In vector mode these are the nearest documents, otherwise the indexed
+        documents that mention the place by name.
+        """
+        if self.retrieval_mode == "vector":
+            hits = self.query_place_vector(place_name, max_distance=self.max_distance)
+            return [hit["metadata"]["place_id"] for hit in hits if hit["metadata"].get("place_id")]
+        if not self.place_index.is_built:
+            return []
+        return [metadata["place_id"] for _, metadata in self.place_index.search(place_name) if metadata.get("place_id")]
+
+    def query_chunks(self, query_text: str, token_budget: int = None, limit: int = 20, place_ids: List[str] = None) -> List[Dict]:
+        """Best-matching chunks from wikipedia_chunks that fit in token_budget, best first.
+
+        Each hit carries its distance and an "order" giving its reading-order
+        position (pages by their best chunk, chunks in page order), so the
+        caller can lay out whatever it keeps from them in reading order.
+
+        Without place_ids the search is only run when max_distance is set;
+        an unfiltered top-k would put unrelated chunks into every prompt.
+        """
+        if not self.ready.is_set():
+            return []
+        if not place_ids and self.max_distance is None:
+            return []
+        if time.monotonic() < self._chunks_retry_at:
+            return []
+        token_budget = token_budget or self.chunk_token_budget
+        try:
+            collection = self.collection_handle("wikipedia_chunks")
+        except Exception as e:
+            # Not built yet: don't probe Chroma again on every request
+            self._chunks_retry_at = time.monotonic() + max(self.collection_watch_seconds, 1)
+            print(f"Chunk collection unavailable: {str(e)}")
+            return []
+        where = {"parent_id": {"$in": place_ids}} if place_ids else None
+        response = collection.query(
+            query_texts=[query_text],
+            n_results=limit,
+            where=where,
+            include=["documents", "metadatas", "distances"]
+        )
+
+        selected = []
+        used = 0
+        documents = (response.get("documents") or [[]])[0]
+        metadatas = (response.get("metadatas") or [[]])[0] or [{}] * len(documents)
+        distances = (response.get("distances") or [[]])[0]
+        for rank, (doc, metadata, distance) in enumerate(zip(documents, metadatas, distances)):
+            metadata = metadata or {}
+            if self.max_distance is not None and distance > self.max_distance:
+                continue
+            # The stored token_count leaves out the "name (section):" prefix that goes into the prompt
+            tokens = count_tokens(doc)
+            if used + tokens > token_budget:
+                continue
+            used += tokens
+            selected.append({"document": doc, "metadata": metadata, "distance": distance, "rank": rank})
+
+        # Reading order keeps each page's chunks together and in order, pages ordered by their best chunk
+        first_rank = {}
+        for hit in selected:
+            first_rank.setdefault(hit["metadata"].get("parent_id"), hit["rank"])
+        reading = sorted(selected, key=lambda hit: (first_rank[hit["metadata"].get("parent_id")],
+                                                     hit["metadata"].get("chunk_index", 0)))
+        for order, hit in enumerate(reading):
+            hit["order"] = order
+        print(f"Selected {len(selected)} chunks ({used} of {token_budget} tokens)")
+        return selected
+
+    def query_place(self, place_name: str, limit: int = 3, similarity_threshold: float = 0.5, mode: str = None) -> dict:
         """Query collections and penalize irrelevant results based on similarity score."""
         results = {}
 
-        if not self.collection_id:
-            print("No valid collection ID available")
+        if not self.ready.is_set():
+            # Never block a request on warm-up; answer without RAG context instead
+            print("RAG manager is still warming up")
+            return results
+
+        if self._index_collection() is None:
+            print("No wikipedia collection available")
+            return results
+
+        if (mode or self.retrieval_mode) == "vector":
+            try:
+                hits = self.query_place_vector(place_name, limit, self.max_distance)
+                print(f"Vector search distances: {[round(hit['distance'], 4) for hit in hits]}")
+                results["wikipedia"] = [hit["document"] for hit in hits]
+            except Exception as e:
+                print(f"Error in vector search: {str(e)}")
+                results["wikipedia"] = []
             return results
 
         try:
-            # Get data directly from Firebase backup
-            collection_data = self.firebase_backup.get_collection_details(self.collection_id)
-            
-            if collection_data and 'documents' in collection_data and collection_data['documents']:
-                documents = collection_data['documents']
-                print(f"Found {len(documents['documents'])} documents in collection")
+            if not self.place_index.is_built:
+                self.build_place_index()
+
+            if len(self.place_index):
+                print(f"Found {len(self.place_index)} documents in place index")
                 
                 # Get the documents, distances (scores), and metadata
                 matched_docs = []
                 matched_scores = []
                 matched_metadata = []
                 
-                for i, doc in enumerate(documents['documents']):
-                    # Check if the document contains the place name
-                    if place_name.lower() in doc.lower():
-                        matched_docs.append(doc)
-                        # Use metadata confidence if available
-                        confidence = documents['metadatas'][i].get('confidence', 1.0) if documents.get('metadatas') else 1.0
-                        matched_scores.append(confidence)
-                        matched_metadata.append(documents['metadatas'][i] if documents.get('metadatas') else {})
+                # Only documents containing the place name come back from the index
+                for doc, metadata in self.place_index.search(place_name):
+                    matched_docs.append(doc)
+                    # Use metadata confidence if available
+                    matched_scores.append(metadata.get('confidence', 1.0))
+                    matched_metadata.append(metadata)
                 
                 # Filter and sort results
                 filtered_results = []
@@ -95,8 +370,7 @@ class RAGManager:
                     print("No matching documents found after filtering")
                     results["wikipedia"] = []
             else:
-                print("No documents found in collection data")
-                print(f"Collection data keys: {collection_data.keys() if collection_data else None}")
+                print("No documents found in place index")
                 results["wikipedia"] = []
 
         except Exception as e:
@@ -104,8 +378,9 @@ class RAGManager:
             results["wikipedia"] = []
 
         return results
-# Create a single instance to be imported
+# Create a single instance to be imported; warm-up runs in the background
 rag_manager = RAGManager()
+rag_manager.start_warm_up()
 
 # Only run Flask app if this file is run directly
 if __name__ == '__main__':
@@ -129,11 +404,12 @@ if __name__ == '__main__':
             data = request.get_json()
             place_name = data.get('place_name')
             limit = data.get('limit', 3)
+            mode = data.get('mode')
             
             if not place_name:
                 return jsonify({'error': 'No place name provided'}), 400
                 
-            results = rag_manager.query_place(place_name, limit)
+            results = rag_manager.query_place(place_name, limit, mode=mode)
             return jsonify(results)
             
         except Exception as e:
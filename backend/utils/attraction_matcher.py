@@ -0,0 +1,125 @@
+import re
+from collections import defaultdict
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+
+def clean_name(name: str) -> str:
+    """Clean name by removing special characters and standardizing format"""
+    name = name.split('|')[0].strip()
+    name = re.sub(r'[^\w\s-]', '', name)
+    name = ' '.join(name.split())
+    return name.lower()
+
+
+class AttractionMatcher:
+    """Fuzzy lookup of an attraction name in the curated category lists.
+
+    Gives the same answer as scanning every entry in order with
+    SequenceMatcher: a ratio above 0.8 wins, and a containment match above 0.5
+    overrides it. Names are cleaned once up front. A trigram index finds
+    containment candidates, and a vectorized character-count bound
+    (difflib's quick_ratio) skips entries that cannot beat the current best.
+    Only the survivors are scored exactly.
+    """
+
+    SIMILARITY_THRESHOLD = 0.8
+    CONTAINMENT_THRESHOLD = 0.5
+
+    def __init__(self, attractions_array: Dict[str, List[Dict]], categories: Tuple[str, ...] = ("One", "Two", "Three")):
+        self.items: List[Tuple[str, Dict]] = [
+            (category, item) for category in categories for item in attractions_array.get(category, [])
+        ]
+        self.names = [clean_name(item["name"]) for _, item in self.items]
+        self.lengths = np.array([len(name) for name in self.names], dtype=np.float64)
+
+        self._by_name: Dict[str, List[int]] = defaultdict(list)
+        self._trigrams: Dict[str, Set[int]] = defaultdict(set)
+        for i, name in enumerate(self.names):
+            self._by_name[name].append(i)
+            for gram in self._ngrams(name):
+                self._trigrams[gram].add(i)
+
+        # Character counts per name, one column per character seen in the list
+        self._columns = {ch: j for j, ch in enumerate(sorted({ch for name in self.names for ch in name}))}
+        self._counts = np.zeros((len(self.names), len(self._columns)), dtype=np.int16)
+        for i, name in enumerate(self.names):
+            for ch in name:
+                self._counts[i, self._columns[ch]] += 1
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    @staticmethod
+    def _ngrams(text: str, n: int = 3) -> Set[str]:
+        return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+    def _ratio(self, query: str, i: int) -> float:
+        return SequenceMatcher(None, query, self.names[i]).ratio()
+
+    def _containment_candidates(self, query: str) -> List[int]:
+        """Entries whose cleaned name contains the query or is contained in it"""
+        if len(query) < 3:
+            return [i for i, name in enumerate(self.names) if query in name or name in query]
+
+        # name in query: the name is one of the query's substrings
+        found = set()
+        for start in range(len(query) + 1):
+            for end in range(start, len(query) + 1):
+                found.update(self._by_name.get(query[start:end], ()))
+
+        # query in name: the name holds every trigram of the query
+        postings = sorted((self._trigrams.get(gram, set()) for gram in self._ngrams(query)), key=len)
+        shared = set(postings[0]).intersection(*postings[1:]) if postings else set()
+        found.update(i for i in shared if query in self.names[i])
+        return sorted(found)
+
+    def _upper_bounds(self, query: str) -> np.ndarray:
+        """quick_ratio for every entry at once: 2 * shared characters / total length"""
+        shared = np.zeros(len(self.names), dtype=np.float64)
+        query_counts = defaultdict(int)
+        for ch in query:
+            query_counts[ch] += 1
+        for ch, count in query_counts.items():
+            j = self._columns.get(ch)
+            if j is not None:
+                shared += np.minimum(self._counts[:, j], count)
+        total = self.lengths + len(query)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(total > 0, 2.0 * shared / total, 1.0)
+
+    def match(self, attraction_name: str) -> Optional[Tuple[str, Dict, float]]:
+        """Return (category, item, similarity) for the best entry, or None"""
+        if not self.items:
+            return None
+        query = clean_name(clean_name(attraction_name))
+
+        # The last containment match above 0.5 resets the running best to its own ratio
+        best, best_ratio, start = None, self.SIMILARITY_THRESHOLD, 0
+        for i in reversed(self._containment_candidates(query)):
+            ratio = self._ratio(query, i)
+            if ratio > self.CONTAINMENT_THRESHOLD:
+                best, best_ratio, start = i, ratio, i + 1
+                break
+
+        # After it, the first entry with the highest ratio above the running best wins
+        bounds = self._upper_bounds(query)
+        bounds[:start] = -1.0
+        winner, winner_ratio = None, best_ratio
+        for i in sorted(np.flatnonzero(bounds > best_ratio), key=lambda i: (-bounds[i], i)):
+            if bounds[i] < winner_ratio:
+                break
+            ratio = self._ratio(query, i)
+            if ratio > winner_ratio or (winner is not None and ratio == winner_ratio and i < winner):
+                winner, winner_ratio = i, ratio
+
+        if winner is not None:
+            best, best_ratio = winner, winner_ratio
+        if best is None:
+            return None
+        category, item = self.items[best]
+        if not item["name"]:
+            return None  # an empty curated name never counted as a match
+        return category, item, best_ratio
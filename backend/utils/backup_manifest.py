@@ -0,0 +1,122 @@
+import hashlib
+import json
+import sqlite3
+from typing import Dict, List, Optional
+
+BUCKETS = 256
+
+# Key under which Chroma keeps a record's document text in embedding_metadata
+DOCUMENT_KEY = "chroma:document"
+
+
+def bucket_of(doc_id: str) -> int:
+    return hashlib.sha256(doc_id.encode()).digest()[0] % BUCKETS
+
+
+def leaf_hash(document: Optional[str], metadata: Optional[Dict]) -> str:
+    """Hash of a record's document text and metadata"""
+    payload = json.dumps({"document": document, "metadata": metadata or {}}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def bucket_hash(leaves: Dict[str, str]) -> str:
+    return hashlib.sha256("".join(f"{doc_id}:{leaves[doc_id]}\n" for doc_id in sorted(leaves)).encode()).hexdigest()
+
+
+def merkle_root(hashes: List[str]) -> str:
+    level = [bytes.fromhex(h) for h in hashes] or [hashlib.sha256(b"").digest()]
+    while len(level) > 1:
+        if len(level) % 2:
+            level.append(level[-1])
+        level = [hashlib.sha256(level[i] + level[i + 1]).digest() for i in range(0, len(level), 2)]
+    return level[0].hex()
+
+
+def digest_from_leaves(leaves: List[Dict[str, str]]) -> Dict:
+    buckets = [bucket_hash(bucket) for bucket in leaves]
+    return {
+        "count": sum(len(bucket) for bucket in leaves),
+        "root": merkle_root(buckets),
+        "buckets": buckets,
+        "leaves": leaves
+    }
+
+
+def collection_digest(collection, page_size: int = 1000) -> Dict:
+    """Count, Merkle root and per-bucket leaves of a live Chroma collection.
+
+    Ids, documents and metadatas are read in pages of page_size, so memory is
+    bounded by the leaf hashes, but every document's text is transferred once;
+    embeddings never leave the server. Ids are spread over BUCKETS buckets by
+    hash, so two digests with different roots can be narrowed to the buckets
+    that differ.
+    """
+    leaves = [{} for _ in range(BUCKETS)]
+    offset = 0
+    while True:
+        page = collection.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+        ids = page["ids"] or []
+        documents = page.get("documents") or [None] * len(ids)
+        metadatas = page.get("metadatas") or [None] * len(ids)
+        for doc_id, document, metadata in zip(ids, documents, metadatas):
+            leaves[bucket_of(doc_id)][doc_id] = leaf_hash(document, metadata)
+        offset += len(ids)
+        if len(ids) < page_size:
+            break
+    return digest_from_leaves(leaves)
+
+
+def sqlite_digests(sqlite_path: str) -> Dict[str, Dict]:
+    """Digest of every collection stored in a copy of Chroma's chroma.sqlite3.
+
+    Reads the same ids, documents and metadata collection_digest reads from
+    the server, so a snapshot's digest describes exactly the bytes uploaded.
+    """
+    connection = sqlite3.connect(f"file:{sqlite_path}?mode=ro", uri=True)
+    try:
+        available = {row[1] for row in connection.execute("PRAGMA table_info(embedding_metadata)")}
+        columns = [c for c in ("string_value", "int_value", "float_value", "bool_value") if c in available]
+        if not columns:
+            return {}
+        bool_index = columns.index("bool_value") if "bool_value" in columns else None
+        rows = connection.execute(
+            f"""
+            SELECT c.name, e.embedding_id, m.key, {", ".join(f"m.{c}" for c in columns)}
+            FROM embeddings e
+            JOIN segments s ON e.segment_id = s.id
+            JOIN collections c ON s.collection = c.id
+            LEFT JOIN embedding_metadata m ON m.id = e.id
+            WHERE s.scope = 'METADATA'
+            """
+        )
+        records = {}  # collection -> id -> {"document", "metadata"}
+        for name, doc_id, key, *values in rows:
+            record = records.setdefault(name, {}).setdefault(doc_id, {"document": None, "metadata": {}})
+            if key is None:
+                continue
+            value = next((v for v in values if v is not None), None)
+            if bool_index is not None and values[bool_index] is not None:
+                value = bool(values[bool_index])
+            if key == DOCUMENT_KEY:
+                record["document"] = value
+            else:
+                record["metadata"][key] = value
+    finally:
+        connection.close()
+
+    digests = {}
+    for name, collection in records.items():
+        leaves = [{} for _ in range(BUCKETS)]
+        for doc_id, record in collection.items():
+            leaves[bucket_of(doc_id)][doc_id] = leaf_hash(record["document"], record["metadata"] or None)
+        digests[name] = digest_from_leaves(leaves)
+    return digests
+
+
+def diff_leaves(live: Dict[str, str], stored: Dict[str, str]) -> Dict[str, List[str]]:
+    """Ids only in Chroma, only in the backup, and in both with different content"""
+    return {
+        "missing_from_backup": sorted(set(live) - set(stored)),
+        "missing_from_chroma": sorted(set(stored) - set(live)),
+        "changed": sorted(doc_id for doc_id in set(live) & set(stored) if live[doc_id] != stored[doc_id])
+    }
@@ -0,0 +1,140 @@
+import base64
+import hashlib
+import os
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Dict, List, Optional, Union
+
+try:
+    import google_crc32c
+except ImportError:  # MD5 is checked instead
+    google_crc32c = None
+
+
+class ChecksumMismatch(Exception):
+    pass
+
+
+class _Digest:
+    """CRC32C when google-crc32c is installed and the blob has one, otherwise MD5"""
+
+    def __init__(self, blob):
+        self.expected = None
+        self.kind = None
+        if google_crc32c is not None and getattr(blob, "crc32c", None):
+            self.kind, self.expected = "crc32c", blob.crc32c
+            self._hash = google_crc32c.Checksum()
+        elif getattr(blob, "md5_hash", None):
+            # Composite uploads carry no MD5, only a CRC32C
+            self.kind, self.expected = "md5", blob.md5_hash
+            self._hash = hashlib.md5()
+
+    def update(self, data) -> None:
+        if self.kind:
+            self._hash.update(data)
+
+    def check(self, name: str) -> None:
+        if not self.kind:
+            return
+        actual = base64.b64encode(self._hash.digest()).decode()
+        if actual != self.expected:
+            raise ChecksumMismatch(f"{self.kind} mismatch for {name}: expected {self.expected}, got {actual}")
+
+
+def file_matches(path: str, blob, chunk_bytes: int = 8 * 1024 * 1024) -> bool:
+    """Whether a local file has the blob's stored checksum; False when the blob has none"""
+    digest = _Digest(blob)
+    if not digest.kind or not os.path.exists(path):
+        return False
+    with open(path, "rb") as f:
+        for data in iter(lambda: f.read(chunk_bytes), b""):
+            digest.update(data)
+    try:
+        digest.check(path)
+        return True
+    except ChecksumMismatch:
+        return False
+
+
+def _ranges(size: int, chunk_bytes: int) -> List[tuple]:
+    return [(start, min(start + chunk_bytes, size) - 1) for start in range(0, size, chunk_bytes)]
+
+
+def download_blob(blob, executor: Executor, chunk_bytes: int = 8 * 1024 * 1024,
+                  target_path: Optional[str] = None) -> Union[bytearray, str]:
+    """Download a blob with parallel ranged reads and verify its checksum.
+
+    Without target_path the bytes land in one preallocated bytearray, which is
+    returned. With target_path each range is written at its offset in a
+    preallocated file and the path is returned.
+    """
+    size = blob.size
+    if size is None:
+        blob.reload()
+        size = blob.size
+    ranges = _ranges(size, chunk_bytes) or [(0, -1)]
+    buffer = None if target_path else bytearray(size)
+
+    if target_path:
+        with open(target_path, "wb") as f:
+            f.truncate(size)
+
+    def fetch(byte_range):
+        start, end = byte_range
+        data = blob.download_as_bytes(start=start, end=end) if end >= start else b""
+        if target_path:
+            with open(target_path, "r+b") as f:
+                f.seek(start)
+                f.write(data)
+        else:
+            buffer[start:start + len(data)] = data
+        return len(data)
+
+    if len(ranges) == 1:
+        received = fetch(ranges[0])
+    else:
+        received = sum(executor.map(fetch, ranges))
+    if received != size:
+        raise IOError(f"Short download of {blob.name}: {received} of {size} bytes")
+
+    digest = _Digest(blob)
+    if digest.kind:
+        if target_path:
+            with open(target_path, "rb") as f:
+                for block in iter(lambda: f.read(chunk_bytes), b""):
+                    digest.update(block)
+        else:
+            digest.update(buffer)
+        digest.check(blob.name)
+
+    return target_path if target_path else buffer
+
+
+def download_blobs(blobs: Dict[str, object], executor: Executor, chunk_bytes: int = 8 * 1024 * 1024,
+                   target_dir: Optional[str] = None,
+                   target_paths: Optional[Dict[str, str]] = None) -> Dict[str, Union[bytearray, str]]:
+    """Download several blobs concurrently, keyed like the input, and print the throughput.
+
+    target_dir writes every blob under its base name into one directory;
+    target_paths gives an explicit file path per key instead.
+
+    Ranges of every blob share executor; each blob is driven from its own thread
+    so a blob waiting on its ranges never holds a slot the ranges need.
+    """
+    started = time.monotonic()
+    if target_dir:
+        target_paths = {key: os.path.join(target_dir, os.path.basename(blob.name)) for key, blob in blobs.items()}
+    for path in (target_paths or {}).values():
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    with ThreadPoolExecutor(max_workers=max(len(blobs), 1), thread_name_prefix="blob-download") as files:
+        futures = {
+            key: files.submit(download_blob, blob, executor, chunk_bytes, (target_paths or {}).get(key))
+            for key, blob in blobs.items()
+        }
+        results = {key: future.result() for key, future in futures.items()}
+
+    total = sum(blob.size or 0 for blob in blobs.values())
+    elapsed = max(time.monotonic() - started, 1e-6)
+    print(f"Downloaded {len(blobs)} files, {total / 1e6:.1f} MB in {elapsed:.2f}s ({total / 1e6 / elapsed:.1f} MB/s)")
+    return results
@@ -3,48 +3,86 @@ import sys
 import os
 from firebase_backup import FirebaseBackup
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from backend.config import get_chroma_settings, get_firebase_backup
+from utils.chroma_client import get_chroma_client
+from utils.backup_manifest import collection_digest, diff_leaves
 
 class ChromaDBManager:
     def __init__(self):
         settings = get_chroma_settings()
-        self.chroma_client = chromadb.HttpClient(
-            host=settings["chroma_host"],
-            port=settings["chroma_port"],
-            ssl=settings["chroma_ssl"],
-            headers={"X-Api-Key": settings["chroma_api_key"]} if settings["chroma_api_key"] else None
-        )
+        self.chroma_client = get_chroma_client(settings)
         firebase_settings = get_firebase_backup()
         self.firebase_backup = FirebaseBackup(firebase_settings["bucket_name"])
 
-    def verify_backup(self, collection_name: str) -> bool:
+    def _print_ids(self, label: str, ids: list, limit: int = 20) -> None:
+        if ids:
+            shown = ", ".join(ids[:limit])
+            more = f" ... and {len(ids) - limit} more" if len(ids) > limit else ""
+            print(f"{label} ({len(ids)}): {shown}{more}")
+
+    def verify_backup(self, collection_name: str, snapshot_id: str = None, deep: bool = False) -> bool:
         """
-        Verify if a collection exists both in ChromaDB and Firebase backup
+        Verify a collection against a Firebase snapshot, the latest when snapshot_id is None.
+
+        The quick check compares the live document count with the count
+        create_snapshot recorded from the uploaded sqlite copy, and checks the
+        metadata of every chunk the snapshot references against the size and
+        MD5 it was uploaded with. It transfers a few hundred bytes per chunk.
+
+        deep=True also compares content: it pages every id, document text and
+        metadata out of Chroma (no embeddings) to build the live digest, so its
+        transfer grows with the collection's text. Only the digest buckets whose
+        hashes differ are then fetched to name the missing, extra and changed ids.
         """
         try:
-            # Check ChromaDB
             chroma_collection = self.chroma_client.get_collection(collection_name)
-            chroma_data = chroma_collection.get()
-            
-            # Check Firebase backup
-            backup_data = self.firebase_backup.load_collection(collection_name)
-            
-            if not backup_data:
-                print(f"No backup found for collection '{collection_name}'")
+            if snapshot_id is None:
+                snapshots = self.firebase_backup.list_snapshots()
+                snapshot_id = snapshots[-1] if snapshots else None
+            manifest = self.firebase_backup.get_snapshot_manifest(snapshot_id) if snapshot_id else None
+
+            if not manifest:
+                print(f"No backup snapshot found for collection '{collection_name}'")
                 return False
-                
-            # Compare document counts
-            chroma_count = len(chroma_data['ids']) if chroma_data['ids'] else 0
-            backup_count = len(backup_data['ids']) if backup_data['ids'] else 0
-            
-            if chroma_count != backup_count:
-                print(f"Document count mismatch: ChromaDB has {chroma_count}, Firebase has {backup_count}")
+            stored = manifest.get("collections", {}).get(collection_name)
+            if not stored:
+                print(f"Collection '{collection_name}' is not in snapshot {snapshot_id}")
                 return False
-                
-            print(f"Successfully verified backup for '{collection_name}'")
-            print(f"Total documents: {chroma_count}")
-            return True
-            
+
+            verified = True
+            count = chroma_collection.count()
+            if count != stored["count"]:
+                print(f"Document count mismatch: ChromaDB has {count}, snapshot {snapshot_id} has {stored['count']}")
+                verified = False
+
+            if deep:
+                digest = collection_digest(chroma_collection)
+                if digest["root"] != stored["root"]:
+                    verified = False
+                    differences = {"missing_from_backup": [], "missing_from_chroma": [], "changed": []}
+                    diverged_buckets = [(index, bucket) for index, (live, bucket) in enumerate(zip(digest["buckets"], stored["buckets"]))
+                                        if live != bucket]
+                    for index, bucket in diverged_buckets:
+                        leaves = self.firebase_backup.get_snapshot_digest(bucket)
+                        for kind, ids in diff_leaves(digest["leaves"][index], leaves).items():
+                            differences[kind].extend(ids)
+                    print(f"Content mismatch in {len(diverged_buckets)} of {len(digest['buckets'])} buckets")
+                    self._print_ids("Missing from backup", sorted(differences["missing_from_backup"]))
+                    self._print_ids("Missing from ChromaDB", sorted(differences["missing_from_chroma"]))
+                    self._print_ids("Changed", sorted(differences["changed"]))
+
+            damaged_files = self.firebase_backup.damaged_snapshot_files(manifest)
+            if damaged_files:
+                verified = False
+                self._print_ids(f"Snapshot {snapshot_id} files with missing or altered chunks", damaged_files)
+
+            if verified:
+                checked = "content" if deep else "document count"
+                print(f"Successfully verified backup for '{collection_name}' against snapshot {snapshot_id} ({checked})")
+                print(f"Total documents: {count}")
+            return verified
+
         except ValueError:
             print(f"Collection '{collection_name}' not found in ChromaDB")
             return False
@@ -145,8 +183,8 @@ class ChromaDBManager:
             if restore.lower() == 'y':
                 success = self.firebase_backup.restore_collection(collection_name)
                 if success:
-                    print(f"\nSuccessfully initiated restoration of collection '{collection_name}' to ChromaDB")
-                    print("Note: Binary data loaded but processing needs to be implemented")
+                    print(f"\nSuccessfully restored collection '{collection_name}' into the local chroma_db directory")
+                    print("Note: restart the Chroma server (backend/server.py) to load the restored files")
                 else:
                     print(f"\nFailed to restore collection '{collection_name}' to ChromaDB")
                     
@@ -171,7 +209,7 @@ if __name__ == "__main__":
     backup_manager = FirebaseBackup("ggdotcom-254aa.firebasestorage.app")
 
     # List all collections in Firebase
-    collections = backup_manager.list_firebase_collections()
+    collections = backup_manager.list_firebase_collections(refresh=True)
     print("Available collections:", collections)
 
     # View a specific collection
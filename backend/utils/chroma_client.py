@@ -0,0 +1,141 @@
+import re
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Optional
+
+import chromadb
+
+from config import get_chroma_settings, get_chroma_pool_settings
+
+_registry: Dict[tuple, object] = {}
+_registry_lock = threading.Lock()
+
+_ID_SEGMENT = re.compile(r'/[0-9a-fA-F-]{32,36}(?=/|$)')
+
+
+class EndpointLatency:
+    """Per-endpoint request counters for the Chroma HTTP API"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = defaultdict(lambda: {"count": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0})
+
+    def record(self, endpoint: str, elapsed_ms: float, error: bool = False) -> None:
+        with self._lock:
+            stats = self._stats[endpoint]
+            stats["count"] += 1
+            stats["errors"] += int(error)
+            stats["total_ms"] += elapsed_ms
+            stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                endpoint: {
+                    "count": s["count"],
+                    "errors": s["errors"],
+                    "avg_ms": round(s["total_ms"] / s["count"], 2) if s["count"] else 0.0,
+                    "max_ms": round(s["max_ms"], 2)
+                }
+                for endpoint, s in self._stats.items()
+            }
+
+
+latency = EndpointLatency()
+
+
+def _endpoint(method: str, url) -> str:
+    path = re.sub(r'^https?://[^/]+', '', str(url)).split('?')[0]
+    return f"{method.upper()} {_ID_SEGMENT.sub('/{id}', path)}"
+
+
+def _timed(request_fn, default_timeout: Optional[float]):
+    def request(method, url, *args, **kwargs):
+        if default_timeout is not None and kwargs.get("timeout") is None:
+            kwargs["timeout"] = default_timeout
+        started = time.perf_counter()
+        error = False
+        try:
+            response = request_fn(method, url, *args, **kwargs)
+            error = getattr(response, "status_code", 200) >= 400
+            return response
+        except Exception:
+            error = True
+            raise
+        finally:
+            latency.record(_endpoint(method, url), (time.perf_counter() - started) * 1000, error)
+    return request
+
+
+def _configure_transport(client, pool_size: int, timeout: float, keepalive_seconds: float) -> None:
+    """Size the keep-alive pool of the client's HTTP session and time every request.
+
+    chromadb uses a requests.Session (0.4.x) or an httpx.Client (0.5+) internally;
+    both are handled, anything else is left untouched.
+    """
+    server = getattr(client, "_server", client)
+    session = getattr(server, "_session", None)
+    if session is None:
+        print("Chroma client exposes no HTTP session; connection pooling left at defaults")
+        return
+
+    try:
+        import requests
+        from requests.adapters import HTTPAdapter
+        if isinstance(session, requests.Session):
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.request = _timed(session.request, timeout)
+            return
+    except ImportError:
+        pass
+
+    try:
+        import httpx
+        if isinstance(session, httpx.Client):
+            pooled = httpx.Client(
+                timeout=timeout,
+                limits=httpx.Limits(
+                    max_connections=pool_size,
+                    max_keepalive_connections=pool_size,
+                    keepalive_expiry=keepalive_seconds
+                ),
+                headers=session.headers
+            )
+            session.close()
+            pooled.request = _timed(pooled.request, None)
+            server._session = pooled
+    except ImportError:
+        pass
+
+
+def get_chroma_client(settings: Dict = None):
+    """Return the process-wide Chroma HttpClient for these settings, creating it on first use"""
+    settings = settings or get_chroma_settings()
+    key = (settings["chroma_host"], settings["chroma_port"], settings["chroma_ssl"], settings["chroma_api_key"])
+
+    with _registry_lock:
+        client = _registry.get(key)
+        if client is None:
+            pool = get_chroma_pool_settings()
+            client = chromadb.HttpClient(
+                host=settings["chroma_host"],
+                port=settings["chroma_port"],
+                ssl=settings["chroma_ssl"],
+                headers={"X-Api-Key": settings["chroma_api_key"]} if settings["chroma_api_key"] else None
+            )
+            try:
+                _configure_transport(client, pool["pool_size"], pool["timeout"], pool["keepalive_seconds"])
+            except Exception as e:
+                print(f"Could not configure Chroma connection pool: {str(e)}")
+            _registry[key] = client
+            print(f"Created shared Chroma client for {settings['chroma_host']}:{settings['chroma_port']}")
+        return client
+
+
+def chroma_client_stats() -> Dict:
+    with _registry_lock:
+        clients = len(_registry)
+    return {"clients": clients, "endpoints": latency.snapshot()}
@@ -0,0 +1,98 @@
+import re
+from typing import Dict, List, Tuple
+
+SECTION_HEADERS = ("Summary", "History", "Description")
+_HEADER = re.compile(r'^(%s):\s*$' % "|".join(SECTION_HEADERS), re.MULTILINE)
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count, about four characters per token for English text"""
+    return max(1, (len(text) + 3) // 4) if text else 0
+
+
+def split_sections(text: str) -> List[Tuple[str, str]]:
+    """Split a document built by create_document_structure into (section, body) pairs"""
+    matches = list(_HEADER.finditer(text))
+    if not matches:
+        return [("", text.strip())] if text.strip() else []
+
+    sections = []
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        body = text[match.end():end].strip()
+        if body:
+            sections.append((match.group(1), body))
+    return sections
+
+
+def _paragraphs(body: str, max_tokens: int) -> List[str]:
+    """Paragraphs of a section, with any paragraph over max_tokens split on sentence boundaries"""
+    pieces = []
+    for paragraph in re.split(r'\n\s*\n|\n', body):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if estimate_tokens(paragraph) <= max_tokens:
+            pieces.append(paragraph)
+            continue
+        current = ""
+        for sentence in _SENTENCE_END.split(paragraph):
+            candidate = f"{current} {sentence}".strip()
+            if current and estimate_tokens(candidate) > max_tokens:
+                pieces.append(current)
+                current = sentence
+            else:
+                current = candidate
+        if current:
+            pieces.append(current)
+    return pieces
+
+
+def chunk_text(text: str, max_tokens: int = 200, overlap_tokens: int = 40) -> List[Dict]:
+    """Section-aware windows of whole paragraphs.
+
+    Windows never cross a section boundary. Consecutive windows in a section
+    share trailing paragraphs worth up to overlap_tokens.
+    """
+    chunks = []
+    for section, body in split_sections(text):
+        window: List[str] = []
+        for paragraph in _paragraphs(body, max_tokens):
+            if window and estimate_tokens("\n".join(window + [paragraph])) > max_tokens:
+                chunks.append({"section": section, "text": "\n".join(window)})
+                overlap: List[str] = []
+                for previous in reversed(window):
+                    if estimate_tokens("\n".join([previous] + overlap + [paragraph])) > max_tokens or \
+                            estimate_tokens("\n".join([previous] + overlap)) > overlap_tokens:
+                        break
+                    overlap.insert(0, previous)
+                window = overlap
+            window.append(paragraph)
+        if window:
+            chunks.append({"section": section, "text": "\n".join(window)})
+    return chunks
+
+
+def chunk_document(document: Dict, max_tokens: int = 200, overlap_tokens: int = 40) -> List[Dict]:
+    """Chunk documents for the wikipedia_chunks collection, ids are "<place_id>:<i>" """
+    metadata = document["metadata"]
+    chunks = chunk_text(document["text"], max_tokens, overlap_tokens)
+    return [
+        {
+            "id": f"{metadata['place_id']}:{i}",
+            "text": f"{metadata['name']} ({chunk['section'] or 'Overview'}):\n{chunk['text']}",
+            "metadata": {
+                "parent_id": metadata["place_id"],
+                "name": metadata["name"],
+                "section": chunk["section"],
+                "chunk_index": i,
+                "chunk_count": len(chunks),
+                "token_count": estimate_tokens(chunk["text"]),
+                "wikipedia_url": metadata.get("wikipedia_url", ""),
+                "last_verified": metadata.get("last_verified", ""),
+                "content_hash": metadata.get("content_hash", "")
+            }
+        }
+        for i, chunk in enumerate(chunks)
+    ]
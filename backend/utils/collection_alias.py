@@ -0,0 +1,41 @@
+from datetime import datetime
+from typing import Optional
+
+ALIAS_COLLECTION = "collection_aliases"
+
+
+def _alias_collection(client, create: bool = False):
+    if create:
+        return client.get_or_create_collection(
+            ALIAS_COLLECTION,
+            metadata={"description": "Stable names pointing at the live Chroma collection"}
+        )
+    return client.get_collection(ALIAS_COLLECTION)
+
+
+def get_alias(client, name: str) -> Optional[str]:
+    """Collection an alias currently points at, or None if it is not aliased"""
+    try:
+        result = _alias_collection(client).get(ids=[name], include=["metadatas"])
+    except Exception:
+        return None
+    metadatas = result.get("metadatas") or []
+    if metadatas and metadatas[0]:
+        return metadatas[0].get("target")
+    return None
+
+
+def resolve_alias(client, name: str) -> str:
+    """Real collection name behind name; unaliased names resolve to themselves"""
+    return get_alias(client, name) or name
+
+
+def set_alias(client, name: str, target: str) -> None:
+    """Point name at target in a single upsert, so readers switch over atomically"""
+    _alias_collection(client, create=True).upsert(
+        ids=[name],
+        documents=[target],
+        embeddings=[[0.0]],  # aliases are looked up by id only
+        metadatas=[{"target": target, "updated_at": datetime.now().isoformat()}]
+    )
+    print(f"Alias '{name}' now points at '{target}'")
@@ -0,0 +1,180 @@
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+def _normalize(value):
+    """Collapse whitespace in every string so cosmetic prompt differences share a key"""
+    if isinstance(value, str):
+        return re.sub(r'\s+', ' ', value).strip()
+    if isinstance(value, list):
+        return [_normalize(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items()}
+    return value
+
+
+class CompletionCache:
+    """LRU + TTL cache of chat completions keyed by (model, messages, temperature).
+
+    With an embedding_function, a miss on the exact key can still be served by
+    an earlier completion whose user question is near-identical. The lookup is
+    limited to entries built from the same model, temperature, place and context.
+    """
+
+    def __init__(self, ttl_seconds: int = 86400, max_entries: int = 5000, max_temperature: float = 0.5,
+                 similarity_threshold: float = 0.95, embedding_function=None):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_temperature = max_temperature
+        self.similarity_threshold = similarity_threshold
+        self.embedding_function = embedding_function
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()  # key -> {"expires_at", "text", "scope", "vector"}
+        self._scopes: Dict[str, List[str]] = defaultdict(list)  # scope -> keys with a question vector
+        self._stats: Dict[str, Dict[str, int]] = defaultdict(lambda: {"hits": 0, "similar_hits": 0, "misses": 0})
+
+    @staticmethod
+    def key(model: str, messages: List[Dict], temperature: float) -> str:
+        payload = json.dumps(
+            {"model": model, "messages": _normalize(messages), "temperature": temperature},
+            sort_keys=True, default=str
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _scope(self, model: str, messages: List[Dict], temperature: float, question: str) -> str:
+        """Key of the request with the user's question blanked out of the user message"""
+        question = _normalize(question)
+
+        def blank(content):
+            if isinstance(content, str):
+                return content.replace(question, "{question}")
+            if isinstance(content, list):
+                # Multimodal content: blank the text parts, keep image parts as they are
+                return [
+                    dict(part, text=blank(part["text"])) if isinstance(part, dict) and isinstance(part.get("text"), str)
+                    else part
+                    for part in content
+                ]
+            return content
+
+        blanked = [
+            dict(message, content=blank(message.get("content"))) if message.get("role") == "user" else message
+            for message in _normalize(messages)
+        ]
+        return self.key(model, blanked, temperature)
+
+    def _embed(self, question: str) -> Optional[np.ndarray]:
+        try:
+            vector = np.asarray(self.embedding_function([question])[0], dtype=np.float32)
+            norm = np.linalg.norm(vector)
+            return vector / norm if norm else None
+        except Exception as e:
+            print(f"Completion cache embedding error: {str(e)}")
+            return None
+
+    def cacheable(self, temperature: float) -> bool:
+        return temperature <= self.max_temperature
+
+    def _evict(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry and entry["scope"]:
+            keys = self._scopes.get(entry["scope"], [])
+            if key in keys:
+                keys.remove(key)
+            if not keys:
+                self._scopes.pop(entry["scope"], None)
+
+    def get(self, branch: str, model: str, messages: List[Dict], temperature: float,
+            question: Optional[str] = None) -> Optional[str]:
+        """Cached completion text, or None on a miss; a cache failure counts as a miss"""
+        try:
+            return self._get(branch, model, messages, temperature, question)
+        except Exception as e:
+            print(f"Completion cache lookup error: {str(e)}")
+            with self._lock:
+                self._stats[branch]["misses"] += 1
+            return None
+
+    def put(self, branch: str, model: str, messages: List[Dict], temperature: float, text: str,
+            question: Optional[str] = None) -> None:
+        try:
+            self._put(branch, model, messages, temperature, text, question)
+        except Exception as e:
+            print(f"Completion cache store error: {str(e)}")
+
+    def _get(self, branch: str, model: str, messages: List[Dict], temperature: float,
+             question: Optional[str] = None) -> Optional[str]:
+        if not self.cacheable(temperature):
+            return None
+
+        key = self.key(model, messages, temperature)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry["expires_at"] >= now:
+                self._entries.move_to_end(key)
+                self._stats[branch]["hits"] += 1
+                return entry["text"]
+            if entry:
+                self._evict(key)
+
+        if question and self.embedding_function is not None:
+            scope = self._scope(model, messages, temperature, question)
+            vector = self._embed(question)
+            with self._lock:
+                candidates = [k for k in self._scopes.get(scope, []) if self._entries[k]["expires_at"] >= now]
+                if vector is not None and candidates:
+                    matrix = np.stack([self._entries[k]["vector"] for k in candidates])
+                    scores = matrix @ vector
+                    best = int(np.argmax(scores))
+                    if scores[best] >= self.similarity_threshold:
+                        self._entries.move_to_end(candidates[best])
+                        self._stats[branch]["similar_hits"] += 1
+                        return self._entries[candidates[best]]["text"]
+
+        with self._lock:
+            self._stats[branch]["misses"] += 1
+        return None
+
+    def _put(self, branch: str, model: str, messages: List[Dict], temperature: float, text: str,
+             question: Optional[str] = None) -> None:
+        if not self.cacheable(temperature) or not text:
+            return
+
+        key = self.key(model, messages, temperature)
+        scope, vector = None, None
+        if question and self.embedding_function is not None:
+            vector = self._embed(question)
+            if vector is not None:
+                scope = self._scope(model, messages, temperature, question)
+
+        with self._lock:
+            self._evict(key)
+            self._entries[key] = {
+                "expires_at": time.time() + self.ttl_seconds,
+                "text": text,
+                "scope": scope,
+                "vector": vector
+            }
+            if scope:
+                self._scopes[scope].append(key)
+            while len(self._entries) > self.max_entries:
+                self._evict(next(iter(self._entries)))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            branches = {}
+            for branch, counts in self._stats.items():
+                lookups = counts["hits"] + counts["similar_hits"] + counts["misses"]
+                branches[branch] = {
+                    **counts,
+                    "hit_rate": (counts["hits"] + counts["similar_hits"]) / lookups if lookups else 0.0
+                }
+            return {"entries": len(self._entries), "branches": branches}
@@ -0,0 +1,72 @@
+import hashlib
+import os
+from typing import Iterator, List, Tuple
+
+import numpy as np
+
+# Fixed seed so every writer cuts identical content at identical offsets
+_GEAR = np.random.default_rng(0x6764636F).integers(0, 2 ** 32, size=256, dtype=np.uint64).astype(np.uint32)
+_WINDOW = 32  # a 32-bit gear hash depends on the last 32 bytes only
+_BLOCK_BYTES = 16 * 1024 * 1024
+
+
+def _cut_candidates(data: np.ndarray, mask: np.uint32) -> np.ndarray:
+    """Offsets i where the 32-bit gear hash of data[:i + 1] has every mask bit clear.
+
+    The rolling hash h = (h << 1) + GEAR[byte] over 32 bits equals the sum of
+    GEAR[data[i - k]] << k for k < 32. Sums over a window of w bytes combine
+    into sums over 2w bytes, so the whole block is hashed in five vector
+    passes instead of one Python step per byte.
+    """
+    hashes = _GEAR[data]
+    width = 1
+    while width < _WINDOW and width < len(data):
+        hashes[width:] += hashes[:-width] << np.uint32(width)
+        width *= 2
+    return np.flatnonzero((hashes & mask) == 0)
+
+
+def chunk_boundaries(path: str, min_bytes: int, avg_bytes: int, max_bytes: int) -> List[int]:
+    """End offsets of the content-defined chunks of a file.
+
+    A cut follows any byte whose hash matches the mask (about one in avg_bytes),
+    as long as the chunk is at least min_bytes; chunks never exceed max_bytes.
+    An insert or delete only moves the cuts around it, so the rest of the file
+    still produces the same chunks.
+    """
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+    bits = max(avg_bytes.bit_length() - 1, 1)
+    mask = np.uint32(((1 << bits) - 1) << (32 - bits))
+
+    data = np.memmap(path, dtype=np.uint8, mode="r")
+    candidates = []
+    for start in range(0, size, _BLOCK_BYTES):
+        # Carry the previous block's last bytes so hashes match a single pass
+        lead = min(start, _WINDOW - 1)
+        block = np.asarray(data[start - lead:start + _BLOCK_BYTES])
+        found = _cut_candidates(block, mask)
+        candidates.append(found[found >= lead] + (start - lead))
+    candidates = np.concatenate(candidates)
+    del data
+
+    boundaries = []
+    position = 0
+    while position < size:
+        index = np.searchsorted(candidates, position + min_bytes - 1)
+        end = int(candidates[index]) + 1 if index < len(candidates) else size
+        end = min(end, position + max_bytes, size)
+        boundaries.append(end)
+        position = end
+    return boundaries
+
+
+def iter_chunks(path: str, min_bytes: int, avg_bytes: int, max_bytes: int) -> Iterator[Tuple[int, bytes, str]]:
+    """(offset, data, sha256 hex) for each content-defined chunk of a file"""
+    with open(path, "rb") as f:
+        offset = 0
+        for end in chunk_boundaries(path, min_bytes, avg_bytes, max_bytes):
+            data = f.read(end - offset)
+            yield offset, data, hashlib.sha256(data).hexdigest()
+            offset = end
@@ -0,0 +1,138 @@
+import re
+from functools import lru_cache
+from typing import Dict, List, Union
+
+from utils.chunking import estimate_tokens
+
+try:
+    import tiktoken
+except ImportError:  # fall back to the character estimate
+    tiktoken = None
+
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+|\n+')
+_WORD = re.compile(r'\w+')
+
+
+@lru_cache(maxsize=16)
+def _encoding(model: str):
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text: str, model: str = "gpt-3.5-turbo") -> int:
+    """Token count with the model's tokenizer, or an estimate when tiktoken is unavailable"""
+    if not text:
+        return 0
+    encoding = _encoding(model)
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def _sentences(text: str) -> List[str]:
+    return [s.strip() for s in _SENTENCE_END.split(text or "") if s.strip()]
+
+
+def _is_duplicate(words: set, seen: List[set], threshold: float) -> bool:
+    for other in seen:
+        overlap = len(words & other)
+        if overlap and overlap / min(len(words), len(other)) >= threshold:
+            return True
+    return False
+
+
+def assemble_context(context: Dict[str, List[Union[str, Dict]]], model: str, budget: int,
+                     duplicate_threshold: float = 0.8) -> List[str]:
+    """Deduplicated facts, chosen best first, that fit in budget tokens.
+
+    Facts are plain strings in retrieval order, or {"text", "score", "order"}
+    dicts. Strings are scored by their rank within their source. Sentences whose
+    words mostly repeat an already selected sentence are dropped, which removes
+    the overlap between neighbouring chunks and between sources. Facts that
+    carry an "order" are returned in that order once the selection is made;
+    the others keep their best-first position.
+    """
+    scored = []
+    for source, facts in (context or {}).items():
+        for rank, fact in enumerate(facts or []):
+            if isinstance(fact, dict):
+                text, score, order = fact.get("text", ""), fact.get("score", 1.0 / (rank + 1)), fact.get("order")
+            else:
+                text, score, order = fact, 1.0 / (rank + 1), None
+            if text:
+                scored.append((score, len(scored), text, order))
+    scored.sort(key=lambda item: (-item[0], item[1]))
+
+    selected = []
+    orders = []
+    seen: List[set] = []
+    used = 0
+    for _, _, text, order in scored:
+        kept = []
+        for sentence in _sentences(text):
+            words = set(_WORD.findall(sentence.lower()))
+            if not words or _is_duplicate(words, seen, duplicate_threshold):
+                continue
+            seen.append(words)
+            kept.append(sentence)
+        if not kept:
+            continue
+
+        fact = " ".join(kept)
+        tokens = count_tokens(fact, model)
+        if used + tokens > budget:
+            # Fill what is left with the leading sentences of this fact, then stop
+            partial = []
+            for sentence in kept:
+                sentence_tokens = count_tokens(sentence, model)
+                if used + sentence_tokens > budget:
+                    break
+                partial.append(sentence)
+                used += sentence_tokens
+            if partial:
+                selected.append(" ".join(partial))
+                orders.append(order)
+            break
+        selected.append(fact)
+        orders.append(order)
+        used += tokens
+
+    slots = [i for i, order in enumerate(orders) if order is not None]
+    in_order = sorted(slots, key=lambda i: orders[i])
+    result = list(selected)
+    for slot, i in zip(slots, in_order):
+        result[slot] = selected[i]
+    return result
+
+
+def summarize_history(replies: List[str], budget: int, model: str = "gpt-3.5-turbo") -> str:
+    """Extractive rolling summary of past replies, newest first, bounded by budget tokens.
+
+    Sentences are taken round-robin (first sentence of every reply, then the
+    second, ...), so every recent reply is represented before any is detailed.
+    """
+    per_reply = [_sentences(reply) for reply in replies if reply]
+    summary = []
+    seen: List[set] = []
+    used = 0
+    depth = 0
+    while any(depth < len(sentences) for sentences in per_reply):
+        for sentences in per_reply:
+            if depth >= len(sentences):
+                continue
+            sentence = sentences[depth]
+            words = set(_WORD.findall(sentence.lower()))
+            if not words or _is_duplicate(words, seen, 0.8):
+                continue
+            tokens = count_tokens(sentence, model)
+            if used + tokens > budget:
+                return " ".join(summary)
+            seen.append(words)
+            summary.append(sentence)
+            used += tokens
+        depth += 1
+    return " ".join(summary)
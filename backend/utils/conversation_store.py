@@ -0,0 +1,187 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+try:
+    import redis
+except ImportError:  # the in-process tier works on its own
+    redis = None
+
+
+class ConversationStore:
+    """Recent messages per tour session, so prompts never query Firestore for history.
+
+    Sessions are kept in an in-process LRU. With a redis_url they are also kept
+    in a Redis-compatible server shared by all workers. A session missing from
+    both is hydrated through loader(session_id), which returns its recent
+    messages oldest first, and append() keeps the store current as messages
+    are written.
+
+    Other workers write to the same sessions, so an in-process copy is only
+    trusted for refresh_seconds. After that it is re-read from redis, or
+    without redis from the loader, so repeat counts and history converge
+    across workers. refresh_seconds=0 trusts the copy for its lifetime, which
+    is only correct with a single worker.
+    """
+
+    FIELDS = ('chatText', 'userCheck', 'repeat', 'timestamp')
+
+    def __init__(self, loader: Callable[[str], List[Dict]], max_sessions: int = 10000, max_messages: int = 50,
+                 redis_url: Optional[str] = None, ttl_seconds: int = 7 * 24 * 3600, refresh_seconds: float = 30):
+        self.loader = loader
+        self.max_sessions = max_sessions
+        self.max_messages = max_messages
+        self.ttl_seconds = ttl_seconds
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._sessions: "OrderedDict[str, tuple]" = OrderedDict()  # session -> (loaded_at, messages)
+        self._hydrating: Dict[str, threading.Lock] = {}
+        self.hits = 0
+        self.redis_hits = 0
+        self.hydrations = 0
+
+        self.redis = None
+        if redis_url:
+            if redis is None:
+                print("redis package not installed; conversation store is in-process only")
+            else:
+                self.redis = redis.Redis.from_url(redis_url, decode_responses=True)
+
+    def _compact(self, message: Dict) -> Dict:
+        compact = {field: message.get(field) for field in self.FIELDS}
+        if isinstance(compact['timestamp'], datetime):
+            compact['timestamp'] = compact['timestamp'].isoformat()
+        elif compact['timestamp'] is not None and not isinstance(compact['timestamp'], str):
+            compact['timestamp'] = str(compact['timestamp'])
+        return compact
+
+    def _remember(self, session_id: str, messages: List[Dict], loaded_at: float) -> None:
+        self._sessions[session_id] = (loaded_at, messages[-self.max_messages:])
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    def _redis_keys(self, session_id: str):
+        # The marker key tells a hydrated but empty session apart from an unknown one
+        key = f"tour:conversation:{session_id}"
+        return key, f"{key}:hydrated"
+
+    def _from_redis(self, session_id: str) -> Optional[List[Dict]]:
+        if self.redis is None:
+            return None
+        try:
+            key, marker = self._redis_keys(session_id)
+            if not self.redis.exists(marker):
+                return None
+            return [json.loads(item) for item in self.redis.lrange(key, 0, -1)]
+        except Exception as e:
+            print(f"Conversation store redis read error: {str(e)}")
+            return None
+
+    def _to_redis(self, session_id: str, messages: List[Dict], replace: bool = False) -> None:
+        if self.redis is None:
+            return
+        try:
+            key, marker = self._redis_keys(session_id)
+            if not replace and not self.redis.exists(marker):
+                return  # not in redis yet: the next reader hydrates it in full
+            pipe = self.redis.pipeline()
+            if replace:
+                pipe.delete(key)
+            if messages:
+                pipe.rpush(key, *[json.dumps(message) for message in messages])
+                pipe.ltrim(key, -self.max_messages, -1)
+            pipe.set(marker, "1", ex=self.ttl_seconds)
+            pipe.expire(key, self.ttl_seconds)
+            pipe.execute()
+        except Exception as e:
+            print(f"Conversation store redis write error: {str(e)}")
+
+    def _fresh(self, session_id: str) -> Optional[List[Dict]]:
+        """The in-process copy while it is within refresh_seconds of being loaded; call with _lock held"""
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            return None
+        loaded_at, messages = entry
+        if self.refresh_seconds and time.monotonic() - loaded_at >= self.refresh_seconds:
+            return None
+        self._sessions.move_to_end(session_id)
+        self.hits += 1
+        return list(messages)
+
+    def history(self, session_id: str) -> List[Dict]:
+        """Recent messages of a session, oldest first"""
+        with self._lock:
+            messages = self._fresh(session_id)
+            if messages is not None:
+                return messages
+            hydrating = self._hydrating.setdefault(session_id, threading.Lock())
+
+        # One hydration per session even when requests race
+        with hydrating:
+            with self._lock:
+                messages = self._fresh(session_id)
+                if messages is not None:
+                    return messages
+
+            loaded_at = time.monotonic()
+            messages = self._from_redis(session_id)
+            from_redis = messages is not None
+            if not from_redis:
+                try:
+                    messages = [self._compact(message) for message in self.loader(session_id)]
+                except Exception as e:
+                    # Not remembered, so the next request tries to hydrate again
+                    print(f"Error loading conversation history for {session_id}: {str(e)}")
+                    with self._lock:
+                        self._hydrating.pop(session_id, None)
+                        stale = self._sessions.get(session_id)
+                    return list(stale[1]) if stale else []
+
+            with self._lock:
+                if from_redis:
+                    self.redis_hits += 1
+                else:
+                    self.hydrations += 1
+                self._remember(session_id, messages, loaded_at)
+                self._hydrating.pop(session_id, None)
+            if not from_redis:
+                self._to_redis(session_id, messages[-self.max_messages:], replace=True)
+            return list(messages)
+
+    def append(self, session_id: str, message: Dict) -> None:
+        """Record a message that was just written for this session"""
+        self.history(session_id)  # hydrate first so the loaded history does not miss this write
+        compact = self._compact(message)
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is not None:
+                loaded_at, messages = entry
+                self._remember(session_id, messages + [compact], loaded_at)
+            # Otherwise hydration failed: caching just this message would hide the stored
+            # history for good, so the next read hydrates again instead
+        self._to_redis(session_id, [compact])
+
+    def latest_repeat(self, session_id: str) -> int:
+        messages = self.history(session_id)
+        return (messages[-1].get('repeat') or 0) if messages else 0
+
+    def recent_texts(self, session_id: str, count: int) -> List[str]:
+        """chatText of the newest count messages, newest first"""
+        if count <= 0:
+            return []
+        messages = self.history(session_id)[-count:]
+        return [message['chatText'] for message in reversed(messages) if message.get('chatText')]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "hits": self.hits,
+                "redis_hits": self.redis_hits,
+                "hydrations": self.hydrations,
+                "redis": self.redis is not None
+            }
@@ -0,0 +1,141 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+
+class EmbeddingCache:
+    """Disk-backed cache of text embeddings keyed by (model id, SHA-256 of the text).
+
+    Vectors live in one append-only float32 file per model, read through a
+    numpy memmap. A sidecar file lists the text hashes in row order and a
+    small .meta file records the vector dimension. Misses
+    are de-duplicated, split into batch_size batches and embedded on a thread
+    pool, so unchanged documents are never sent to the model twice.
+    """
+
+    def __init__(self, embedding_function: Callable[[List[str]], List[List[float]]], model_id: str,
+                 cache_dir: str = "embedding_cache", batch_size: int = 64, workers: int = 4):
+        self.embedding_function = embedding_function
+        self.model_id = model_id
+        self.batch_size = batch_size
+        self.workers = workers
+        self._lock = threading.Lock()
+
+        os.makedirs(cache_dir, exist_ok=True)
+        stem = os.path.join(cache_dir, re.sub(r'[^\w.-]', '_', model_id))
+        self.vectors_path = f"{stem}.f32"
+        self.keys_path = f"{stem}.keys"
+        self.meta_path = f"{stem}.meta"
+
+        self._rows: Dict[str, int] = {}
+        self.dim: Optional[int] = None
+        self._map: Optional[np.memmap] = None
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    def _reset(self) -> None:
+        for path in (self.vectors_path, self.keys_path, self.meta_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _load(self) -> None:
+        if not os.path.exists(self.meta_path):
+            if os.path.exists(self.vectors_path) or os.path.exists(self.keys_path):
+                # Without the recorded dimension the rows cannot be trusted
+                print(f"Embedding cache for {self.model_id} has no metadata, starting empty")
+                self._reset()
+            return
+        with open(self.meta_path) as f:
+            self.dim = int(json.load(f)["dim"])
+
+        keys, partial_key = [], False
+        if os.path.exists(self.keys_path):
+            with open(self.keys_path) as f:
+                content = f.read()
+            keys = [line for line in content.split("\n")[:-1] if line]
+            partial_key = bool(content) and not content.endswith("\n")
+        size = os.path.getsize(self.vectors_path) if os.path.exists(self.vectors_path) else 0
+
+        # A crash between or during the two appends leaves extra rows or a partial row in one
+        # file; cut both back to the complete rows they share so later appends stay aligned
+        rows = min(len(keys), size // (4 * self.dim))
+        if partial_key or rows != len(keys) or size != rows * 4 * self.dim:
+            with open(self.vectors_path, "ab") as f:
+                f.truncate(rows * 4 * self.dim)
+            staging = f"{self.keys_path}.tmp"
+            with open(staging, "w") as f:
+                f.write("".join(f"{key}\n" for key in keys[:rows]))
+            os.replace(staging, self.keys_path)
+            print(f"Embedding cache for {self.model_id} repaired to {rows} complete rows")
+
+        self._rows = {key: row for row, key in enumerate(keys[:rows])}
+        print(f"Loaded {len(self._rows)} cached embeddings for {self.model_id}")
+
+    def _write_meta(self) -> None:
+        staging = f"{self.meta_path}.tmp"
+        with open(staging, "w") as f:
+            json.dump({"model_id": self.model_id, "dim": self.dim}, f)
+        os.replace(staging, self.meta_path)
+
+    def _vectors(self) -> np.memmap:
+        if self._map is None or self._map.shape[0] < len(self._rows):
+            self._map = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(len(self._rows), self.dim))
+        return self._map
+
+    @staticmethod
+    def key(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _compute(self, texts: List[str]) -> np.ndarray:
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        if len(batches) == 1 or self.workers <= 1:
+            results = [self.embedding_function(batch) for batch in batches]
+        else:
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="embed") as pool:
+                results = list(pool.map(self.embedding_function, batches))
+        return np.asarray([vector for batch in results for vector in batch], dtype=np.float32)
+
+    def _append(self, keys: List[str], vectors: np.ndarray) -> None:
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+            self._write_meta()
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match cached dimension {self.dim}")
+        with open(self.vectors_path, "ab") as f:
+            f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+        with open(self.keys_path, "a") as f:
+            f.write("".join(f"{key}\n" for key in keys))
+        for key in keys:
+            self._rows[key] = len(self._rows)
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """Embeddings for texts in order, computing only the ones not cached yet"""
+        keys = [self.key(text) for text in texts]
+        with self._lock:
+            missing = {}
+            for key, text in zip(keys, texts):
+                if key not in self._rows:
+                    missing.setdefault(key, text)
+            self.hits += len(texts) - sum(1 for key in keys if key in missing)
+            self.misses += len(missing)
+
+            if missing:
+                vectors = self._compute(list(missing.values()))
+                self._append(list(missing), vectors)
+                print(f"Embedded {len(missing)} new texts, {len(texts) - len(missing)} served from cache")
+
+            if not texts:
+                return []
+            store = self._vectors()
+            return [store[self._rows[key]].tolist() for key in keys]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"model": self.model_id, "entries": len(self._rows), "hits": self.hits, "misses": self.misses}
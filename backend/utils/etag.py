@@ -0,0 +1,24 @@
+import hashlib
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Exact (weak) comparison of etag against each entry of an If-None-Match list"""
+    candidates = {candidate.strip() for candidate in if_none_match.split(',') if candidate.strip()}
+    return '*' in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def messages_etag(messages_ref, query_string: str = "") -> str:
+    """ETag of a messages collection for one query, from a count aggregation and the newest document.
+
+    Batched writers in several workers can commit a message older than the newest one,
+    so the count is part of the version: every committed append changes it.
+    """
+    count = messages_ref.count().get()[0][0].value
+    newest = list(
+        messages_ref.order_by('timestamp', direction='DESCENDING')
+        .limit(1)
+        .select(['timestamp'])
+        .stream()
+    )
+    version = f"{count}:{newest[0].id}:{newest[0].update_time}" if newest else "empty"
+    return '"' + hashlib.sha256(f"{version}|{query_string}".encode()).hexdigest()[:32] + '"'
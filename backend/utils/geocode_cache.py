@@ -0,0 +1,127 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from utils import geohash
+
+
+class GeocodeCache:
+    """Reverse-geocode cache keyed by geohash cell.
+
+    Lookups hit an in-memory LRU first, then an optional SQLite file that
+    survives restarts, and only call Google Maps on a miss in both.
+    """
+
+    def __init__(self, gmap, precision: int = 8, ttl_seconds: int = 86400,
+                 max_entries: int = 10000, db_path: Optional[str] = None):
+        self.gmap = gmap
+        self.precision = precision
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, result)
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._db = None
+        if db_path:
+            try:
+                self._db = sqlite3.connect(db_path, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS geocode (key TEXT PRIMARY KEY, result TEXT, expires_at REAL)"
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                print(f"Geocode cache disk tier disabled: {str(e)}")
+                self._db = None
+
+    def key(self, lat: float, lng: float) -> str:
+        return geohash.encode(lat, lng, self.precision)
+
+    def _get_memory(self, key: str, now: float) -> Optional[List[Dict]]:
+        entry = self._entries.get(key)
+        if not entry:
+            return None
+        expires_at, result = entry
+        if expires_at < now:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return result
+
+    def _put_memory(self, key: str, result: List[Dict], expires_at: float) -> None:
+        self._entries[key] = (expires_at, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _get_disk(self, key: str, now: float) -> Optional[tuple]:
+        if not self._db:
+            return None
+        row = self._db.execute(
+            "SELECT result, expires_at FROM geocode WHERE key = ?", (key,)
+        ).fetchone()
+        if not row or row[1] < now:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def _put_disk(self, key: str, result: List[Dict], expires_at: float) -> None:
+        if not self._db:
+            return
+        self._db.execute(
+            "INSERT OR REPLACE INTO geocode (key, result, expires_at) VALUES (?, ?, ?)",
+            (key, json.dumps(result), expires_at)
+        )
+        self._db.commit()
+
+    def reverse_geocode(self, lat: float, lng: float) -> List[Dict]:
+        """Drop-in replacement for gmap.reverse_geocode((lat, lng))"""
+        key = self.key(lat, lng)
+        now = time.time()
+
+        with self._lock:
+            result = self._get_memory(key, now)
+            if result is not None:
+                self.hits += 1
+                return result
+
+            try:
+                cached = self._get_disk(key, now)
+            except sqlite3.Error as e:
+                print(f"Geocode cache read error: {str(e)}")
+                cached = None
+            if cached:
+                result, expires_at = cached
+                self._put_memory(key, result, expires_at)
+                self.disk_hits += 1
+                return result
+
+            self.misses += 1
+
+        result = self.gmap.reverse_geocode((lat, lng))
+        if not result:
+            return result
+
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            self._put_memory(key, result, expires_at)
+            try:
+                self._put_disk(key, result, expires_at)
+            except sqlite3.Error as e:
+                print(f"Geocode cache write error: {str(e)}")
+        return result
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0
+            }
@@ -0,0 +1,68 @@
+from typing import Tuple
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+_DECODE = {c: i for i, c in enumerate(_BASE32)}
+
+
+def encode(lat: float, lng: float, precision: int = 8) -> str:
+    """Encode a coordinate as a geohash (precision 8 is roughly a 38m x 19m cell)"""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    geohash = []
+    bits = 0
+    bit_count = 0
+    even = True
+
+    while len(geohash) < precision:
+        rng, value = (lng_range, lng) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            rng[0] = mid
+        else:
+            bits <<= 1
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            geohash.append(_BASE32[bits])
+            bits = 0
+            bit_count = 0
+
+    return "".join(geohash)
+
+
+def bounds(geohash: str) -> Tuple[float, float, float, float]:
+    """Return (min_lat, min_lng, max_lat, max_lng) of a geohash cell"""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    even = True
+
+    for char in geohash:
+        value = _DECODE[char]
+        for shift in range(4, -1, -1):
+            rng = lng_range if even else lat_range
+            mid = (rng[0] + rng[1]) / 2
+            if (value >> shift) & 1:
+                rng[0] = mid
+            else:
+                rng[1] = mid
+            even = not even
+
+    return lat_range[0], lng_range[0], lat_range[1], lng_range[1]
+
+
+def center(geohash: str) -> Tuple[float, float]:
+    """Return the (lat, lng) centre of a geohash cell"""
+    min_lat, min_lng, max_lat, max_lng = bounds(geohash)
+    return (min_lat + max_lat) / 2, (min_lng + max_lng) / 2
+
+
+def neighbor(geohash: str, dlat: int, dlng: int) -> str:
+    """Return the cell dlat rows north and dlng columns east of geohash"""
+    min_lat, min_lng, max_lat, max_lng = bounds(geohash)
+    lat = (min_lat + max_lat) / 2 + dlat * (max_lat - min_lat)
+    lng = (min_lng + max_lng) / 2 + dlng * (max_lng - min_lng)
+    lat = max(-90.0, min(90.0, lat))
+    lng = (lng + 180.0) % 360.0 - 180.0
+    return encode(lat, lng, len(geohash))
@@ -0,0 +1,155 @@
+import base64
+import binascii
+import hashlib
+import os
+import re
+import struct
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+_DATA_URL = re.compile(r'^data:(?P<mime>[\w/+.-]+);base64,(?P<payload>.*)$', re.DOTALL)
+_EXTENSIONS = {"image/jpeg": ".jpg", "image/png": ".png", "image/webp": ".webp", "image/gif": ".gif"}
+
+
+def image_dimensions(data: bytes) -> Tuple[Optional[int], Optional[int]]:
+    """Read (width, height) from a JPEG or PNG header without decoding the image"""
+    if data[:8] == b'\x89PNG\r\n\x1a\n' and len(data) >= 24:
+        width, height = struct.unpack('>II', data[16:24])
+        return width, height
+
+    if data[:2] == b'\xff\xd8':
+        i = 2
+        while i + 9 < len(data):
+            if data[i] != 0xFF:
+                i += 1
+                continue
+            marker = data[i + 1]
+            if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+                i += 2
+                continue
+            length = struct.unpack('>H', data[i + 2:i + 4])[0]
+            # SOF0-SOF15 except DHT (C4), JPG (C8) and DAC (CC) carry the frame size
+            if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                height, width = struct.unpack('>HH', data[i + 5:i + 9])
+                return width, height
+            i += 2 + length
+
+    return None, None
+
+
+class ImageStore:
+    """Content-addressed image store backed by the Firebase Storage bucket or a local directory.
+
+    Images are keyed by the SHA-256 of their decoded bytes, so identical
+    uploads are stored once. Uploads run on a small background pool; the
+    reference is returned at once together with a future that resolves to
+    whether the bytes landed, so callers only persist references that exist.
+    """
+
+    def __init__(self, bucket=None, prefix: str = "ggdotcom/images", local_dir: Optional[str] = None,
+                 upload_workers: int = 4, max_known: int = 10000):
+        self.bucket = bucket
+        self.prefix = prefix.rstrip('/')
+        self.local_dir = local_dir
+        self._executor = ThreadPoolExecutor(max_workers=upload_workers, thread_name_prefix="image-upload")
+        self._lock = threading.Lock()
+        self.max_known = max_known
+        self._known: "OrderedDict[str, Future]" = OrderedDict()  # path -> upload future, LRU
+        self.uploads = 0
+        self.duplicates = 0
+
+        if self.local_dir:
+            os.makedirs(self.local_dir, exist_ok=True)
+
+    def _path(self, sha256: str, ext: str) -> str:
+        return f"{self.prefix}/{sha256}{ext}"
+
+    def _exists(self, path: str) -> bool:
+        if self.local_dir:
+            return os.path.exists(os.path.join(self.local_dir, os.path.basename(path)))
+        return self.bucket.blob(path).exists()
+
+    def _upload(self, path: str, data: bytes, content_type: str) -> bool:
+        try:
+            if self._exists(path):
+                with self._lock:
+                    self.duplicates += 1
+                return True
+
+            if self.local_dir:
+                target = os.path.join(self.local_dir, os.path.basename(path))
+                staging = f"{target}.tmp"
+                with open(staging, 'wb') as f:
+                    f.write(data)
+                os.replace(staging, target)
+            else:
+                self.bucket.blob(path).upload_from_string(data, content_type=content_type)
+
+            with self._lock:
+                self.uploads += 1
+            print(f"Stored image: {path}")
+            return True
+        except Exception as e:
+            with self._lock:
+                self._known.pop(path, None)
+            print(f"Error storing image {path}: {str(e)}")
+            return False
+
+    def put_data_url(self, image_data: str) -> Tuple[Dict, Future]:
+        """Decode a base64 data URL once and schedule the upload.
+
+        Returns the message reference and a future that resolves to True once
+        the image is stored, or False if the upload failed.
+        """
+        match = _DATA_URL.match(image_data.strip())
+        if match:
+            content_type, payload = match.group("mime"), match.group("payload")
+        else:
+            content_type, payload = "image/jpeg", image_data
+
+        try:
+            data = base64.b64decode(payload, validate=False)
+        except (binascii.Error, ValueError):
+            raise ValueError("Invalid base64 image data")
+
+        sha256 = hashlib.sha256(data).hexdigest()
+        path = self._path(sha256, _EXTENSIONS.get(content_type, ""))
+        width, height = image_dimensions(data)
+
+        with self._lock:
+            stored = self._known.get(path)
+            if stored is None:
+                stored = self._executor.submit(self._upload, path, data, content_type)
+                self._known[path] = stored
+                while len(self._known) > self.max_known:
+                    self._known.popitem(last=False)
+            else:
+                self._known.move_to_end(path)
+                self.duplicates += 1
+
+        return {
+            'sha256': sha256,
+            'path': path,
+            'contentType': content_type,
+            'bytes': len(data),
+            'width': width,
+            'height': height
+        }, stored
+
+    def get(self, path: str) -> Optional[bytes]:
+        """Return the stored bytes for a reference path, or None if missing"""
+        try:
+            if self.local_dir:
+                with open(os.path.join(self.local_dir, os.path.basename(path)), 'rb') as f:
+                    return f.read()
+            blob = self.bucket.blob(path)
+            return blob.download_as_bytes() if blob.exists() else None
+        except Exception as e:
+            print(f"Error reading image {path}: {str(e)}")
+            return None
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"uploads": self.uploads, "duplicates": self.duplicates}
@@ -0,0 +1,106 @@
+import logging
+import queue
+import threading
+import time
+from typing import Callable, Dict, List
+
+
+class TokenBucket:
+    """Blocking token bucket: at most `rate` acquisitions per second, bursting to `capacity`"""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class HostRateLimiter:
+    """One token bucket per remote host"""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, host: str) -> None:
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = self._buckets[host] = TokenBucket(self.rate, self.capacity)
+        bucket.acquire()
+
+
+def with_retries(fn: Callable, attempts: int = 3, backoff_seconds: float = 1.0, description: str = "request"):
+    """Call fn, retrying with exponential backoff on any exception"""
+    for attempt in range(attempts):
+        try:
+            return fn()
+        except Exception as e:
+            if attempt == attempts - 1:
+                raise
+            delay = backoff_seconds * (2 ** attempt)
+            logging.warning(f"{description} failed ({str(e)}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+class BatchWriter:
+    """Collects items from many producer threads and hands them to write_fn in batches.
+
+    A single consumer thread does the writing, so the store sees one writer.
+    close() flushes the final partial batch and waits for it.
+    """
+
+    _STOP = object()
+
+    def __init__(self, write_fn: Callable[[List], None], batch_size: int = 64, max_pending: int = 1024):
+        self.write_fn = write_fn
+        self.batch_size = batch_size
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_pending)
+        self.batches_written = 0
+        self.items_written = 0
+        self._thread = threading.Thread(target=self._run, name="batch-writer", daemon=True)
+        self._thread.start()
+
+    def put(self, item) -> None:
+        self._queue.put(item)
+
+    def close(self) -> None:
+        self._queue.put(self._STOP)
+        self._thread.join()
+
+    def _write(self, batch: List) -> None:
+        if not batch:
+            return
+        try:
+            self.write_fn(batch)
+            self.batches_written += 1
+            self.items_written += len(batch)
+        except Exception as e:
+            logging.error(f"Error writing batch of {len(batch)}: {str(e)}")
+
+    def _run(self) -> None:
+        batch = []
+        while True:
+            item = self._queue.get()
+            if item is self._STOP:
+                self._write(batch)
+                return
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                self._write(batch)
+                batch = []
@@ -0,0 +1,138 @@
+import atexit
+import queue
+import threading
+import time
+from typing import Dict, List, Tuple
+
+
+class MessageWriter:
+    """Write-behind queue that persists Firestore documents with batched commits.
+
+    Documents are committed with a WriteBatch once batch_size are pending or
+    flush_interval seconds have passed. The queue is bounded. When it is full,
+    or the writer is closed, add() writes the document inline so that nothing
+    is dropped. Each document's id is allocated when it is queued, so a retried
+    commit overwrites rather than duplicates a write that already landed.
+    """
+
+    MAX_BATCH = 500  # Firestore WriteBatch limit
+
+    def __init__(self, db, batch_size: int = 50, flush_interval: float = 1.0, max_queue: int = 10000,
+                 max_retries: int = 5, backoff_seconds: float = 0.5):
+        self.db = db
+        self.batch_size = min(batch_size, self.MAX_BATCH)
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._state_lock = threading.Lock()  # orders add() against close(); never taken by the writer thread
+        self._closed = False
+        self.written = 0
+        self.commits = 0
+        self.failed = 0
+        self.inline_writes = 0
+
+        self._thread = threading.Thread(target=self._run, name="firestore-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def add(self, collection_ref, data: Dict) -> None:
+        """Queue a document for collection_ref.add(data)"""
+        document_ref = collection_ref.document()
+        with self._state_lock:
+            if not self._closed:
+                try:
+                    self._queue.put_nowait(("write", document_ref, data))
+                    return
+                except queue.Full:
+                    pass
+
+        # Backpressure or shutdown: write inline rather than grow memory or lose the message
+        document_ref.set(data)
+        with self._lock:
+            self.inline_writes += 1
+            self.written += 1
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Block until everything queued so far has been committed"""
+        done = threading.Event()
+        with self._state_lock:
+            if self._closed:
+                return not self._thread.is_alive()
+            self._queue.put(("flush", done, None))
+        return done.wait(timeout)
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Flush pending writes and stop the writer thread"""
+        with self._state_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(("stop", None, None))
+        self._thread.join(timeout)
+
+    def _run(self) -> None:
+        pending: List[Tuple] = []
+        deadline = None
+
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                kind, target, data = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                self._commit(pending)
+                pending, deadline = [], None
+                continue
+
+            if kind == "write":
+                pending.append((target, data))
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                if len(pending) >= self.batch_size:
+                    self._commit(pending)
+                    pending, deadline = [], None
+                continue
+
+            # "flush" or "stop": drain what is pending first
+            self._commit(pending)
+            pending, deadline = [], None
+            if kind == "flush":
+                target.set()
+            else:
+                return
+
+    def _commit(self, pending: List[Tuple]) -> None:
+        if not pending:
+            return
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                batch = self.db.batch()
+                for document_ref, data in pending:
+                    batch.set(document_ref, data)
+                batch.commit()
+                with self._lock:
+                    self.commits += 1
+                    self.written += len(pending)
+                print(f"Success: Committed {len(pending)} messages to Firestore")
+                return
+            except Exception as e:
+                if attempt == self.max_retries:
+                    with self._lock:
+                        self.failed += len(pending)
+                    print(f"Error: Failed to commit {len(pending)} messages to Firestore - {str(e)}")
+                    return
+                delay = self.backoff_seconds * (2 ** attempt)
+                print(f"Firestore batch commit failed ({str(e)}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "queued": self._queue.qsize(),
+                "written": self.written,
+                "commits": self.commits,
+                "failed": self.failed,
+                "inline_writes": self.inline_writes
+            }
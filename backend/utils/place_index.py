@@ -0,0 +1,163 @@
+import threading
+import json
+from datetime import datetime
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+
+class PlaceIndex:
+    """In-process inverted n-gram index over the documents of a Chroma collection.
+
+    A lookup intersects the posting lists of the query's n-grams and then
+    verifies the literal substring match, so results are the same documents
+    (in the same collection order) that a full `collection.get()` scan returns.
+    """
+
+    def __init__(self, ngram_size: int = 3):
+        self.ngram_size = ngram_size
+        self._lock = threading.RLock()
+        self._entries: Dict[str, Dict] = {}  # id -> {"document", "text", "metadata", "fingerprint", "order"}
+        self._postings: Dict[str, Set[str]] = defaultdict(set)
+        self._next_order = 0
+        self.built_at: Optional[datetime] = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def is_built(self) -> bool:
+        return self.built_at is not None
+
+    def _ngrams(self, text: str) -> Set[str]:
+        n = self.ngram_size
+        return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+    @staticmethod
+    def _fingerprint(metadata: Optional[Dict]) -> str:
+        """The document's content_hash; without one, its metadata is the best available signal"""
+        metadata = metadata or {}
+        if metadata.get("content_hash"):
+            return metadata["content_hash"]
+        return json.dumps(metadata, sort_keys=True, default=str)
+
+    def _add(self, doc_id: str, document: str, metadata: Optional[Dict]) -> None:
+        text = (document or "").lower()
+        previous = self._entries.get(doc_id)
+        if previous:
+            self._remove(doc_id)
+            order = previous["order"]
+        else:
+            order = self._next_order
+            self._next_order += 1
+
+        self._entries[doc_id] = {
+            "document": document,
+            "text": text,
+            "metadata": metadata or {},
+            "fingerprint": self._fingerprint(metadata),
+            "order": order
+        }
+        for gram in self._ngrams(text):
+            self._postings[gram].add(doc_id)
+
+    def _remove(self, doc_id: str) -> None:
+        entry = self._entries.pop(doc_id, None)
+        if not entry:
+            return
+        for gram in self._ngrams(entry["text"]):
+            postings = self._postings.get(gram)
+            if postings is not None:
+                postings.discard(doc_id)
+                if not postings:
+                    del self._postings[gram]
+
+    def build(self, collection) -> int:
+        """Download the collection once and index every document"""
+        result = collection.get(include=["documents", "metadatas"])
+        with self._lock:
+            self._entries.clear()
+            self._postings.clear()
+            self._next_order = 0
+            self._load(result)
+            self.built_at = datetime.now()
+        print(f"Built place index with {len(self._entries)} documents")
+        return len(self._entries)
+
+    def refresh(self, collection, page_size: int = 1000) -> Dict[str, int]:
+        """Re-fetch only documents that are new or whose content_hash changed since the last build.
+
+        Ids and metadata are scanned in pages; documents themselves are only
+        downloaded for new or changed ids. Metadata-only changes are applied
+        from the scan without re-fetching the text.
+        """
+        if not self.is_built:
+            return {"added": self.build(collection), "updated": 0, "removed": 0}
+
+        seen = set()
+        changed = []
+        metadata_updates = {}
+        offset = 0
+        while True:
+            page = collection.get(include=["metadatas"], limit=page_size, offset=offset)
+            ids = page.get("ids") or []
+            metadatas = page.get("metadatas") or [{}] * len(ids)
+            with self._lock:
+                for doc_id, metadata in zip(ids, metadatas):
+                    seen.add(doc_id)
+                    entry = self._entries.get(doc_id)
+                    if entry is None or entry["fingerprint"] != self._fingerprint(metadata):
+                        changed.append(doc_id)
+                    elif entry["metadata"] != (metadata or {}):
+                        metadata_updates[doc_id] = metadata or {}
+            offset += len(ids)
+            if len(ids) < page_size:
+                break
+
+        with self._lock:
+            known = set(self._entries)
+        removed = known - seen
+
+        stats = {"added": 0, "updated": len(metadata_updates), "removed": len(removed)}
+        fetched = collection.get(ids=changed, include=["documents", "metadatas"]) if changed else None
+
+        with self._lock:
+            for doc_id in removed:
+                self._remove(doc_id)
+            for doc_id, metadata in metadata_updates.items():
+                if doc_id in self._entries:
+                    self._entries[doc_id]["metadata"] = metadata
+            if fetched:
+                for doc_id in fetched.get("ids") or []:
+                    stats["updated" if doc_id in known else "added"] += 1
+                self._load(fetched)
+            self.built_at = datetime.now()
+
+        if any(stats.values()):
+            print(f"Refreshed place index: {stats}")
+        return stats
+
+    def _load(self, result: Dict) -> None:
+        ids = result.get("ids") or []
+        documents = result.get("documents") or [""] * len(ids)
+        metadatas = result.get("metadatas") or [{}] * len(ids)
+        for doc_id, document, metadata in zip(ids, documents, metadatas):
+            self._add(doc_id, document, metadata)
+
+    def search(self, place_name: str) -> List[Tuple[str, Dict]]:
+        """Return (document, metadata) pairs whose text contains place_name, in collection order"""
+        query = place_name.lower()
+        with self._lock:
+            grams = self._ngrams(query)
+            if grams:
+                posting_lists = sorted((self._postings.get(gram, set()) for gram in grams), key=len)
+                candidates = set(posting_lists[0])
+                for postings in posting_lists[1:]:
+                    if not candidates:
+                        break
+                    candidates &= postings
+            else:
+                # Query shorter than one n-gram: fall back to scanning the warm index
+                candidates = set(self._entries)
+
+            entries = sorted((self._entries[doc_id] for doc_id in candidates), key=lambda e: e["order"])
+            return [(e["document"], e["metadata"]) for e in entries if query in e["text"]]
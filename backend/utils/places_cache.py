@@ -0,0 +1,213 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from utils import geohash
+
+PLACE_TYPES = ['tourist_attraction', 'museum', 'art_gallery', 'park', 'shopping_mall',
+               'hindu_temple', 'church', 'mosque', 'place_of_worship',
+               'amusement_park', 'aquarium', 'zoo',
+               'restaurant', 'cafe']
+
+
+def haversine_m(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Great-circle distance in metres"""
+    r = 6371000.0
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lng2 - lng1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * r * math.asin(math.sqrt(a))
+
+
+class NearbyPlacesCache:
+    """Geohash tile cache for gmap.places_nearby with direction-of-travel prefetch.
+
+    Each cell is fetched once from its centre with the radius widened by the
+    cell's half-diagonal, so every point inside the cell is covered. The wider
+    circle holds more places than one 20-result page, so next_page_token is
+    followed for up to max_pages pages. A page token takes a couple of
+    seconds to become valid, so only prefetches wait for the extra pages; a
+    request-path miss answers from the first page and the rest of the cell is
+    completed in the background. Results are then trimmed to the requested
+    radius around the caller's position.
+    """
+
+    def __init__(self, gmap, precision: int = 7, radius: int = 500, ttl_seconds: int = 3600,
+                 max_entries: int = 2000, prefetch: bool = True, prefetch_workers: int = 2,
+                 place_types: List[str] = None, max_pages: int = 3, page_token_delay: float = 2.0):
+        self.gmap = gmap
+        self.precision = precision
+        self.radius = radius
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.prefetch = prefetch
+        self.place_types = place_types or PLACE_TYPES
+        self.max_pages = max(max_pages, 1)
+        self.page_token_delay = page_token_delay
+        self._executor = ThreadPoolExecutor(max_workers=prefetch_workers, thread_name_prefix="places-prefetch")
+        self._lock = threading.RLock()
+        self._cells: "OrderedDict[str, tuple]" = OrderedDict()  # cell -> (expires_at, results)
+        self._inflight: Dict[str, Future] = {}
+        self._last_positions: "OrderedDict[str, tuple]" = OrderedDict()  # session -> (lat, lng)
+        self.hits = 0
+        self.misses = 0
+        self.prefetches = 0
+
+    def _fetch_cell(self, cell: str, follow_pages: bool = True) -> List[Dict]:
+        min_lat, min_lng, max_lat, max_lng = geohash.bounds(cell)
+        lat, lng = (min_lat + max_lat) / 2, (min_lng + max_lng) / 2
+        half_diagonal = haversine_m(min_lat, min_lng, max_lat, max_lng) / 2
+
+        places_result = self.gmap.places_nearby(
+            location=(lat, lng),
+            radius=int(self.radius + half_diagonal),
+            type=self.place_types,
+            language='en'  # Ensure English results
+        )
+        results = list(places_result.get('results', []))
+        page_token = places_result.get('next_page_token')
+
+        if page_token and self.max_pages > 1:
+            if follow_pages:
+                results = self._next_pages(cell, results, page_token)
+            else:
+                self._executor.submit(self._complete_cell, cell, results, page_token)
+        self._store(cell, results)
+        return results
+
+    def _next_pages(self, cell: str, results: List[Dict], page_token: str) -> List[Dict]:
+        results = list(results)
+        pages = 1
+        while page_token and pages < self.max_pages:
+            # A page token only becomes valid a couple of seconds after it is issued
+            time.sleep(self.page_token_delay)
+            try:
+                places_result = self.gmap.places_nearby(page_token=page_token)
+            except Exception as e:
+                print(f"Error fetching next places page for cell {cell}: {str(e)}")
+                break
+            results.extend(places_result.get('results', []))
+            page_token = places_result.get('next_page_token')
+            pages += 1
+        return results
+
+    def _complete_cell(self, cell: str, results: List[Dict], page_token: str) -> None:
+        """Fetch the remaining pages of a cell a request answered from its first page"""
+        self._store(cell, self._next_pages(cell, results, page_token))
+
+    def _store(self, cell: str, results: List[Dict]) -> None:
+        with self._lock:
+            self._cells[cell] = (time.time() + self.ttl_seconds, results)
+            self._cells.move_to_end(cell)
+            while len(self._cells) > self.max_entries:
+                self._cells.popitem(last=False)
+
+    def _lookup(self, cell: str, prefetch: bool = False) -> tuple:
+        """Return (cached results, None, False) on a hit, otherwise (None, future, owner).
+
+        Prefetches run on the background pool. A request-path miss that is not
+        already in flight is owned by the caller and fetched on its own thread.
+        """
+        with self._lock:
+            entry = self._cells.get(cell)
+            if entry and entry[0] >= time.time():
+                self._cells.move_to_end(cell)
+                if not prefetch:
+                    self.hits += 1
+                return entry[1], None, False
+
+            if not prefetch:
+                self.misses += 1
+            future = self._inflight.get(cell)
+            if future is not None:
+                return None, future, False
+
+            if prefetch:
+                self.prefetches += 1
+                future = self._executor.submit(self._fetch_cell, cell)
+                owner = False
+            else:
+                future = Future()
+                owner = True
+            self._inflight[cell] = future
+            future.add_done_callback(lambda _, c=cell: self._forget_inflight(c))
+            return None, future, owner
+
+    def _forget_inflight(self, cell: str) -> None:
+        with self._lock:
+            self._inflight.pop(cell, None)
+
+    def _prefetch_ahead(self, cell: str, lat: float, lng: float, session_key: Optional[str]) -> None:
+        if not self.prefetch or not session_key:
+            return
+
+        with self._lock:
+            previous = self._last_positions.get(session_key)
+            self._last_positions[session_key] = (lat, lng)
+            self._last_positions.move_to_end(session_key)
+            while len(self._last_positions) > self.max_entries:
+                self._last_positions.popitem(last=False)
+
+        if not previous:
+            return
+        dlat, dlng = lat - previous[0], lng - previous[1]
+        largest = max(abs(dlat), abs(dlng))
+        if largest == 0:
+            return
+
+        # Step one cell towards the heading, plus the two cells flanking it
+        step_lat = round(dlat / largest)
+        step_lng = round(dlng / largest)
+        ahead = {(step_lat, step_lng)}
+        if step_lat and step_lng:
+            ahead.update({(step_lat, 0), (0, step_lng)})
+        elif step_lat:
+            ahead.update({(step_lat, -1), (step_lat, 1)})
+        else:
+            ahead.update({(-1, step_lng), (1, step_lng)})
+
+        for row, col in ahead:
+            self._lookup(geohash.neighbor(cell, row, col), prefetch=True)
+
+    def places_nearby(self, lat: float, lng: float, session_key: Optional[str] = None) -> Dict:
+        """Drop-in replacement for the /chat gmap.places_nearby call, ordered as Places returns them"""
+        cell = geohash.encode(lat, lng, self.precision)
+        results, future, owner = self._lookup(cell)
+        if owner:
+            try:
+                results = self._fetch_cell(cell, follow_pages=False)
+                future.set_result(results)
+            except Exception as e:
+                future.set_exception(e)
+                raise
+        elif future is not None:
+            try:
+                results = future.result()
+            except Exception as e:
+                # A failed prefetch or concurrent fetch must not fail this request
+                print(f"Shared places fetch for cell {cell} failed, fetching directly: {str(e)}")
+                results = self._fetch_cell(cell, follow_pages=False)
+
+        self._prefetch_ahead(cell, lat, lng, session_key)
+
+        nearby = []
+        for place in results:
+            location = place.get('geometry', {}).get('location')
+            if not location or haversine_m(lat, lng, location['lat'], location['lng']) <= self.radius:
+                nearby.append(place)
+        return {'results': nearby}
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "cells": len(self._cells),
+                "hits": self.hits,
+                "misses": self.misses,
+                "prefetches": self.prefetches,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
@@ -1,73 +1,103 @@
 import os
 import time
-from typing import List, Dict, Optional
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, List, Dict, Optional
 import wikipediaapi
 import googlemaps
 from dotenv import load_dotenv
 import chromadb
 from chromadb.utils import embedding_functions
-from datetime import datetime
+from datetime import datetime, timedelta
 import urllib.parse
 import logging
-from difflib import SequenceMatcher
 
 import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
-from backend.config import get_chroma_settings
-import re
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend.config import get_chroma_settings, get_ingestion_settings, get_embedding_cache_settings
+from utils.chroma_client import get_chroma_client
+from utils.ingestion import BatchWriter, HostRateLimiter, with_retries
+from utils.collection_alias import get_alias, set_alias
+from utils.attraction_matcher import AttractionMatcher, clean_name
+from utils.embedding_cache import EmbeddingCache
+from utils.chunking import chunk_document
 
 logging.basicConfig(level=logging.INFO)
 load_dotenv()
 
-def clean_name(name: str) -> str:
-    """Clean name by removing special characters and standardizing format"""
-    name = name.split('|')[0].strip()
-    name = re.sub(r'[^\w\s-]', '', name)
-    name = ' '.join(name.split())
-    return name.lower()
+class WikipediaDataCollector:
+    """Builds the Wikipedia collection from nearby Google Places attractions.
 
-def similar(a: str, b: str) -> float:
-    """Calculate similarity ratio between two strings"""
-    return SequenceMatcher(None, clean_name(a), clean_name(b)).ratio()
+    By default both collections are deleted and rebuilt. With incremental=True
+    the live collection is kept: pages verified within max_age_days are skipped,
+    and only documents whose content_hash changed are re-embedded. With
+    shadow=True the build goes into new timestamped collections and the
+    "wikipedia_collection" and "wikipedia_chunks" aliases are swapped to them
+    once ingestion finishes. Every stored document is also split into
+    section-aware chunks in "wikipedia_chunks" for token-budgeted retrieval.
+    """
 
+    WIKI_ALIAS = "wikipedia_collection"
+    CHUNKS_ALIAS = "wikipedia_chunks"
 
-class WikipediaDataCollector:
-    def __init__(self, attractions_array: dict):
+    def __init__(self, attractions_array: dict, incremental: bool = False, shadow: bool = False):
         settings = get_chroma_settings()
-        self.chroma_client = chromadb.HttpClient(
-            host=settings["chroma_host"],
-            port=settings["chroma_port"],
-            ssl=settings["chroma_ssl"],
-            headers={"X-Api-Key": settings["chroma_api_key"]} if settings["chroma_api_key"] else None
-        )
+        self.chroma_client = get_chroma_client(settings)
         self.embedding_function = embedding_functions.DefaultEmbeddingFunction()
-
-        # Delete existing collections if they exist
-        try:
-            self.chroma_client.delete_collection("wikipedia_collection")
-            self.chroma_client.delete_collection("singapore_attractions")
-        except Exception:
-            pass  # Collections might not exist, that's okay
-
-        # Create collections
+        embedding_settings = get_embedding_cache_settings()
+        self.embedding_cache = EmbeddingCache(
+            self.embedding_function,
+            model_id=embedding_settings["model_id"],
+            cache_dir=embedding_settings["cache_dir"],
+            batch_size=embedding_settings["batch_size"],
+            workers=embedding_settings["workers"]
+        )
+        self.incremental = incremental
+        self.shadow = shadow
+        suffix = datetime.now().strftime('%Y%m%d%H%M%S')
+        self.live_collection_name = get_alias(self.chroma_client, self.WIKI_ALIAS) or self.WIKI_ALIAS
+        self.wiki_collection_name = f"{self.WIKI_ALIAS}_{suffix}" if shadow else self.live_collection_name
+        self.live_chunks_name = get_alias(self.chroma_client, self.CHUNKS_ALIAS) or self.CHUNKS_ALIAS
+        self.chunks_collection_name = f"{self.CHUNKS_ALIAS}_{suffix}" if shadow else self.live_chunks_name
+
+        if not (incremental or shadow):
+            # Delete existing collections if they exist
+            try:
+                self.chroma_client.delete_collection(self.wiki_collection_name)
+                self.chroma_client.delete_collection("singapore_attractions")
+            except Exception:
+                pass  # Collections might not exist, that's okay
+            try:
+                self.chroma_client.delete_collection(self.chunks_collection_name)
+            except Exception:
+                pass
+
+        # Create collections, reusing them when they survive an incremental run
         try:
-            self.wiki_collection = self.chroma_client.create_collection(
-                name="wikipedia_collection",
+            self.wiki_collection = self.chroma_client.get_or_create_collection(
+                name=self.wiki_collection_name,
                 metadata={"description": "Wikipedia documents for tourist attractions"},
                 embedding_function=self.embedding_function
             )
             
-            self.attractions_collection = self.chroma_client.create_collection(
+            self.chunks_collection = self.chroma_client.get_or_create_collection(
+                name=self.chunks_collection_name,
+                metadata={"description": "Section-aware chunks of the Wikipedia documents"},
+                embedding_function=self.embedding_function
+            )
+            
+            self.attractions_collection = self.chroma_client.get_or_create_collection(
                 name="singapore_attractions",
                 metadata={"description": "Tourist attractions in Singapore"},
                 embedding_function=self.embedding_function
             )
-            logging.info("Successfully created ChromaDB collections")
+            logging.info(f"Successfully opened ChromaDB collection {self.wiki_collection_name}")
         except Exception as e:
             logging.error(f"Error creating collections: {str(e)}")
             raise
 
-
         # Initialize other necessary components
         self.wiki = wikipediaapi.Wikipedia(
             language='en',
@@ -77,12 +107,32 @@ class WikipediaDataCollector:
         
         self.gmaps = googlemaps.Client(key=os.getenv("GOOGLE_API_KEY"))
         
+        # Concurrency, per-host rate limiting and batched writes for ingestion
+        ingestion = get_ingestion_settings()
+        self.max_workers = ingestion["max_workers"]
+        self.batch_size = ingestion["batch_size"]
+        self.max_retries = ingestion["max_retries"]
+        self.max_age = timedelta(days=ingestion["max_age_days"])
+        self.chunk_max_tokens = ingestion["chunk_max_tokens"]
+        self.chunk_overlap_tokens = ingestion["chunk_overlap_tokens"]
+        self.wiki_host = "en.wikipedia.org"
+        self.rate_limiter = HostRateLimiter(ingestion["requests_per_second"])
+
         # Initialize tracking variables
         self.attractions_array = attractions_array
+        self.matcher = AttractionMatcher(attractions_array)
+        self._stats_lock = threading.Lock()
         self.success_count = 0
         self.failure_count = 0
         self.successful_documents = []
         self.unsuccessful_documents = []
+        self.existing = {}  # place_id -> stored metadata, loaded for incremental runs
+        self.skipped_count = 0
+        self.unchanged_count = 0
+
+        if shadow and incremental:
+            self.copy_collection(self.live_collection_name, self.wiki_collection)
+            self.copy_collection(self.live_chunks_name, self.chunks_collection)
     def get_places(self, latitude: float, longitude: float, radius: int = 1000) -> List[Dict]:
         """
         Get nearby tourist attractions using Google Maps Places API
@@ -113,36 +163,20 @@ class WikipediaDataCollector:
         """
         Find attraction in the predefined array using fuzzy matching
         """
-        best_match = None
-        best_category = None
-        best_url = None
-        highest_ratio = 0.8  # Minimum similarity threshold
-
-        cleaned_attraction = clean_name(attraction_name)
-        
-        for category in ["One", "Two", "Three"]:
-            for item in self.attractions_array[category]:
-                similarity = similar(cleaned_attraction, item["name"])
-                if similarity > highest_ratio:
-                    highest_ratio = similarity
-                    best_match = item["name"]
-                    best_category = category
-                    best_url = item["url"]
-                
-                # Also check if the attraction name is contained within the item name or vice versa
-                if (cleaned_attraction in clean_name(item["name"]) or 
-                    clean_name(item["name"]) in cleaned_attraction):
-                    if similarity > 0.5:  # Lower threshold for contained matches
-                        best_match = item["name"]
-                        best_category = category
-                        best_url = item["url"]
-                        highest_ratio = similarity
-
-        if best_match:
-            print(f"Matched '{attraction_name}' to '{best_match}' with similarity {highest_ratio:.2f}")
-            return best_category, best_url
+        match = self.matcher.match(attraction_name)
+        if match:
+            category, item, similarity = match
+            print(f"Matched '{attraction_name}' to '{item['name']}' with similarity {similarity:.2f}")
+            return category, item["url"]
         return None, None
 
+    def _wiki_fetch(self, fn: Callable, description: str):
+        """Rate-limited, retried call against the Wikipedia API host"""
+        def call():
+            self.rate_limiter.acquire(self.wiki_host)
+            return fn()
+        return with_retries(call, attempts=self.max_retries, description=description)
+
     def get_wikipedia_content(self, url: str) -> Optional[Dict]:
         """
         Enhanced Wikipedia content retrieval with better error handling
@@ -154,24 +188,24 @@ class WikipediaDataCollector:
             page_title = urllib.parse.unquote(url.split("/")[-1].replace("_", " "))
             page = self.wiki.page(page_title)
             
-            if not page.exists():
-                search_results = self.wiki.search(page_title)
+            if not self._wiki_fetch(page.exists, f"Wikipedia lookup for {page_title}"):
+                search_results = self._wiki_fetch(lambda: self.wiki.search(page_title), f"Wikipedia search for {page_title}")
                 if search_results:
                     page = self.wiki.page(search_results[0])
                 else:
                     return None
             
-            if page.exists():
+            if self._wiki_fetch(page.exists, f"Wikipedia lookup for {page.title}"):
                 # Extract most relevant sections
                 content = {
-                    "summary": page.summary,
+                    "summary": self._wiki_fetch(lambda: page.summary, f"Wikipedia summary for {page.title}"),
                     "history": "",
                     "description": "",
                     "url": url
                 }
                 
                 # Parse full text to find relevant sections
-                sections = page.text.split('\n\n')
+                sections = self._wiki_fetch(lambda: page.text, f"Wikipedia text for {page.title}").split('\n\n')
                 for section in sections:
                     lower_section = section.lower()
                     if any(keyword in lower_section for keyword in ["history", "background", "established"]):
@@ -186,7 +220,7 @@ class WikipediaDataCollector:
         
         return None
 
-    def store_in_chromadb(self, documents: List[Dict]) -> None:
+    def store_in_chromadb(self, documents: List[Dict], verify: bool = True) -> None:
         """
         Store only successfully processed Wikipedia documents in ChromaDB
         """
@@ -204,16 +238,59 @@ class WikipediaDataCollector:
             metadatas = [doc["metadata"] for doc in wiki_docs]
             ids = [doc["metadata"]["place_id"] for doc in wiki_docs]
             
-            # Store in Wikipedia collection
-            self.wiki_collection.add(
+            # Embeddings come from the on-disk cache; only new texts reach the model
+            embeddings = self.embedding_cache.embed(texts)
+            
+            # Store in Wikipedia collection; upsert keeps re-runs idempotent
+            self.wiki_collection.upsert(
                 documents=texts,
                 metadatas=metadatas,
+                embeddings=embeddings,
                 ids=ids
             )
             
             logging.info(f"Successfully stored {len(wiki_docs)} documents in wikipedia_collection")
             
-            # Verify storage by querying
+            self.store_chunks(wiki_docs)
+            
+            if verify:
+                self.verify_storage()
+                
+        except Exception as e:
+            logging.error(f"Error storing documents in ChromaDB: {str(e)}")
+
+    def store_chunks(self, documents: List[Dict]) -> None:
+        """
+        Replace the chunks of these documents in the chunk collection
+        """
+        chunks = [
+            chunk for doc in documents
+            for chunk in chunk_document(doc, self.chunk_max_tokens, self.chunk_overlap_tokens)
+        ]
+        if not chunks:
+            return
+        
+        try:
+            # A page that got shorter leaves fewer chunks, so drop the old set first
+            self.chunks_collection.delete(
+                where={"parent_id": {"$in": [doc["metadata"]["place_id"] for doc in documents]}}
+            )
+            texts = [chunk["text"] for chunk in chunks]
+            self.chunks_collection.upsert(
+                documents=texts,
+                metadatas=[chunk["metadata"] for chunk in chunks],
+                embeddings=self.embedding_cache.embed(texts),
+                ids=[chunk["id"] for chunk in chunks]
+            )
+            logging.info(f"Stored {len(chunks)} chunks for {len(documents)} documents")
+        except Exception as e:
+            logging.error(f"Error storing chunks in ChromaDB: {str(e)}")
+
+    def verify_storage(self) -> None:
+        """
+        Verify storage by querying
+        """
+        try:
             results = self.wiki_collection.query(
                 query_texts=["test query"],
                 n_results=1
@@ -222,9 +299,8 @@ class WikipediaDataCollector:
                 logging.info("Storage verification successful")
             else:
                 logging.warning("Storage verification failed - no results returned")
-                
         except Exception as e:
-            logging.error(f"Error storing documents in ChromaDB: {str(e)}")
+            logging.error(f"Error verifying ChromaDB storage: {str(e)}")
 
     def create_document_structure(self, attraction: Dict, wiki_content: Optional[Dict]) -> Dict:
         """
@@ -240,6 +316,8 @@ class WikipediaDataCollector:
         else:
             relevant_text = "No Wikipedia content available"
 
+        content_hash = hashlib.sha256(relevant_text.encode("utf-8")).hexdigest()
+
         return {
             "text": relevant_text,
             "metadata": {
@@ -250,10 +328,168 @@ class WikipediaDataCollector:
                 "fact_type": "historical" if wiki_content else "basic",
                 "last_verified": datetime.now().strftime("%Y-%m-%d"),
                 "wikipedia_url": wiki_content["url"] if wiki_content else "",
-                "has_wiki_content": bool(wiki_content)
+                "has_wiki_content": bool(wiki_content),
+                "content_hash": content_hash
             }
         }
 
+    def process_attraction(self, attraction: Dict) -> Dict:
+        """
+        Match one attraction, fetch its Wikipedia content and build its document
+        """
+        logging.info(f"Processing: {attraction['name']}")
+        category, url = self.find_attraction_in_array(attraction["name"])
+        
+        wiki_content = None
+        if category and (category in ["One", "Two"]):
+            wiki_content = self.get_wikipedia_content(url)
+            with self._stats_lock:
+                if wiki_content:
+                    self.success_count += 1
+                    self.successful_documents.append({"name": attraction["name"], "url": url})
+                    logging.info(f"Successfully retrieved Wikipedia content from {url}")
+                else:
+                    self.failure_count += 1
+                    self.unsuccessful_documents.append(attraction["name"])
+                    logging.warning(f"Failed to retrieve Wikipedia content from {url}")
+        else:
+            with self._stats_lock:
+                self.failure_count += 1
+                self.unsuccessful_documents.append(attraction["name"])
+            
+        return self.create_document_structure(attraction, wiki_content)
+
+    def copy_collection(self, source_name: str, target) -> None:
+        """
+        Seed a shadow collection with the stored vectors of the live one, without re-embedding
+        """
+        try:
+            source = self.chroma_client.get_collection(source_name)
+        except Exception as e:
+            logging.warning(f"No live collection {source_name} to copy from: {str(e)}")
+            return
+        
+        offset = 0
+        while True:
+            page = source.get(limit=self.batch_size, offset=offset, include=["documents", "metadatas", "embeddings"])
+            if not page["ids"]:
+                break
+            target.upsert(
+                ids=page["ids"],
+                documents=page["documents"],
+                metadatas=page["metadatas"],
+                embeddings=page["embeddings"]
+            )
+            offset += len(page["ids"])
+        logging.info(f"Copied {offset} documents from {source_name} into {target.name}")
+
+    def load_existing(self) -> None:
+        """
+        Load place_id -> metadata (content_hash, last_verified) of the stored documents
+        """
+        self.existing = {}
+        offset = 0
+        while True:
+            page = self.wiki_collection.get(limit=1000, offset=offset, include=["metadatas"])
+            if not page["ids"]:
+                break
+            for doc_id, metadata in zip(page["ids"], page["metadatas"]):
+                self.existing[doc_id] = metadata or {}
+            offset += len(page["ids"])
+        logging.info(f"Loaded metadata for {len(self.existing)} stored documents")
+
+    def is_fresh(self, attraction: Dict) -> bool:
+        """
+        True when the stored document for this attraction was verified within max_age
+        and still points at the same Wikipedia page
+        """
+        previous = self.existing.get(attraction.get("place_id", ""))
+        if not previous or not previous.get("content_hash"):
+            return False
+        try:
+            verified = datetime.strptime(previous.get("last_verified", ""), "%Y-%m-%d")
+        except ValueError:
+            return False
+        if datetime.now() - verified >= self.max_age:
+            return False
+        _, url = self.find_attraction_in_array(attraction["name"])
+        return previous.get("wikipedia_url") == url
+
+    def is_unchanged(self, document: Dict) -> bool:
+        previous = self.existing.get(document["metadata"]["place_id"])
+        return bool(previous) and previous.get("content_hash") == document["metadata"]["content_hash"]
+
+    def touch_verified(self, documents: List[Dict]) -> None:
+        """
+        Bump last_verified on documents whose content did not change; metadata-only, no re-embedding
+        """
+        for i in range(0, len(documents), self.batch_size):
+            batch = documents[i:i + self.batch_size]
+            try:
+                self.wiki_collection.update(
+                    ids=[doc["metadata"]["place_id"] for doc in batch],
+                    metadatas=[doc["metadata"] for doc in batch]
+                )
+            except Exception as e:
+                logging.error(f"Error updating last_verified in ChromaDB: {str(e)}")
+
+    def promote(self) -> None:
+        """
+        Swap the aliases to the finished shadow collections and drop older shadows.
+        The previously live collection is kept so in-flight readers can finish.
+        """
+        set_alias(self.chroma_client, self.WIKI_ALIAS, self.wiki_collection_name)
+        set_alias(self.chroma_client, self.CHUNKS_ALIAS, self.chunks_collection_name)
+        keep = {self.wiki_collection_name, self.live_collection_name, self.chunks_collection_name, self.live_chunks_name}
+        for collection in self.chroma_client.list_collections():
+            name = getattr(collection, "name", collection)
+            if name.startswith((f"{self.WIKI_ALIAS}_", f"{self.CHUNKS_ALIAS}_")) and name not in keep:
+                try:
+                    self.chroma_client.delete_collection(name)
+                    logging.info(f"Deleted old shadow collection {name}")
+                except Exception as e:
+                    logging.warning(f"Could not delete old shadow collection {name}: {str(e)}")
+
+    def ingest(self, attractions: List[Dict]) -> List[Dict]:
+        """
+        Process attractions on a bounded thread pool, streaming finished documents
+        to a single batched ChromaDB writer as they complete
+        """
+        if self.incremental:
+            self.load_existing()
+            stale = [attraction for attraction in attractions if not self.is_fresh(attraction)]
+            self.skipped_count += len(attractions) - len(stale)
+            logging.info(f"{len(stale)} of {len(attractions)} attractions are stale or new")
+            attractions = stale
+        
+        writer = BatchWriter(lambda batch: self.store_in_chromadb(batch, verify=False), self.batch_size)
+        documents = [None] * len(attractions)
+        unchanged = []
+        
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {pool.submit(self.process_attraction, attraction): i for i, attraction in enumerate(attractions)}
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    document = future.result()
+                except Exception as e:
+                    logging.error(f"Error processing attraction {attractions[index]['name']}: {str(e)}")
+                    continue
+                documents[index] = document
+                if self.incremental and self.is_unchanged(document):
+                    unchanged.append(document)
+                else:
+                    writer.put(document)
+        
+        writer.close()
+        logging.info(f"Stored {writer.items_written} documents in {writer.batches_written} batches")
+        self.unchanged_count += len(unchanged)
+        self.touch_verified(unchanged)
+        self.verify_storage()
+        if self.shadow:
+            self.promote()
+        return [document for document in documents if document]
+
     def process_attractions(self, latitude: float, longitude: float) -> List[Dict]:
         """
         Process attractions with improved error handling and logging
@@ -262,35 +498,7 @@ class WikipediaDataCollector:
             attractions = self.get_places(latitude, longitude)
             logging.info(f"Found {len(attractions)} attractions")
             
-            documents = []
-            for attraction in attractions:
-                try:
-                    logging.info(f"Processing: {attraction['name']}")
-                    category, url = self.find_attraction_in_array(attraction["name"])
-                    
-                    if category and (category in ["One", "Two"]):
-                        wiki_content = self.get_wikipedia_content(url)
-                        if wiki_content:
-                            self.success_count += 1
-                            self.successful_documents.append({"name": attraction["name"], "url": url})
-                            logging.info(f"Successfully retrieved Wikipedia content from {url}")
-                        else:
-                            self.failure_count += 1
-                            self.unsuccessful_documents.append(attraction["name"])
-                            logging.warning(f"Failed to retrieve Wikipedia content from {url}")
-                    else:
-                        self.failure_count += 1
-                        self.unsuccessful_documents.append(attraction["name"])
-                        wiki_content = None
-                        
-                    document = self.create_document_structure(attraction, wiki_content)
-                    documents.append(document)
-                    
-                except Exception as e:
-                    logging.error(f"Error processing attraction {attraction['name']}: {str(e)}")
-                    continue
-            
-            self.store_in_chromadb(documents)
+            documents = self.ingest(attractions)
             self.print_results()
             return documents
             
@@ -306,6 +514,10 @@ class WikipediaDataCollector:
         print(f"Total attractions processed: {self.success_count + self.failure_count}")
         print(f"Successfully processed: {self.success_count}")
         print(f"Failed to process: {self.failure_count}")
+        print(f"Embedding cache: {self.embedding_cache.stats()}")
+        if self.incremental:
+            print(f"Skipped (verified within {self.max_age.days} days): {self.skipped_count}")
+            print(f"Unchanged (last_verified updated only): {self.unchanged_count}")
         
         print("\n--- Successful Processing ---")
         for item in self.successful_documents:
@@ -425,7 +637,11 @@ if __name__ == "__main__":
     }
 
     
-    collector = WikipediaDataCollector(attractions_array)
+    collector = WikipediaDataCollector(
+        attractions_array,
+        incremental="--incremental" in sys.argv,
+        shadow="--shadow" in sys.argv
+    )
     CHINATOWN_LAT = 1.2836
     CHINATOWN_LNG = 103.8440
     documents = collector.process_attractions(CHINATOWN_LAT, CHINATOWN_LNG)
\ No newline at end of file